@@ -4,10 +4,14 @@ from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, make_transient_to_detached
+from .cache import TTLCache
 from .config import settings
 from .database import get_db
-from .models import User
+from .database_async import get_async_db
+from .models import Seller, User
 from .schemas import TokenData
 
 # Password hashing
@@ -68,6 +72,62 @@ def authenticate_user(db: Session, username: str, password: str) -> Optional[Use
     return user
 
 
+# Resolved principals, keyed by token subject (username). Each entry holds a
+# detached copy of the user row plus their seller id, so an authenticated
+# request can skip the users lookup (and the sellers lookup, for endpoints
+# that only need the id). The copy is merged into the request's session with
+# load=False, which attaches it without a query, so callers still get a
+# normal persistent `User`. Writes that change who a user is or what they may
+# do call `invalidate_principal`; other workers see the change within the TTL.
+class Principal:
+    __slots__ = ("user", "seller_id")
+
+    def __init__(self, user: User, seller_id: Optional[int]):
+        self.user = user
+        self.seller_id = seller_id
+
+
+_principals = TTLCache(maxsize=settings.auth_principal_cache_size, ttl=settings.auth_principal_cache_ttl)
+_principal_usernames = TTLCache(maxsize=settings.auth_principal_cache_size, ttl=settings.auth_principal_cache_ttl)
+
+
+def _principal(user: User, seller_id: Optional[int]) -> Principal:
+    """Cache a detached snapshot of `user` (all columns loaded) and return it."""
+    snapshot = User(**{column.key: getattr(user, column.key) for column in User.__table__.columns})
+    make_transient_to_detached(snapshot)
+    principal = Principal(snapshot, seller_id)
+    if settings.auth_principal_cache_ttl > 0:
+        _principals.set(user.username, principal)
+        _principal_usernames.set(user.id, user.username)
+    return principal
+
+
+def invalidate_principal(user_id: int, username: Optional[str] = None) -> None:
+    """Drop the cached principal of a user whose row or seller profile changed."""
+    cached = _principal_usernames.get(user_id)
+    for key in {cached, username} - {None}:
+        _principals.delete(key)
+    _principal_usernames.delete(user_id)
+
+
+def _principal_query(username: str):
+    return (
+        select(User, Seller.id)
+        .outerjoin(Seller, Seller.user_id == User.id)
+        .where(User.username == username)
+    )
+
+
+def get_principal(db: Session, username: str) -> Optional[Principal]:
+    principal = _principals.get(username)
+    if principal is None:
+        row = db.execute(_principal_query(username)).first()
+        if row is None:
+            return None
+        principal = _principal(row[0], row[1])
+    return principal
+
+
 def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security), db: Session = Depends(get_db)) -> User:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -76,10 +136,10 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(securit
     )
     token = credentials.credentials
     token_data = verify_token(token, credentials_exception)
-    user = get_user(db, username=token_data.username)
-    if user is None:
+    principal = get_principal(db, token_data.username)
+    if principal is None:
         raise credentials_exception
-    return user
+    return db.merge(principal.user, load=False)
 
 
 def get_current_active_user(current_user: User = Depends(get_current_user)) -> User:
@@ -88,12 +148,49 @@ def get_current_active_user(current_user: User = Depends(get_current_user)) -> U
     return current_user
 
 
+async def get_current_user_async(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: AsyncSession = Depends(get_async_db)
+) -> User:
+    """`get_current_user` for endpoints running on the async session."""
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    token_data = verify_token(credentials.credentials, credentials_exception)
+    principal = _principals.get(token_data.username)
+    if principal is None:
+        row = (await db.execute(_principal_query(token_data.username))).first()
+        if row is None:
+            raise credentials_exception
+        principal = _principal(row[0], row[1])
+    return await db.merge(principal.user, load=False)
+
+
+async def get_current_active_user_async(current_user: User = Depends(get_current_user_async)) -> User:
+    if not current_user.is_active:
+        raise HTTPException(status_code=400, detail="Inactive user")
+    return current_user
+
+
 def get_current_seller(current_user: User = Depends(get_current_active_user)) -> User:
     if not current_user.is_seller:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Seller access required")
     return current_user
 
 
+def get_current_seller_id(
+    current_user: User = Depends(get_current_seller),
+    db: Session = Depends(get_db)
+) -> int:
+    """Seller id of the current user, from the cached principal when possible."""
+    principal = get_principal(db, current_user.username)
+    if principal is None or principal.seller_id is None:
+        raise HTTPException(status_code=404, detail="Seller profile not found")
+    return principal.seller_id
+
+
 def get_current_admin(current_user: User = Depends(get_current_active_user)) -> User:
     if not current_user.is_admin:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
@@ -0,0 +1,162 @@
+"""
+Per-user unread counters for messages and notifications.
+
+`user_badge_counters` holds one row per user with their unread message and
+notification counts. Triggers on `messages` and `notifications` adjust it in
+the same transaction as every insert, delete and `is_read` change, so bulk
+inserts (`notification_fanout`), `UPDATE ... SET is_read` and ORM writes all
+keep it exact without the application having to remember to. A user without a
+row has nothing unread.
+
+Reading badges is then a primary-key lookup instead of a `COUNT(*)` over the
+user's messages and notifications. Until `install` has run in this process
+(e.g. the startup migration failed), `get_badges` falls back to counting,
+still in a single statement.
+"""
+from typing import Dict
+
+from sqlalchemy import func, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from . import models
+
+_installed = False
+
+REBUILD_SQL = """
+INSERT INTO user_badge_counters (user_id, unread_messages, unread_notifications)
+SELECT user_id, SUM(messages), SUM(notifications) FROM (
+    SELECT receiver_id AS user_id, 1 AS messages, 0 AS notifications
+    FROM messages WHERE is_read = false
+    UNION ALL
+    SELECT user_id, 0, 1 FROM notifications WHERE is_read = false
+) unread
+GROUP BY user_id
+"""
+
+# (table, user column, counter column)
+_COUNTED = [
+    ("messages", "receiver_id", "unread_messages"),
+    ("notifications", "user_id", "unread_notifications"),
+]
+
+
+def _sqlite_triggers(table: str, user_col: str, counter: str):
+    increment = (
+        f"INSERT INTO user_badge_counters (user_id, {counter}) VALUES (new.{user_col}, 1) "
+        f"ON CONFLICT(user_id) DO UPDATE SET {counter} = {counter} + 1; "
+    )
+    decrement = (
+        f"UPDATE user_badge_counters SET {counter} = MAX({counter} - 1, 0) "
+        f"WHERE user_id = old.{user_col}; "
+    )
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS {table}_unread_ai AFTER INSERT ON {table} "
+        f"WHEN new.is_read IS 0 BEGIN {increment}END",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_unread_ad AFTER DELETE ON {table} "
+        f"WHEN old.is_read IS 0 BEGIN {decrement}END",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_unread_au AFTER UPDATE OF is_read, {user_col} ON {table} "
+        f"WHEN (old.is_read IS 0) OR (new.is_read IS 0) BEGIN "
+        f"UPDATE user_badge_counters SET {counter} = MAX({counter} - 1, 0) "
+        f"WHERE user_id = old.{user_col} AND old.is_read IS 0; "
+        f"INSERT INTO user_badge_counters (user_id, {counter}) SELECT new.{user_col}, 1 WHERE new.is_read IS 0 "
+        f"ON CONFLICT(user_id) DO UPDATE SET {counter} = {counter} + 1; "
+        f"END",
+    ]
+
+
+def _postgres_triggers(table: str, user_col: str, counter: str):
+    return [
+        f"""
+        CREATE OR REPLACE FUNCTION {table}_unread_counter() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'UPDATE' AND OLD.is_read IS NOT DISTINCT FROM NEW.is_read
+                    AND OLD.{user_col} = NEW.{user_col} THEN
+                RETURN NULL;
+            END IF;
+            IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.is_read IS FALSE THEN
+                UPDATE user_badge_counters SET {counter} = GREATEST({counter} - 1, 0)
+                WHERE user_id = OLD.{user_col};
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.is_read IS FALSE THEN
+                INSERT INTO user_badge_counters (user_id, {counter}) VALUES (NEW.{user_col}, 1)
+                ON CONFLICT (user_id) DO UPDATE SET {counter} = user_badge_counters.{counter} + 1;
+            END IF;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+        """,
+        f"DROP TRIGGER IF EXISTS {table}_unread_counter ON {table}",
+        f"CREATE TRIGGER {table}_unread_counter AFTER INSERT OR DELETE OR UPDATE OF is_read, {user_col} "
+        f"ON {table} FOR EACH ROW EXECUTE FUNCTION {table}_unread_counter()",
+    ]
+
+
+def _triggers_exist(conn, dialect: str) -> bool:
+    names = [f"{table}_unread_ai" if dialect == "sqlite" else f"{table}_unread_counter" for table, _, _ in _COUNTED]
+    if dialect == "sqlite":
+        sql = "SELECT COUNT(*) FROM sqlite_master WHERE type = 'trigger' AND name IN (:a, :b)"
+    else:
+        sql = "SELECT COUNT(*) FROM pg_trigger WHERE NOT tgisinternal AND tgname IN (:a, :b)"
+    return conn.execute(text(sql), {"a": names[0], "b": names[1]}).scalar() == len(names)
+
+
+def rebuild_counters(conn) -> None:
+    """Recompute every user's counters. `conn` may be a Session or a Connection."""
+    conn.execute(text("DELETE FROM user_badge_counters"))
+    conn.execute(text(REBUILD_SQL))
+
+
+def install(engine: Engine) -> None:
+    """Create the counter triggers, backfilling the counters the first time."""
+    global _installed
+    dialect = engine.dialect.name
+    if dialect not in ("sqlite", "postgresql"):
+        return
+    with engine.begin() as conn:
+        if not _triggers_exist(conn, dialect):
+            if dialect == "postgresql":
+                # Hold off writers so nothing lands between the backfill and the triggers
+                conn.exec_driver_sql("LOCK TABLE messages, notifications IN SHARE ROW EXCLUSIVE MODE")
+            build = _sqlite_triggers if dialect == "sqlite" else _postgres_triggers
+            for table, user_col, counter in _COUNTED:
+                for stmt in build(table, user_col, counter):
+                    conn.exec_driver_sql(stmt)
+            rebuild_counters(conn)
+    _installed = True
+
+
+def _badges_stmt(user_id: int):
+    if _installed:
+        return select(
+            models.UserBadgeCounter.unread_messages,
+            models.UserBadgeCounter.unread_notifications,
+        ).where(models.UserBadgeCounter.user_id == user_id)
+    unread_messages = select(func.count(models.Message.id)).where(
+        models.Message.receiver_id == user_id,
+        models.Message.is_read == False
+    ).scalar_subquery()
+    unread_notifications = select(func.count(models.Notification.id)).where(
+        models.Notification.user_id == user_id,
+        models.Notification.is_read == False
+    ).scalar_subquery()
+    return select(unread_messages, unread_notifications)
+
+
+def _as_badges(row) -> Dict[str, int]:
+    messages, notifications = (int(row[0] or 0), int(row[1] or 0)) if row is not None else (0, 0)
+    return {
+        "unread_messages": messages,
+        "unread_notifications": notifications,
+        "total": messages + notifications,
+    }
+
+
+def get_badges(db: Session, user_id: int) -> Dict[str, int]:
+    """Unread message and notification counts for one user in one lookup."""
+    return _as_badges(db.execute(_badges_stmt(user_id)).first())
+
+
+async def get_badges_async(db: AsyncSession, user_id: int) -> Dict[str, int]:
+    return _as_badges((await db.execute(_badges_stmt(user_id))).first())
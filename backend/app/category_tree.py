@@ -0,0 +1,106 @@
+"""
+Category hierarchy helpers backed by the `category_closure` table.
+
+The closure table stores one row per (ancestor, descendant) pair, so "all
+products under Electronics" is a single indexed lookup instead of a walk down
+`parent_id`. Inserting a leaf only copies the parent's ancestor rows; moves and
+deletes rebuild the table with one recursive query (the category set is small).
+
+`get_tree` serves the nested tree for `/categories/tree` from an in-process
+cache that category writes clear.
+"""
+from typing import Any, Dict, List
+
+from sqlalchemy import insert, literal, select, text
+from sqlalchemy.orm import Session
+
+from . import models
+from .cache import TTLCache
+from .config import settings
+
+# Guards against runaway recursion if bad data ever contains a parent cycle
+MAX_DEPTH = 32
+
+REBUILD_SQL = f"""
+INSERT INTO category_closure (ancestor_id, descendant_id, depth)
+WITH RECURSIVE tree(ancestor_id, descendant_id, depth) AS (
+    SELECT id, id, 0 FROM categories
+    UNION ALL
+    SELECT tree.ancestor_id, categories.id, tree.depth + 1
+    FROM tree JOIN categories ON categories.parent_id = tree.descendant_id
+    WHERE tree.depth < {MAX_DEPTH}
+)
+SELECT ancestor_id, descendant_id, MIN(depth) FROM tree GROUP BY ancestor_id, descendant_id
+"""
+
+_tree_cache = TTLCache(maxsize=1, ttl=settings.category_tree_cache_ttl)
+
+
+def rebuild_closure(conn) -> None:
+    """Recompute the whole closure table. `conn` may be a Session or a Connection."""
+    conn.execute(text("DELETE FROM category_closure"))
+    conn.execute(text(REBUILD_SQL))
+    invalidate()
+
+
+def add_category(db: Session, category: models.Category) -> None:
+    """Insert closure rows for a freshly flushed category (no commit)."""
+    closure = models.CategoryClosure
+    db.execute(insert(closure).values(ancestor_id=category.id, descendant_id=category.id, depth=0))
+    if category.parent_id:
+        db.execute(insert(closure).from_select(
+            ["ancestor_id", "descendant_id", "depth"],
+            select(closure.ancestor_id, literal(category.id), closure.depth + 1).where(
+                closure.descendant_id == category.parent_id
+            ),
+        ))
+    invalidate()
+
+
+def descendant_ids(category_id: int):
+    """Subquery of the ids of `category_id` and every category below it."""
+    closure = models.CategoryClosure
+    return select(closure.descendant_id).where(closure.ancestor_id == category_id)
+
+
+def is_descendant(db: Session, category_id: int, ancestor_id: int) -> bool:
+    """True if `category_id` is `ancestor_id` itself or sits anywhere below it."""
+    closure = models.CategoryClosure
+    return db.query(closure.depth).filter(
+        closure.ancestor_id == ancestor_id, closure.descendant_id == category_id
+    ).first() is not None
+
+
+def get_tree(db: Session) -> List[Dict[str, Any]]:
+    """Active categories as nested dicts with a `children` list, roots first."""
+    tree = _tree_cache.get("tree")
+    if tree is not None:
+        return tree
+
+    categories = db.query(models.Category).filter(
+        models.Category.is_active.is_(True)
+    ).order_by(models.Category.name).all()
+    nodes = {
+        c.id: {
+            "id": c.id,
+            "name": c.name,
+            "slug": c.slug,
+            "description": c.description,
+            "parent_id": c.parent_id,
+            "is_active": c.is_active,
+            "created_at": c.created_at,
+            "children": [],
+        }
+        for c in categories
+    }
+    tree = []
+    for node in nodes.values():
+        parent = nodes.get(node["parent_id"])
+        # Children of an inactive or missing parent are promoted to roots
+        (parent["children"] if parent else tree).append(node)
+    _tree_cache.set("tree", tree)
+    return tree
+
+
+def invalidate() -> None:
+    _tree_cache.clear()
@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import Dict, List
 import json
 
 
@@ -10,14 +10,75 @@ class Settings(BaseSettings):
     # the app will connect to this instead of the local SQLite database.
     supabase_database_url: str | None = None
     use_supabase: bool = False
+    # Connection pool (Postgres; file-backed SQLite uses the same pool class)
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout: int = 10  # seconds to wait for a free connection
+    db_pool_recycle: int = 1800  # seconds before a connection is replaced; -1 disables
+    db_pool_pre_ping: bool = True
+    db_statement_timeout_ms: int = 30000  # per-statement limit on Postgres; 0 disables
+    db_connect_timeout: int = 10
     
     # Redis
     redis_url: str = "redis://localhost:6379/0"
     
+    # Caching
+    product_count_cache_ttl: int = 30  # seconds a filtered product total is reused
+    product_facet_cache_ttl: int = 60  # seconds search facet counts are reused
+    response_cache_enabled: bool = True  # cache public catalogue responses
+    response_cache_ttl: int = 60
+    response_cache_max_entries: int = 2048  # in-process LRU size per worker
+    response_cache_use_redis: bool = False  # share cached responses across workers via redis_url
+    category_tree_cache_ttl: int = 300  # seconds the nested category tree is reused per worker
+    
+    # Outbox jobs (order side-effects); see app/jobs.py
+    outbox_worker_enabled: bool = True  # drain the outbox from an asyncio task in each web worker
+    outbox_poll_interval: float = 2.0  # seconds between polls when the outbox is empty
+    outbox_batch_size: int = 50
+    outbox_max_attempts: int = 8  # then the job is left in status "failed"
+    outbox_lock_timeout: int = 300  # seconds before a "running" job from a dead worker is retried
+    
+    # Notification fan-out; see app/notification_fanout.py
+    notification_fanout_chunk_size: int = 1000  # rows per INSERT batch and commit
+    
+    # Websocket delivery across workers; see app/ws_redis.py
+    ws_redis_enabled: bool = True  # per-user pub/sub channels on redis_url; local-only if unreachable
+    ws_presence_ttl: int = 60  # seconds a worker's presence entry outlives its last refresh
+    ws_send_queue_size: int = 256  # outbound events buffered per socket
+    ws_send_timeout: float = 10.0  # seconds one send may take before the socket is dropped
+    ws_slow_consumer_policy: str = "drop"  # full queue: "drop" oldest event or "disconnect" the socket
+    ws_heartbeat_interval: float = 25.0  # seconds between {"type": "ping"} events to every socket
+    ws_idle_timeout: float = 0.0  # close sockets that sent nothing (not even a pong) for this long; 0 (off) until clients answer pings
+    
+    # Rate limiting; see app/rate_limit.py. Rates are "<count>/<second|minute|hour|day>"
+    rate_limit_enabled: bool = True
+    rate_limit_use_redis: bool = False  # share budgets across workers via redis_url
+    rate_limit_default: str = "300/minute"  # per client IP for anonymous requests
+    rate_limit_user: str = "600/minute"  # per authenticated user
+    rate_limit_routes: Dict[str, str] = {  # "METHOD /path-prefix" -> extra per-caller budget
+        "POST /api/v1/auth/login": "10/minute",
+        "POST /api/v1/auth/register": "5/minute",
+        "POST /api/v1/auth/register-with-referral": "5/minute",
+        "POST /api/v1/auth/forgot-password": "5/minute",
+        "POST /api/v1/auth/reset-password": "5/minute",
+        "POST /api/v1/orders": "30/minute",
+    }
+    rate_limit_exempt_paths: List[str] = [
+        "/uploads", "/api/docs", "/api/redoc", "/openapi.json", "/api/v1/health", "/api/health", "/metrics"
+    ]
+    
+    # Metrics; see app/metrics.py and app/request_metrics.py
+    metrics_token: str | None = None  # GET /metrics requires "Authorization: Bearer <token>"; unset, it is served only when debug
+    system_metrics_interval: float = 15.0  # seconds between background psutil samples
+    sql_repeated_statement_threshold: int = 10  # flag requests running one statement shape this often (N+1); 0 disables
+    sql_debug_headers: bool | None = None  # X-DB-Query-* response headers; defaults to `debug`
+    
     # JWT
     secret_key: str = "development-secret-key-change-in-production"
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 30
+    auth_principal_cache_ttl: float = 30.0  # seconds a resolved token user is reused per worker; 0 disables
+    auth_principal_cache_size: int = 10000
     
     # Stripe
     stripe_publishable_key: str = "pk_test_default"
@@ -1,8 +1,17 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, desc, asc, true
-from sqlalchemy.orm import joinedload
-from typing import List, Optional
+from sqlalchemy import and_, desc, asc, true, func, case, select, insert
+from sqlalchemy.orm import joinedload, selectinload
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional, Tuple
 from . import models, schemas, auth
+from .pagination import paginate_keyset
+from .cache import TTLCache
+from .response_cache import response_cache, PRODUCTS_TAG, CATEGORIES_TAG
+from . import product_search, category_tree, product_images, jobs
+from .config import settings
+import hashlib
+import json
 import uuid
 from datetime import datetime
 
@@ -19,6 +28,8 @@ def create_product_image(db: Session, product_id: int, image_url: str, alt_text:
     db.add(db_image)
     db.commit()
     db.refresh(db_image)
+    product_images.refresh_image_urls(db, [product_id])
+    response_cache.invalidate(PRODUCTS_TAG)
     return db_image
 
 
@@ -55,6 +66,7 @@ def update_user(db: Session, user_id: int, user_update: schemas.UserUpdate) -> m
     if not db_user:
         return None
     
+    previous_username = db_user.username
     update_data = user_update.dict(exclude_unset=True)
     for field, value in update_data.items():
         if field == "is_seller" and value is True and not db_user.is_seller:
@@ -69,6 +81,7 @@ def update_user(db: Session, user_id: int, user_update: schemas.UserUpdate) -> m
 
     
     db.commit()
+    auth.invalidate_principal(db_user.id, previous_username)
     db.refresh(db_user)
     return db_user
 
@@ -87,6 +100,7 @@ def create_seller(db: Session, seller: schemas.SellerCreate, user_id: int) -> mo
     )
     db.add(db_seller)
     db.commit()
+    auth.invalidate_principal(user_id)
     db.refresh(db_seller)
     return db_seller
 
@@ -104,67 +118,262 @@ def get_category(db: Session, category_id: int) -> Optional[models.Category]:
 def create_category(db: Session, category: schemas.CategoryCreate) -> models.Category:
     db_category = models.Category(**category.dict())
     db.add(db_category)
+    db.flush()
+    category_tree.add_category(db, db_category)
     db.commit()
     db.refresh(db_category)
+    response_cache.invalidate(CATEGORIES_TAG)
     return db_category
 
 
+def update_category(db: Session, db_category: models.Category, category_update: schemas.CategoryCreate) -> models.Category:
+    update_data = category_update.dict(exclude_unset=True)
+    moved = "parent_id" in update_data and update_data["parent_id"] != db_category.parent_id
+    for field, value in update_data.items():
+        setattr(db_category, field, value)
+    db.flush()
+    if moved:
+        category_tree.rebuild_closure(db)
+    db.commit()
+    db.refresh(db_category)
+    category_tree.invalidate()
+    # A move changes which products fall under every ancestor on both sides
+    response_cache.invalidate(CATEGORIES_TAG, PRODUCTS_TAG)
+    return db_category
+
+
+def delete_category(db: Session, db_category: models.Category) -> None:
+    # Children move up to the deleted category's parent
+    db.query(models.Category).filter(
+        models.Category.parent_id == db_category.id
+    ).update({models.Category.parent_id: db_category.parent_id}, synchronize_session=False)
+    db.delete(db_category)
+    db.flush()
+    category_tree.rebuild_closure(db)
+    db.commit()
+    response_cache.invalidate(CATEGORIES_TAG, PRODUCTS_TAG)
+
+
+def get_category_tree(db: Session) -> List[dict]:
+    return category_tree.get_tree(db)
+
+
 # Product CRUD
-def get_products(
+# Exact listing totals are cached briefly per filter tuple so paging through
+# the same result set doesn't rescan it for every page.
+_product_count_cache = TTLCache(maxsize=1024, ttl=settings.product_count_cache_ttl)
+
+
+def _product_filters(
     db: Session,
-    skip: int = 0,
-    limit: int = 20,
     search: Optional[str] = None,
     semantic_search: Optional[str] = None,
     category_id: Optional[int] = None,
     min_price: Optional[float] = None,
-    max_price: Optional[float] = None,
-    sort_by: str = "created_at",
-    sort_order: str = "desc"
-) -> List[models.Product]:
+    max_price: Optional[float] = None
+) -> list:
+    """WHERE criteria shared by customer-facing product listings and their counts."""
     # Use .is_(True) for boolean column comparisons
-    query = db.query(models.Product).filter(models.Product.is_active.is_(True))
+    criteria = [models.Product.is_active.is_(True)]
     
     # Only show approved products to customers (not admin/seller views)
-    query = query.filter(models.Product.approval_status == "approved")
+    criteria.append(models.Product.approval_status == "approved")
     
-    # Eager load seller to prevent N+1 queries
-    query = query.options(joinedload(models.Product.seller))
-    
-    # Apply filters
     if search:
-        if semantic_search:
-            query = query.filter(models.Product.title.ilike(f"%{semantic_search}%"))
-        elif search:
-            query = query.filter(models.Product.title.ilike(f"%{search}%"))
+        # Full-text match over title, short_description and description
+        criteria.append(product_search.match_criterion(db, semantic_search or search))
     
     if category_id:
-        query = query.filter(models.Product.category_id == category_id)
+        # A category matches its own products and those of every subcategory
+        criteria.append(models.Product.category_id.in_(category_tree.descendant_ids(category_id)))
     
     if min_price is not None:
-        query = query.filter(models.Product.price >= min_price)
+        criteria.append(models.Product.price >= min_price)
     
     if max_price is not None:
-        query = query.filter(models.Product.price <= max_price)
+        criteria.append(models.Product.price <= max_price)
     
-    # Apply sorting
+    return criteria
+
+
+def _product_listing_query(
+    db: Session,
+    search: Optional[str] = None,
+    semantic_search: Optional[str] = None,
+    category_id: Optional[int] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None
+):
+    """Base query for customer-facing product listings (filters only, no ordering)."""
+    query = db.query(models.Product).filter(*_product_filters(
+        db,
+        search=search,
+        semantic_search=semantic_search,
+        category_id=category_id,
+        min_price=min_price,
+        max_price=max_price
+    ))
+    
+    # Eager load seller to prevent N+1 queries
+    return query.options(joinedload(models.Product.seller))
+
+
+def _product_sort_column(sort_by: str):
     if sort_by == "price":
-        order_column = models.Product.price
+        return models.Product.price
     elif sort_by == "rating":
-        order_column = models.Product.rating
+        return models.Product.rating
     elif sort_by == "title":
-        order_column = models.Product.title
-    else:
-        order_column = models.Product.created_at
+        return models.Product.title
+    return models.Product.created_at
+
+
+def _order_products(query, db: Session, sort_by: str, sort_order: str, search: Optional[str] = None):
+    """Apply listing order. `relevance` needs a search term and falls back to newest first."""
+    if sort_by == "relevance":
+        rank = product_search.relevance_order(db, search) if search else None
+        if rank is not None:
+            return query.order_by(rank, desc(models.Product.id))
+        return query.order_by(desc(models.Product.created_at))
     
+    order_column = _product_sort_column(sort_by)
     if sort_order == "asc":
-        query = query.order_by(asc(order_column))
-    else:
-        query = query.order_by(desc(order_column))
+        return query.order_by(asc(order_column))
+    return query.order_by(desc(order_column))
+
+
+def get_products(
+    db: Session,
+    skip: int = 0,
+    limit: int = 20,
+    search: Optional[str] = None,
+    semantic_search: Optional[str] = None,
+    category_id: Optional[int] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    sort_by: str = "created_at",
+    sort_order: str = "desc"
+) -> List[models.Product]:
+    query = _product_listing_query(
+        db,
+        search=search,
+        semantic_search=semantic_search,
+        category_id=category_id,
+        min_price=min_price,
+        max_price=max_price
+    )
+    
+    # Apply sorting
+    query = _order_products(query, db, sort_by, sort_order, search=semantic_search or search)
     
     return query.offset(skip).limit(limit).all()
 
 
+def get_products_with_total(
+    db: Session,
+    skip: int = 0,
+    limit: int = 20,
+    search: Optional[str] = None,
+    semantic_search: Optional[str] = None,
+    category_id: Optional[int] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    sort_by: str = "created_at",
+    sort_order: str = "desc"
+) -> Tuple[List[models.Product], int]:
+    """Return one page of products plus the exact filtered total.
+
+    On Postgres the total comes from a `COUNT(*) OVER ()` window column on the
+    page query itself, so the filtered scan runs once. Elsewhere (and for pages
+    past the end) it falls back to the cached `count_products`.
+    """
+    if db.get_bind().dialect.name != "postgresql":
+        products = get_products(
+            db,
+            skip=skip,
+            limit=limit,
+            search=search,
+            semantic_search=semantic_search,
+            category_id=category_id,
+            min_price=min_price,
+            max_price=max_price,
+            sort_by=sort_by,
+            sort_order=sort_order
+        )
+        total = count_products(
+            db,
+            search=search,
+            semantic_search=semantic_search,
+            category_id=category_id,
+            min_price=min_price,
+            max_price=max_price
+        )
+        return products, total
+    
+    query = _product_listing_query(
+        db,
+        search=search,
+        semantic_search=semantic_search,
+        category_id=category_id,
+        min_price=min_price,
+        max_price=max_price
+    ).add_columns(func.count().over().label("total_count"))
+    query = _order_products(query, db, sort_by, sort_order, search=semantic_search or search)
+    
+    rows = query.offset(skip).limit(limit).all()
+    if rows:
+        total = int(rows[0].total_count)
+        _product_count_cache.set(_product_count_key(search, semantic_search, category_id, min_price, max_price), total)
+        return [row[0] for row in rows], total
+    if skip == 0:
+        return [], 0
+    # Page past the end: the window count has no row to ride on
+    return [], count_products(
+        db,
+        search=search,
+        semantic_search=semantic_search,
+        category_id=category_id,
+        min_price=min_price,
+        max_price=max_price
+    )
+
+
+def get_products_keyset(
+    db: Session,
+    cursor: Optional[str] = None,
+    limit: int = 20,
+    search: Optional[str] = None,
+    semantic_search: Optional[str] = None,
+    category_id: Optional[int] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    sort_by: str = "created_at",
+    sort_order: str = "desc"
+) -> Tuple[List[models.Product], Optional[str]]:
+    """Cursor-paginated variant of `get_products`; returns (products, next_cursor).
+
+    Relevance ranks are not stable row values, so `sort_by="relevance"` pages by created_at here.
+    """
+    query = _product_listing_query(
+        db,
+        search=search,
+        semantic_search=semantic_search,
+        category_id=category_id,
+        min_price=min_price,
+        max_price=max_price
+    )
+    return paginate_keyset(
+        query,
+        _product_sort_column(sort_by),
+        models.Product.id,
+        limit,
+        cursor=cursor,
+        descending=sort_order != "asc",
+        # Imported products can have a NULL rating; page them as unrated (0)
+        null_value=0.0 if sort_by == "rating" else None
+    )
+
+
 def get_product(db: Session, product_id: int) -> Optional[models.Product]:
     return db.query(models.Product).options(joinedload(models.Product.seller)).filter(models.Product.id == product_id).first()
 
@@ -183,7 +392,7 @@ def get_products_by_seller(db: Session, seller_id: int, skip: int = 0, limit: in
 
 def get_featured_products(db: Session, limit: int = 8) -> List[models.Product]:
     """Get featured products that are active and approved"""
-    return db.query(models.Product).filter(
+    return db.query(models.Product).options(joinedload(models.Product.seller)).filter(
         models.Product.is_featured.is_(True),
         models.Product.is_active.is_(True),
         models.Product.approval_status == "approved"
@@ -197,7 +406,9 @@ def create_product(db: Session, product: schemas.ProductCreate, seller_id: int)
     )
     db.add(db_product)
     db.commit()
+    product_images.refresh_image_urls(db, [db_product.id])
     db.refresh(db_product)
+    response_cache.invalidate(PRODUCTS_TAG)
     return db_product
 
 
@@ -208,7 +419,10 @@ def update_product(db: Session, product_id: int, product_update: schemas.Product
         for field, value in update_data.items():
             setattr(db_product, field, value)
         db.commit()
+        if "images" in update_data:
+            product_images.refresh_image_urls(db, [product_id])
         db.refresh(db_product)
+        response_cache.invalidate(PRODUCTS_TAG)
     return db_product
 
 
@@ -249,6 +463,7 @@ def approve_product(db: Session, product_id: int, admin_user_id: int) -> Optiona
         db_product.approved_by = admin_user_id
         db.commit()
         db.refresh(db_product)
+        response_cache.invalidate(PRODUCTS_TAG)
     return db_product
 
 
@@ -260,6 +475,7 @@ def reject_product(db: Session, product_id: int, reason: str) -> Optional[models
         db_product.rejection_reason = reason
         db.commit()
         db.refresh(db_product)
+        response_cache.invalidate(PRODUCTS_TAG)
     return db_product
 
 
@@ -268,6 +484,17 @@ def get_cart_items(db: Session, user_id: int) -> List[models.CartItem]:
     return db.query(models.CartItem).filter(models.CartItem.user_id == user_id).all()
 
 
+async def get_cart_items_async(db: AsyncSession, user_id: int) -> List[models.CartItem]:
+    """Cart items with everything `schemas.CartItem` serializes loaded up front
+    (async sessions can't lazy-load)."""
+    stmt = select(models.CartItem).where(models.CartItem.user_id == user_id).options(
+        selectinload(models.CartItem.product).selectinload(models.Product.seller),
+        selectinload(models.CartItem.product).selectinload(models.Product.variants),
+        selectinload(models.CartItem.variant),
+    )
+    return list((await db.execute(stmt)).scalars().all())
+
+
 def add_to_cart(db: Session, user_id: int, product_id: int, quantity: int, variant_id: Optional[int] = None) -> models.CartItem:
     # Check if item already exists in cart (same product and variant)
     existing_item = db.query(models.CartItem).filter(
@@ -333,54 +560,221 @@ def clear_cart(db: Session, user_id: int) -> bool:
 
 
 # Order CRUD
-def create_order(db: Session, order: schemas.OrderCreate, user_id: int) -> models.Order:
-    # Generate unique order number
-    order_number = f"ORD-{uuid.uuid4().hex[:8].upper()}"
-    
-    # Calculate totals
-    total_amount = sum(item.quantity * item.unit_price for item in order.items)
-    
-    db_order = models.Order(
-        user_id=user_id,
-        order_number=order_number,
-        status="pending",
-        total_amount=total_amount,
-        shipping_address=order.shipping_address,
-        billing_address=order.billing_address,
-        payment_method=order.payment_method
-    )
-    db.add(db_order)
-    db.commit()
-    db.refresh(db_order)
-    
-    # Create order items with product snapshots
+class OrderError(ValueError):
+    """Checkout was rejected; `status_code` is the HTTP status to report."""
+
+    def __init__(self, detail: str, status_code: int = 400):
+        super().__init__(detail)
+        self.detail = detail
+        self.status_code = status_code
+
+
+class DuplicateOrderRequest(OrderError):
+    """Another request with the same Idempotency-Key committed its order first."""
+
+    def __init__(self, existing: models.OrderIdempotencyKey):
+        super().__init__("An order was already placed with this Idempotency-Key", status_code=409)
+        self.existing = existing
+
+
+def order_request_hash(order: schemas.OrderCreate) -> str:
+    """Stable fingerprint of a checkout body, stored with its idempotency key."""
+    body = json.dumps(order.dict(), sort_keys=True, default=str)
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+def get_order_idempotency_key(db: Session, user_id: int, key: str) -> Optional[models.OrderIdempotencyKey]:
+    return db.query(models.OrderIdempotencyKey)\
+             .filter(models.OrderIdempotencyKey.user_id == user_id, models.OrderIdempotencyKey.key == key)\
+             .options(joinedload(models.OrderIdempotencyKey.order)
+                      .joinedload(models.Order.order_items).joinedload(models.OrderItem.product))\
+             .first()
+
+
+def _order_item_image(product: models.Product) -> Optional[str]:
+    if product.primary_image_url:
+        return product.primary_image_url
+    images = product.images
+    if isinstance(images, list) and images:
+        return str(images[0])
+    return None
+
+
+_VARIANT_DETAIL_FIELDS = ("sku", "variant_name", "color", "size", "material", "style", "storage", "ram")
+
+
+def _variant_details(variant: models.ProductVariant) -> str:
+    """JSON snapshot of the variant's attributes for `OrderItem.variant_details`."""
+    details = {field: getattr(variant, field) for field in _VARIANT_DETAIL_FIELDS if getattr(variant, field)}
+    details["price_adjustment"] = variant.price_adjustment or 0.0
+    return json.dumps(details)
+
+
+def _reserve_stock(db: Session, model, quantities: dict) -> None:
+    """Take `quantities` ({id: qty}) off `model.inventory_count` in one UPDATE.
+
+    The inventory_count guard keeps this safe even without row locks (SQLite):
+    a row that no longer has enough stock is simply not updated.
+    """
+    if not quantities:
+        return
+    wanted = case(quantities, value=model.id)
+    reserved = db.query(model).filter(
+        model.id.in_(quantities),
+        model.inventory_count >= wanted
+    ).update({model.inventory_count: model.inventory_count - wanted}, synchronize_session=False)
+    if reserved != len(quantities):
+        raise OrderError("Some items sold out while you were checking out", status_code=409)
+
+
+def create_order(
+    db: Session,
+    order: schemas.OrderCreate,
+    user_id: int,
+    redemption: Optional[models.Redemption] = None,
+    clear_cart: bool = True,
+    idempotency_key: Optional[str] = None,
+    request_hash: Optional[str] = None
+) -> models.Order:
+    """Place an order in a single transaction.
+
+    Products and the variants the order names are each loaded in one query
+    (row-locked with FOR UPDATE on Postgres) and stock is taken with one
+    conditional UPDATE per table, so two racing checkouts can never sell the
+    same unit twice. Lines with a `variant_id` are priced at the product price
+    plus the variant's `price_adjustment` and draw on the variant's stock;
+    other lines draw on the product's. Unit prices always come from the
+    database rows. Raises `OrderError` and rolls back on any rejection.
+
+    With `idempotency_key`, the key is stored in the same transaction as the
+    order. If a concurrent request committed the same key first, this one is
+    rolled back and `DuplicateOrderRequest` carries the stored key and order.
+
+    Buyer/seller notifications and loyalty points are enqueued as outbox jobs
+    in the same transaction (see `order_jobs`), not run here.
+    """
+    product_quantities: dict = {}
+    variant_quantities: dict = {}
     for item in order.items:
-        # Get product to capture name and image
-        product = db.query(models.Product).filter(models.Product.id == item.product_id).first()
-        
-        # Get first image from images array if available
-        product_image = None
-        if product and product.images:
-            try:
-                import json
-                images = json.loads(product.images) if isinstance(product.images, str) else product.images
-                if isinstance(images, list) and len(images) > 0:
-                    product_image = images[0]
-            except:
-                pass
-        
-        order_item = models.OrderItem(
-            order_id=db_order.id,
-            product_id=item.product_id,
-            quantity=item.quantity,
-            unit_price=item.unit_price,
-            total_price=item.quantity * item.unit_price,
-            product_name=product.title if product else None,
-            product_image=product_image
+        if item.variant_id is not None:
+            variant_quantities[item.variant_id] = variant_quantities.get(item.variant_id, 0) + int(item.quantity)
+        else:
+            product_quantities[item.product_id] = product_quantities.get(item.product_id, 0) + int(item.quantity)
+    if not order.items or any(qty <= 0 for qty in (*product_quantities.values(), *variant_quantities.values())):
+        raise OrderError("Order must contain at least one item with a positive quantity")
+
+    try:
+        # Lock in id order (products, then variants) so concurrent checkouts can't deadlock each other
+        product_ids = {item.product_id for item in order.items}
+        products = {
+            p.id: p for p in db.query(models.Product).filter(
+                models.Product.id.in_(product_ids)
+            ).order_by(models.Product.id).with_for_update().all()
+        }
+        variants = {}
+        if variant_quantities:
+            variants = {
+                v.id: v for v in db.query(models.ProductVariant).filter(
+                    models.ProductVariant.id.in_(variant_quantities)
+                ).order_by(models.ProductVariant.id).with_for_update().all()
+            }
+
+        for product_id in product_ids:
+            product = products.get(product_id)
+            if product is None:
+                raise OrderError(f"Product {product_id} not found", status_code=404)
+            if product.is_active is False:
+                raise OrderError(f"Product {product.title} is not available")
+        for product_id, qty in product_quantities.items():
+            product = products[product_id]
+            if qty > (product.inventory_count or 0):
+                raise OrderError(f"Only {product.inventory_count or 0} items available for {product.title}")
+        for item in order.items:
+            if item.variant_id is None:
+                continue
+            variant = variants.get(item.variant_id)
+            if variant is None or variant.product_id != item.product_id or variant.is_active is False:
+                raise OrderError(f"Product variant {item.variant_id} not found", status_code=404)
+        for variant_id, qty in variant_quantities.items():
+            variant = variants[variant_id]
+            if qty > (variant.inventory_count or 0):
+                title = products[variant.product_id].title
+                raise OrderError(f"Only {variant.inventory_count or 0} items available for this variant of {title}")
+
+        _reserve_stock(db, models.Product, product_quantities)
+        _reserve_stock(db, models.ProductVariant, variant_quantities)
+
+        def unit_price(item) -> float:
+            price = products[item.product_id].price
+            if item.variant_id is not None:
+                price += variants[item.variant_id].price_adjustment or 0.0
+            return price
+
+        total_amount = sum(unit_price(item) * item.quantity for item in order.items)
+        db_order = models.Order(
+            user_id=user_id,
+            order_number=f"ORD-{uuid.uuid4().hex[:8].upper()}",
+            status="pending",
+            total_amount=total_amount,
+            shipping_address=order.shipping_address,
+            billing_address=order.billing_address,
+            payment_method=order.payment_method
         )
-        db.add(order_item)
-    
-    db.commit()
+        db.add(db_order)
+        db.flush()
+
+        db.execute(insert(models.OrderItem), [
+            {
+                "order_id": db_order.id,
+                "product_id": item.product_id,
+                "variant_id": item.variant_id,
+                "quantity": item.quantity,
+                "unit_price": unit_price(item),
+                "total_price": item.quantity * unit_price(item),
+                "product_name": products[item.product_id].title,
+                "product_image": _order_item_image(products[item.product_id]),
+                "variant_details": _variant_details(variants[item.variant_id]) if item.variant_id is not None else None,
+            }
+            for item in order.items
+        ])
+
+        if redemption is not None:
+            discount_amount = float(getattr(redemption, "reward_value", 0) or 0)
+            db_order.discount_amount = discount_amount
+            db_order.discount_code = order.discount_code.strip() if order.discount_code else ""
+            db_order.applied_redemption_id = redemption.id
+            db_order.total_amount = max(0.0, total_amount - discount_amount)
+            setattr(redemption, "status", "used")
+            setattr(redemption, "order_id", db_order.id)
+            setattr(redemption, "used_at", datetime.utcnow())
+
+        if clear_cart:
+            db.query(models.CartItem).filter(models.CartItem.user_id == user_id).delete(synchronize_session=False)
+
+        # Notifications and loyalty points run after the commit, off the request path
+        jobs.enqueue(db, jobs.ORDER_NOTIFICATIONS, {"order_id": db_order.id})
+        jobs.enqueue(db, jobs.ORDER_LOYALTY_POINTS, {"order_id": db_order.id})
+
+        if idempotency_key:
+            db.add(models.OrderIdempotencyKey(
+                user_id=user_id,
+                key=idempotency_key,
+                request_hash=request_hash or order_request_hash(order),
+                order_id=db_order.id
+            ))
+
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        existing = get_order_idempotency_key(db, user_id, idempotency_key) if idempotency_key else None
+        if existing is not None:
+            raise DuplicateOrderRequest(existing)
+        raise
+    except Exception:
+        db.rollback()
+        raise
+
+    jobs.notify()
     db.refresh(db_order)
     return db_order
 
@@ -395,6 +789,14 @@ def get_orders_by_user(db: Session, user_id: int, skip: int = 0, limit: int = 10
              .offset(skip).limit(limit).all()
 
 
+def get_orders_by_user_keyset(db: Session, user_id: int, cursor: Optional[str] = None, limit: int = 100) -> Tuple[List[models.Order], Optional[str]]:
+    """Cursor-paginated variant of `get_orders_by_user`; returns (orders, next_cursor)."""
+    query = db.query(models.Order)\
+              .filter(models.Order.user_id == user_id)\
+              .options(joinedload(models.Order.order_items).joinedload(models.OrderItem.product))
+    return paginate_keyset(query, models.Order.created_at, models.Order.id, limit, cursor=cursor)
+
+
 def get_order(db: Session, order_id: int) -> Optional[models.Order]:
     return db.query(models.Order)\
              .filter(models.Order.id == order_id)\
@@ -449,6 +851,7 @@ def update_product_rating(db: Session, product_id: int):
             product.rating = round(avg_rating, 1)
             product.review_count = len(reviews)
             db.commit()
+            response_cache.invalidate(PRODUCTS_TAG)
 
 
 def count_products(
@@ -459,25 +862,118 @@ def count_products(
     min_price: Optional[float] = None,
     max_price: Optional[float] = None
 ) -> int:
-    """Count products with filters"""
-    query = db.query(models.Product).filter(models.Product.is_active.is_(True))
+    """Count products with the same filters as `get_products` (cached briefly per filter tuple)"""
+    key = _product_count_key(search, semantic_search, category_id, min_price, max_price)
+    cached = _product_count_cache.get(key)
+    if cached is not None:
+        return cached
     
-    if search:
-        if semantic_search:
-            query = query.filter(models.Product.title.ilike(f"%{semantic_search}%"))
-        elif search:
-            query = query.filter(models.Product.title.ilike(f"%{search}%"))
-    
-    if category_id:
-        query = query.filter(models.Product.category_id == category_id)
-    
-    if min_price is not None:
-        query = query.filter(models.Product.price >= min_price)
-    
-    if max_price is not None:
-        query = query.filter(models.Product.price <= max_price)
-    
-    return query.count()
+    total = db.query(func.count(models.Product.id)).filter(*_product_filters(
+        db,
+        search=search,
+        semantic_search=semantic_search,
+        category_id=category_id,
+        min_price=min_price,
+        max_price=max_price
+    )).scalar() or 0
+    _product_count_cache.set(key, total)
+    return total
+
+
+def _product_count_key(search, semantic_search, category_id, min_price, max_price) -> tuple:
+    return (search or None, semantic_search or None, category_id or None, min_price, max_price)
+
+
+# Facet aggregations for the storefront sidebar, cached per normalized search.
+_product_facet_cache = TTLCache(maxsize=512, ttl=settings.product_facet_cache_ttl)
+
+# Upper bounds of the price buckets; the last bucket is open-ended
+PRICE_FACET_BOUNDS = [25, 50, 100, 250, 500]
+
+
+def _price_bucket_expr():
+    whens = [(models.Product.price < bound, i) for i, bound in enumerate(PRICE_FACET_BOUNDS)]
+    return case(*whens, else_=len(PRICE_FACET_BOUNDS))
+
+
+def _rating_band_expr():
+    rating = func.coalesce(models.Product.rating, 0)
+    return case(
+        (rating >= 4, 4),
+        (rating >= 3, 3),
+        (rating >= 2, 2),
+        (rating >= 1, 1),
+        else_=0
+    )
+
+
+def get_product_facets(
+    db: Session,
+    search: Optional[str] = None,
+    semantic_search: Optional[str] = None,
+    category_id: Optional[int] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None
+) -> dict:
+    """Counts per category, price bucket and rating band for the current search.
+
+    One grouped query per facet. Each facet ignores its own filter so the
+    sidebar can show the alternatives (e.g. other categories) with their counts.
+    """
+    term = semantic_search or search
+    normalized = " ".join(product_search.tokenize(term)) if term else None
+    key = (normalized, category_id or None, min_price, max_price)
+    cached = _product_facet_cache.get(key)
+    if cached is not None:
+        return cached
+    
+    def criteria(**overrides):
+        params = dict(
+            search=search,
+            semantic_search=semantic_search,
+            category_id=category_id,
+            min_price=min_price,
+            max_price=max_price
+        )
+        params.update(overrides)
+        return _product_filters(db, **params)
+    
+    category_rows = db.query(
+        models.Product.category_id, models.Category.name, func.count(models.Product.id)
+    ).outerjoin(
+        models.Category, models.Category.id == models.Product.category_id
+    ).filter(*criteria(category_id=None)).group_by(
+        models.Product.category_id, models.Category.name
+    ).order_by(func.count(models.Product.id).desc()).all()
+    
+    bucket = _price_bucket_expr().label("bucket")
+    price_rows = db.query(bucket, func.count(models.Product.id)).filter(
+        *criteria(min_price=None, max_price=None)
+    ).group_by(bucket).all()
+    
+    band = _rating_band_expr().label("band")
+    rating_rows = db.query(band, func.count(models.Product.id)).filter(*criteria()).group_by(band).all()
+    
+    price_counts = {int(b): n for b, n in price_rows}
+    lower_bounds = [0] + PRICE_FACET_BOUNDS
+    upper_bounds = PRICE_FACET_BOUNDS + [None]
+    rating_counts = {int(b): n for b, n in rating_rows}
+    facets = {
+        "categories": [
+            {"category_id": cid, "name": name, "count": n}
+            for cid, name, n in category_rows
+        ],
+        "price": [
+            {"min": lower_bounds[i], "max": upper_bounds[i], "count": price_counts.get(i, 0)}
+            for i in range(len(lower_bounds))
+        ],
+        "rating": [
+            {"min_rating": b, "count": rating_counts.get(b, 0)}
+            for b in (4, 3, 2, 1, 0)
+        ],
+    }
+    _product_facet_cache.set(key, facets)
+    return facets
 
 
 # Return CRUD
@@ -622,7 +1118,6 @@ def get_tier_for_points(db: Session, points: int) -> Optional[models.RewardTier]
     """Get the appropriate tier for a points balance"""
     return db.query(models.RewardTier)\
         .filter(models.RewardTier.min_points <= points)\
-        .filter(or_(models.RewardTier.max_points >= points, models.RewardTier.max_points == None))\
         .order_by(desc(models.RewardTier.min_points))\
         .first()
 
@@ -677,16 +1172,23 @@ def award_points(
     source: str,
     source_id: Optional[str] = None,
     description: Optional[str] = None,
-    metadata: Optional[dict] = None
+    related_order_id: Optional[int] = None,
+    commit: bool = True
 ) -> models.PointsTransaction:
-    """Award points to a loyalty account"""
+    """Award points to a loyalty account.
+
+    `source` and `source_id` only feed the default description; the order a
+    purchase award belongs to is stored in `related_order_id`. With
+    `commit=False` the changes are only flushed, so they commit together with
+    the caller's transaction (e.g. an outbox job's status).
+    """
     account = db.query(models.LoyaltyAccount).filter(models.LoyaltyAccount.id == loyalty_account_id).first()
     if not account:
         raise ValueError("Loyalty account not found")
     
     # Apply tier multiplier if account has a tier
-    if account.tier and account.tier.points_multiplier:
-        points = int(points * account.tier.points_multiplier)
+    if account.tier and account.tier.multiplier:
+        points = int(points * account.tier.multiplier)
     
     # Update account balance
     account.points_balance += points
@@ -700,16 +1202,16 @@ def award_points(
     # Create transaction record
     transaction = models.PointsTransaction(
         loyalty_account_id=loyalty_account_id,
-        transaction_type="earn",
-        points_change=points,
-        points_balance_after=account.points_balance,
-        source=source,
-        source_id=source_id,
+        type="earn",
+        points_amount=points,
         description=description or f"Earned {points} points from {source}",
-        extra_data=metadata
+        related_order_id=related_order_id
     )
     
     db.add(transaction)
+    if not commit:
+        db.flush()
+        return transaction
     db.commit()
     db.refresh(transaction)
     db.refresh(account)
@@ -739,11 +1241,8 @@ def deduct_points(
     # Create transaction record
     transaction = models.PointsTransaction(
         loyalty_account_id=loyalty_account_id,
-        transaction_type="redeem",
-        points_change=-points,
-        points_balance_after=account.points_balance,
-        source=source,
-        source_id=source_id,
+        type="redeem",
+        points_amount=-points,
         description=description or f"Redeemed {points} points for {source}"
     )
     
@@ -1026,6 +1525,7 @@ def approve_product(db: Session, product_id: int, admin_user_id: int) -> Optiona
         setattr(product, "approved_at", func.now())
         db.commit()
         db.refresh(product)
+        response_cache.invalidate(PRODUCTS_TAG)
     return product
 
 def reject_product(db: Session, product_id: int, reason: str) -> Optional[models.Product]:
@@ -1035,6 +1535,7 @@ def reject_product(db: Session, product_id: int, reason: str) -> Optional[models
         setattr(product, "rejection_reason", reason)
         db.commit()
         db.refresh(product)
+        response_cache.invalidate(PRODUCTS_TAG)
     return product
 
 def get_pending_products(db: Session, skip: int = 0, limit: int = 100) -> List[models.Product]:
@@ -1048,5 +1549,7 @@ def update_product_images(db: Session, product_id: int, images: list[int]):
     # Assuming `images` is a list of image IDs
     product.images = images  # Store only the IDs
     db.commit()
+    product_images.refresh_image_urls(db, [product_id])
     db.refresh(product)
+    response_cache.invalidate(PRODUCTS_TAG)
     return product
@@ -1,25 +1,127 @@
-from sqlalchemy import create_engine
+"""
+Database engine, session factory and pool instrumentation.
+
+`create_db_engine` is the single place engines are configured. Pool size,
+overflow, timeout, recycle, pre-ping and the Postgres statement timeout come
+from settings (`db_*`). SQLite (dev) runs in WAL mode with pragmas tuned for a
+web workload.
+
+The pool records two histograms, exposed by `get_db_stats`, the admin
+health metrics endpoint and `/metrics` (with occupancy gauges):
+- `db_pool_checkout_wait_seconds`: time a request waited for a connection
+- `db_pool_checked_out`: connections in use, sampled at every checkout
+"""
+import logging
+import time
+
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
 from .config import settings
+from .metrics import Gauge, Histogram
+
+logger = logging.getLogger(__name__)
 
 # Determine which DB URL to use
 selected_url = settings.supabase_database_url if settings.use_supabase and settings.supabase_database_url else settings.database_url
 
-# Connection args
-conn_args = {}
-if selected_url.startswith("sqlite"):
-    conn_args = {"check_same_thread": False}
-elif selected_url.startswith("postgresql"):
-    conn_args = {"connect_timeout": 10}
+pool_checkout_wait = Histogram(
+    "db_pool_checkout_wait_seconds",
+    [0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10],
+    "Time spent waiting for a pooled connection",
+)
+pool_checked_out = Histogram(
+    "db_pool_checked_out",
+    [1, 2, 4, 8, 16, 32, 64, 128],
+    "Connections checked out, sampled at each checkout",
+)
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that times how long each checkout waits for a connection."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            pool_checkout_wait.observe(time.perf_counter() - started)
+
+
+def _set_sqlite_pragmas(dbapi_conn, connection_record):
+    cursor = dbapi_conn.cursor()
+    try:
+        # WAL lets readers proceed while a writer commits
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA busy_timeout=5000")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.execute("PRAGMA cache_size=-20000")  # ~20 MB page cache
+    finally:
+        cursor.close()
+
+
+def _set_statement_timeout(dbapi_conn, connection_record):
+    cursor = dbapi_conn.cursor()
+    try:
+        cursor.execute(f"SET statement_timeout = {int(settings.db_statement_timeout_ms)}")
+    finally:
+        cursor.close()
+    # psycopg2 opens a transaction for the SET; end it so the session setting sticks
+    dbapi_conn.commit()
+
+
+def _record_checkout(dbapi_conn, connection_record, connection_proxy):
+    pool_checked_out.observe(engine.pool.checkedout())
+
+
+def create_db_engine(url: str = selected_url):
+    """Build the application engine for `url` using the `db_*` settings."""
+    backend = make_url(url).get_backend_name()
+    engine_kwargs = {"pool_pre_ping": settings.db_pool_pre_ping}
+
+    if backend == "sqlite":
+        engine_kwargs["connect_args"] = {"check_same_thread": False}
+        in_memory = make_url(url).database in (None, "", ":memory:")
+        if not in_memory:
+            engine_kwargs.update({
+                "poolclass": InstrumentedQueuePool,
+                "pool_size": settings.db_pool_size,
+                "max_overflow": settings.db_max_overflow,
+                "pool_timeout": settings.db_pool_timeout,
+            })
+        new_engine = create_engine(url, **engine_kwargs)
+        if not in_memory:
+            event.listen(new_engine, "connect", _set_sqlite_pragmas)
+        return new_engine
 
-engine_kwargs = {"pool_pre_ping": True, "connect_args": conn_args}
+    if backend == "postgresql":
+        engine_kwargs["connect_args"] = {"connect_timeout": settings.db_connect_timeout}
+    engine_kwargs.update({
+        "poolclass": InstrumentedQueuePool,
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_recycle": settings.db_pool_recycle,
+    })
+    new_engine = create_engine(url, **engine_kwargs)
+    if backend == "postgresql" and settings.db_statement_timeout_ms > 0:
+        event.listen(new_engine, "connect", _set_statement_timeout)
+    return new_engine
 
-if selected_url.startswith("postgresql"):
-    engine_kwargs.update({"pool_size": 5, "max_overflow": 10, "pool_timeout": 10})
 
 # Create engine
-engine = create_engine(selected_url, **engine_kwargs)
+engine = create_db_engine()
+event.listen(engine, "checkout", _record_checkout)
+
+if isinstance(engine.pool, QueuePool):
+    # Read from engine.pool at scrape time; dispose() replaces the pool object
+    Gauge("db_pool_size", "Configured pool size", fn=lambda: engine.pool.size())
+    Gauge("db_pool_checked_out_connections", "Connections in use", fn=lambda: engine.pool.checkedout())
+    Gauge("db_pool_checked_in_connections", "Idle pooled connections", fn=lambda: engine.pool.checkedin())
+    Gauge("db_pool_overflow_connections", "Connections open beyond pool_size", fn=lambda: engine.pool.overflow())
 
 # Session maker
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -34,3 +136,32 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+def get_db_stats() -> dict:
+    """Current pool occupancy and the checkout histograms."""
+    pool = engine.pool
+    stats = {"pool_class": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        stats.update({
+            "size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+            "max_overflow": settings.db_max_overflow,
+            "timeout_seconds": settings.db_pool_timeout,
+        })
+    stats[pool_checkout_wait.name] = pool_checkout_wait.snapshot()
+    stats[pool_checked_out.name] = pool_checked_out.snapshot()
+    return stats
+
+
+def check_db_connection() -> bool:
+    """Return True if a connection can be opened and queried."""
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+        return True
+    except Exception as e:
+        logger.error(f"Database connection check failed: {str(e)}")
+        return False
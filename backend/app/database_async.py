@@ -0,0 +1,83 @@
+"""
+Async database access for hot read endpoints.
+
+Uses the same database URL and models as `database.py`, switched to an async
+driver: asyncpg for Postgres, aiosqlite for SQLite. The engine is created on
+first use, so importing this module never requires the async drivers.
+
+Endpoints depend on `get_async_db` and either query with 2.0-style `select()`
+or reuse synchronous helpers through `await db.run_sync(fn)`. `run_sync` runs
+the sync code on the event loop while its I/O is awaited on the async
+connection, so no threadpool worker is held while the database works.
+"""
+from typing import AsyncIterator, Optional
+
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+
+from .config import settings
+from .database import selected_url
+
+_engine: Optional[AsyncEngine] = None
+_sessionmaker: Optional[async_sessionmaker] = None
+
+
+def _async_engine_args(url: str):
+    """Translate the sync URL/connect args into their async-driver equivalents."""
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend == "sqlite":
+        return parsed.set(drivername="sqlite+aiosqlite"), {}, {}
+
+    if backend == "postgresql":
+        query = dict(parsed.query)
+        connect_args = {"timeout": settings.db_connect_timeout}
+        if settings.db_statement_timeout_ms > 0:
+            connect_args["server_settings"] = {"statement_timeout": str(settings.db_statement_timeout_ms)}
+        # asyncpg has no `sslmode`; it takes the same mode names as `ssl`
+        sslmode = query.pop("sslmode", None)
+        if sslmode:
+            connect_args["ssl"] = sslmode
+        # Supabase's transaction pooler (pgbouncer, port 6543) can't keep
+        # prepared statements across transactions
+        if parsed.port == 6543:
+            connect_args["statement_cache_size"] = 0
+        engine_kwargs = {
+            "pool_size": settings.db_pool_size,
+            "max_overflow": settings.db_max_overflow,
+            "pool_timeout": settings.db_pool_timeout,
+            "pool_recycle": settings.db_pool_recycle,
+        }
+        return parsed.set(drivername="postgresql+asyncpg", query=query), connect_args, engine_kwargs
+
+    raise RuntimeError(f"No async driver configured for database backend '{backend}'")
+
+
+def get_async_engine() -> AsyncEngine:
+    global _engine, _sessionmaker
+    if _engine is None:
+        url, connect_args, engine_kwargs = _async_engine_args(selected_url)
+        _engine = create_async_engine(
+            url, pool_pre_ping=settings.db_pool_pre_ping, connect_args=connect_args, **engine_kwargs
+        )
+        _sessionmaker = async_sessionmaker(_engine, expire_on_commit=False, autoflush=False)
+    return _engine
+
+
+def AsyncSessionLocal() -> AsyncSession:
+    get_async_engine()
+    return _sessionmaker()
+
+
+# Dependency
+async def get_async_db() -> AsyncIterator[AsyncSession]:
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+async def dispose_async_engine() -> None:
+    global _engine, _sessionmaker
+    if _engine is not None:
+        await _engine.dispose()
+        _engine = None
+        _sessionmaker = None
@@ -61,6 +61,138 @@ def coalesce_orders_null_status(engine: Engine) -> None:
             pass
 
 
+def ensure_keyset_pagination_indexes(engine: Engine) -> None:
+    """Create composite (sort column, id) indexes used by cursor pagination.
+
+    `CREATE INDEX IF NOT EXISTS` is understood by both SQLite and Postgres.
+    """
+    statements = [
+        "CREATE INDEX IF NOT EXISTS ix_products_created_at_id ON products (created_at, id)",
+        "CREATE INDEX IF NOT EXISTS ix_products_price_id ON products (price, id)",
+        "CREATE INDEX IF NOT EXISTS ix_orders_user_created_at_id ON orders (user_id, created_at, id)",
+        "CREATE INDEX IF NOT EXISTS ix_orders_created_at_id ON orders (created_at, id)",
+        "CREATE INDEX IF NOT EXISTS ix_notifications_user_created_at_id ON notifications (user_id, created_at, id)",
+        "CREATE INDEX IF NOT EXISTS ix_messages_created_at_id ON messages (created_at, id)",
+    ]
+    with engine.begin() as conn:
+        for stmt in statements:
+            conn.exec_driver_sql(stmt)
+
+
+def ensure_message_inbox_indexes(engine: Engine) -> None:
+    """Create the indexes behind the conversation inbox query.
+
+    `(receiver_id, is_read)` serves unread counts; `(sender_id, receiver_id,
+    created_at)` serves the per-partner latest message lookups.
+    """
+    statements = [
+        "CREATE INDEX IF NOT EXISTS ix_messages_receiver_is_read ON messages (receiver_id, is_read)",
+        "CREATE INDEX IF NOT EXISTS ix_messages_sender_receiver_created_at "
+        "ON messages (sender_id, receiver_id, created_at)",
+    ]
+    with engine.begin() as conn:
+        for stmt in statements:
+            conn.exec_driver_sql(stmt)
+
+
+def ensure_product_search_index(engine: Engine) -> None:
+    """Create the full-text index used by `product_search`.
+
+    Postgres: a generated, weighted `search_vector` tsvector column with a GIN index.
+    SQLite: an external-content FTS5 table `products_fts` kept in sync by triggers,
+    rebuilt from `products` the first time it is created.
+    """
+    dialect = engine.dialect.name
+    if dialect == "postgresql":
+        with engine.begin() as conn:
+            conn.exec_driver_sql(
+                "ALTER TABLE products ADD COLUMN IF NOT EXISTS search_vector tsvector "
+                "GENERATED ALWAYS AS ("
+                "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+                "setweight(to_tsvector('english', coalesce(short_description, '')), 'B') || "
+                "setweight(to_tsvector('english', coalesce(description, '')), 'C')"
+                ") STORED"
+            )
+            conn.exec_driver_sql(
+                "CREATE INDEX IF NOT EXISTS ix_products_search_vector ON products USING GIN (search_vector)"
+            )
+        return
+    if dialect != "sqlite":
+        return
+
+    with engine.begin() as conn:
+        exists = conn.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'products_fts'"
+        ).first()
+        if exists:
+            return
+        conn.exec_driver_sql(
+            "CREATE VIRTUAL TABLE products_fts USING fts5("
+            "title, short_description, description, "
+            "content='products', content_rowid='id', tokenize='porter unicode61')"
+        )
+        conn.exec_driver_sql(
+            "CREATE TRIGGER IF NOT EXISTS products_fts_ai AFTER INSERT ON products BEGIN "
+            "INSERT INTO products_fts(rowid, title, short_description, description) "
+            "VALUES (new.id, new.title, new.short_description, new.description); "
+            "END"
+        )
+        conn.exec_driver_sql(
+            "CREATE TRIGGER IF NOT EXISTS products_fts_ad AFTER DELETE ON products BEGIN "
+            "INSERT INTO products_fts(products_fts, rowid, title, short_description, description) "
+            "VALUES ('delete', old.id, old.title, old.short_description, old.description); "
+            "END"
+        )
+        conn.exec_driver_sql(
+            "CREATE TRIGGER IF NOT EXISTS products_fts_au AFTER UPDATE OF title, short_description, description "
+            "ON products BEGIN "
+            "INSERT INTO products_fts(products_fts, rowid, title, short_description, description) "
+            "VALUES ('delete', old.id, old.title, old.short_description, old.description); "
+            "INSERT INTO products_fts(rowid, title, short_description, description) "
+            "VALUES (new.id, new.title, new.short_description, new.description); "
+            "END"
+        )
+        # Index the rows that existed before the table did
+        conn.exec_driver_sql("INSERT INTO products_fts(products_fts) VALUES ('rebuild')")
+
+
+def ensure_product_image_url_columns(engine: Engine) -> None:
+    """Add the denormalized image URL columns to products.
+
+    Existing rows keep NULLs (resolved live on read) until
+    scripts/backfill_product_image_urls.py fills them in.
+    """
+    if engine.dialect.name == "postgresql":
+        with engine.begin() as conn:
+            conn.exec_driver_sql("ALTER TABLE products ADD COLUMN IF NOT EXISTS image_urls JSONB")
+            conn.exec_driver_sql("ALTER TABLE products ADD COLUMN IF NOT EXISTS primary_image_url VARCHAR")
+        return
+    _sqlite_add_column(engine, "products", "image_urls", "JSON")
+    _sqlite_add_column(engine, "products", "primary_image_url", "VARCHAR")
+
+
+def ensure_category_closure(engine: Engine) -> None:
+    """Backfill the category closure table when it is out of step with categories.
+
+    Every category has exactly one depth-0 row, so comparing the two counts
+    catches fresh tables and rows written before the closure existed.
+    """
+    from .category_tree import rebuild_closure
+
+    with engine.begin() as conn:
+        categories = conn.exec_driver_sql("SELECT COUNT(*) FROM categories").scalar()
+        self_rows = conn.exec_driver_sql("SELECT COUNT(*) FROM category_closure WHERE depth = 0").scalar()
+        if categories != self_rows:
+            rebuild_closure(conn)
+
+
+def ensure_badge_counters(engine: Engine) -> None:
+    """Install the unread-counter triggers, backfilling counters on first install."""
+    from .badge_counters import install
+
+    install(engine)
+
+
 def run_all(engine: Engine) -> None:
     """Run all lightweight startup migrations idempotently."""
     try:
@@ -72,6 +204,10 @@ def run_all(engine: Engine) -> None:
         coalesce_products_null_counts(engine)
     except Exception:
         pass
+    try:
+        ensure_product_image_url_columns(engine)
+    except Exception:
+        pass
     try:
         ensure_reviews_order_id_column(engine)
     except Exception:
@@ -80,3 +216,26 @@ def run_all(engine: Engine) -> None:
         coalesce_orders_null_status(engine)
     except Exception:
         pass
+    try:
+        ensure_keyset_pagination_indexes(engine)
+    except Exception:
+        pass
+    try:
+        ensure_message_inbox_indexes(engine)
+    except Exception:
+        pass
+    try:
+        ensure_badge_counters(engine)
+    except Exception as e:
+        # Badge endpoints fall back to COUNT queries
+        print(f"[WARNING] Unread counter triggers unavailable: {e}")
+    try:
+        ensure_product_search_index(engine)
+    except Exception as e:
+        # FTS5 may be missing from the SQLite build; search falls back to ILIKE
+        print(f"[WARNING] Product search index unavailable: {e}")
+    try:
+        ensure_category_closure(engine)
+    except Exception as e:
+        # Category filters return nothing until the closure is built
+        print(f"[WARNING] Category closure backfill failed: {e}")
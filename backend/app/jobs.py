@@ -0,0 +1,185 @@
+"""
+Transactional outbox for side-effects that shouldn't slow down or break the
+request that caused them (notifications, loyalty awards, ...).
+
+`enqueue` adds an `OutboxJob` row to the caller's session, so a job commits or
+rolls back together with the change that produced it. `drain` claims due jobs
+and runs their registered handlers. It is called either by the asyncio worker
+that `main.py` starts in each web process (`outbox_worker_enabled`) or by
+`scripts/run_outbox_worker.py` running as a separate process. Several
+drainers can run at once; on Postgres jobs are claimed with
+FOR UPDATE SKIP LOCKED.
+
+A job that raises is retried with exponential backoff. After
+`outbox_max_attempts` tries it is left in status "failed" with the last
+traceback. A job may run more than once (e.g. if a worker dies mid-job), so
+handlers should tolerate repeats.
+"""
+import asyncio
+import traceback
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+
+from . import models
+from .config import settings
+from .database import SessionLocal
+
+Handler = Callable[[Session, dict], None]
+_handlers: Dict[str, Handler] = {}
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_wakeup: Optional[asyncio.Event] = None
+_task: Optional[asyncio.Task] = None
+
+MAX_BACKOFF_SECONDS = 3600
+
+# Job types (handlers live in order_jobs.py)
+ORDER_NOTIFICATIONS = "order.notifications"
+ORDER_LOYALTY_POINTS = "order.loyalty_points"
+
+
+def handler(job_type: str):
+    """Register the decorated function as the handler for `job_type`.
+
+    Handlers receive a session and the job payload. Their writes are committed
+    together with the job being marked done, unless they commit themselves.
+    """
+    def register(fn: Handler) -> Handler:
+        _handlers[job_type] = fn
+        return fn
+    return register
+
+
+def _load_handlers() -> None:
+    # Imported lazily: the handler modules use crud, which enqueues jobs
+    from . import order_jobs  # noqa: F401
+
+
+def enqueue(db: Session, job_type: str, payload: dict, delay_seconds: float = 0) -> models.OutboxJob:
+    """Add a job to `db`; it becomes visible to workers when `db` commits."""
+    job = models.OutboxJob(
+        job_type=job_type,
+        payload=payload,
+        status="pending",
+        attempts=0,
+        run_after=datetime.utcnow() + timedelta(seconds=delay_seconds)
+    )
+    db.add(job)
+    return job
+
+
+def notify() -> None:
+    """Wake the in-process worker so freshly committed jobs run right away.
+
+    Safe to call from threadpool endpoints; a no-op when no worker is running.
+    """
+    if _loop is not None and _wakeup is not None:
+        try:
+            _loop.call_soon_threadsafe(_wakeup.set)
+        except RuntimeError:
+            pass  # loop already closed during shutdown
+
+
+def _claim(db: Session, limit: int) -> List[int]:
+    now = datetime.utcnow()
+    stale = now - timedelta(seconds=settings.outbox_lock_timeout)
+    jobs = db.query(models.OutboxJob).filter(or_(
+        and_(models.OutboxJob.status == "pending", models.OutboxJob.run_after <= now),
+        and_(models.OutboxJob.status == "running", models.OutboxJob.locked_at < stale),
+    )).order_by(models.OutboxJob.id).limit(limit).with_for_update(skip_locked=True).all()
+    for job in jobs:
+        job.status = "running"
+        job.locked_at = now
+        job.attempts = (job.attempts or 0) + 1
+    db.commit()
+    return [job.id for job in jobs]
+
+
+def _run(job_id: int) -> bool:
+    db = SessionLocal()
+    try:
+        job = db.get(models.OutboxJob, job_id)
+        if job is None:
+            return False
+        job_type = job.job_type
+        try:
+            fn = _handlers.get(job_type)
+            if fn is None:
+                raise LookupError(f"No handler registered for job type '{job_type}'")
+            fn(db, dict(job.payload or {}))
+            job = db.get(models.OutboxJob, job_id)
+            job.status = "done"
+            job.locked_at = None
+            job.last_error = None
+            db.commit()
+            return True
+        except Exception as e:
+            db.rollback()
+            job = db.get(models.OutboxJob, job_id)
+            job.locked_at = None
+            job.last_error = traceback.format_exc(limit=5)
+            if job.attempts >= settings.outbox_max_attempts:
+                job.status = "failed"
+            else:
+                job.status = "pending"
+                backoff = min(2 ** job.attempts, MAX_BACKOFF_SECONDS)
+                job.run_after = datetime.utcnow() + timedelta(seconds=backoff)
+            db.commit()
+            print(f"[WARNING] Outbox job {job_id} ({job_type}) failed on attempt {job.attempts}: {e}")
+            return False
+    finally:
+        db.close()
+
+
+def drain(limit: Optional[int] = None) -> int:
+    """Claim and run up to `limit` due jobs; returns how many were claimed."""
+    _load_handlers()
+    db = SessionLocal()
+    try:
+        job_ids = _claim(db, limit or settings.outbox_batch_size)
+    finally:
+        db.close()
+    for job_id in job_ids:
+        _run(job_id)
+    return len(job_ids)
+
+
+async def _worker() -> None:
+    while True:
+        _wakeup.clear()
+        try:
+            claimed = await asyncio.to_thread(drain)
+        except Exception as e:
+            print(f"[WARNING] Outbox worker error: {e}")
+            claimed = 0
+        if claimed:
+            continue
+        try:
+            await asyncio.wait_for(_wakeup.wait(), timeout=settings.outbox_poll_interval)
+        except asyncio.TimeoutError:
+            pass
+
+
+def start_worker() -> None:
+    """Start the in-process outbox worker on the running event loop."""
+    global _loop, _wakeup, _task
+    if _task is not None:
+        return
+    _loop = asyncio.get_running_loop()
+    _wakeup = asyncio.Event()
+    _task = _loop.create_task(_worker())
+
+
+async def stop_worker() -> None:
+    global _loop, _wakeup, _task
+    if _task is None:
+        return
+    _task.cancel()
+    try:
+        await _task
+    except asyncio.CancelledError:
+        pass
+    _loop = _wakeup = _task = None
@@ -3,23 +3,31 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 from fastapi.middleware.httpsredirect import HTTPSRedirectMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 from .config import settings
 from .database import engine
+from .database_async import dispose_async_engine
 from . import models
 from . import db_migrations
+from . import jobs
+from . import rate_limit
+from .metrics import render_prometheus
+from .request_metrics import RequestMetricsMiddleware
+from .system_metrics import sampler as system_sampler
 from .routers import (
     auth, products, cart, orders, categories, seller, admin,
     payments, messages, notifications, user_stats, favorites,
-    sms, reviews, ws_messages, chatbot, returns, loyalty, health, variants, product_variants
+    sms, reviews, ws_messages, chatbot, returns, loyalty, health, variants, product_variants, me
 )
 from .ws_redis import bridge
+from .ws_manager import manager as ws_manager
 from .security_middleware import (
     RateLimitMiddleware, 
     RequestLoggingMiddleware, 
     SecurityHeadersMiddleware
 )
 import os
+import secrets
 from datetime import datetime
 from sqlalchemy import text
 
@@ -59,8 +67,12 @@ app.add_middleware(SecurityHeadersMiddleware)
 # Add request logging middleware for security monitoring
 app.add_middleware(RequestLoggingMiddleware)
 
-# Add rate limiting middleware - DISABLED for development
-# app.add_middleware(RateLimitMiddleware, requests_per_minute=300, requests_per_hour=5000)
+# Add rate limiting middleware (per user/IP and per route; shared via Redis when rate_limit_use_redis is set)
+if settings.rate_limit_enabled:
+    app.add_middleware(RateLimitMiddleware)
+
+# Per-route latency, in-flight and per-request SQL metrics (outside the rate limiter so 429s are counted)
+app.add_middleware(RequestMetricsMiddleware)
 
 if not settings.debug:
     app.add_middleware(HTTPSRedirectMiddleware)
@@ -108,7 +120,7 @@ app.mount("/uploads", StaticFiles(directory=uploads_dir), name="uploads")
 routers = [
     auth, products, cart, orders, categories, seller, admin,
     payments, messages, notifications, user_stats, favorites,
-    sms, reviews, chatbot, returns, loyalty, health, variants, product_variants
+    sms, reviews, chatbot, returns, loyalty, health, variants, product_variants, me
 ]
 
 for router in routers:
@@ -139,20 +151,48 @@ async def startup_events():
         print("[OK] DB migrations completed")
     except Exception as e:
         print(f"[WARNING] DB migrations error (non-fatal): {e}")
-    # Initialize Redis bridge (best-effort)
-    #try:
-    #    print("Initializing Redis bridge...")
-    #    await bridge.init()
-    #    print("[OK] Redis bridge initialized")
-    #except Exception as e:
-    #    print(f"[WARNING] Redis bridge error (non-fatal): {e}")
+    # Drain the order side-effect outbox in-process (disable when running scripts/run_outbox_worker.py)
+    if settings.outbox_worker_enabled:
+        jobs.start_worker()
+    # Sample CPU/memory in the background so health checks never block on psutil
+    system_sampler.start()
+    # Ping websockets and reap idle ones
+    ws_manager.start_heartbeat()
+    # Cross-worker websocket delivery; falls back to this worker's sockets without Redis
+    if settings.ws_redis_enabled:
+        try:
+            print("Initializing Redis bridge...")
+            await bridge.init()
+            print("[OK] Redis bridge initialized" if bridge.redis else "[WARNING] Redis bridge not connected")
+        except Exception as e:
+            print(f"[WARNING] Redis bridge error (non-fatal): {e}")
 
 @app.on_event("shutdown")
 async def shutdown_events():
+    try:
+        await jobs.stop_worker()
+    except Exception:
+        pass
+    try:
+        await system_sampler.stop()
+    except Exception:
+        pass
+    try:
+        await ws_manager.stop_heartbeat()
+    except Exception:
+        pass
     try:
         await bridge.close()
     except Exception:
         pass
+    try:
+        await rate_limit.limiter.close()
+    except Exception:
+        pass
+    try:
+        await dispose_async_engine()
+    except Exception:
+        pass
 
 # ----------------------------------------------------------------
 # Core endpoints
@@ -171,6 +211,22 @@ def health_check():
     return {"status": "healthy", "message": "MegaMart API is running securely"}
 
 
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics(request: Request):
+    """Prometheus scrape endpoint (per worker process).
+
+    Needs `metrics_token` outside debug mode; without one it is not served.
+    """
+    if not settings.metrics_token:
+        if not settings.debug:
+            raise HTTPException(status_code=404, detail="Not Found")
+    else:
+        expected = f"Bearer {settings.metrics_token}"
+        if not secrets.compare_digest(request.headers.get("authorization", ""), expected):
+            raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 # Backwards-compatible aliases for older clients/scripts that use /api/*
 @app.get("/api/health")
 def health_check_alias():
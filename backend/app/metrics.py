@@ -0,0 +1,204 @@
+"""
+In-process metric primitives and Prometheus text exposition.
+
+`Histogram` counts observations into fixed upper-bound buckets (cumulative,
+Prometheus style) and keeps a running count and sum. `Counter` and `Gauge` hold
+a single value; a `Gauge` built with `fn` is read from that callable at scrape
+time instead. `MetricVec` adds labels: `vec.labels("GET", "/items").observe(x)`.
+All of them are thread-safe and cheap enough to call from SQLAlchemy pool
+events and per-request middleware.
+
+Every metric registers itself in `REGISTRY`, which `render_prometheus` turns
+into the text format served at `/metrics`.
+"""
+import bisect
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric) -> None:
+        with self._lock:
+            self._metrics[metric.name] = metric
+
+    def metrics(self) -> List[Any]:
+        with self._lock:
+            return list(self._metrics.values())
+
+
+REGISTRY = Registry()
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, buckets: Sequence[float], description: str = "", registry: Optional[Registry] = REGISTRY):
+        self.name = name
+        self.description = description
+        self.buckets = sorted(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+        if registry is not None:
+            registry.register(self)
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+            self._count += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Cumulative bucket counts keyed by upper bound, plus count and sum."""
+        with self._lock:
+            counts = list(self._counts)
+            total, count = self._sum, self._count
+        cumulative: Dict[str, int] = {}
+        running = 0
+        for bound, n in zip([*map(str, self.buckets), "+Inf"], counts):
+            running += n
+            cumulative[bound] = running
+        return {"buckets": cumulative, "count": count, "sum": round(total, 6)}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counts = [0] * (len(self.buckets) + 1)
+            self._sum = 0.0
+            self._count = 0
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, description: str = "", registry: Optional[Registry] = REGISTRY):
+        self.name = name
+        self.description = description
+        self._value = 0.0
+        self._lock = threading.Lock()
+        if registry is not None:
+            registry.register(self)
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+
+class Gauge:
+    kind = "gauge"
+
+    def __init__(self, name: str, description: str = "", fn: Optional[Callable[[], float]] = None,
+                 registry: Optional[Registry] = REGISTRY):
+        self.name = name
+        self.description = description
+        self.fn = fn
+        self._value = 0.0
+        self._lock = threading.Lock()
+        if registry is not None:
+            registry.register(self)
+
+    def set(self, value: float) -> None:
+        self._value = value
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.inc(-amount)
+
+    @property
+    def value(self) -> float:
+        if self.fn is not None:
+            return self.fn()
+        return self._value
+
+
+class MetricVec:
+    """A family of same-named metrics told apart by label values."""
+
+    def __init__(self, factory: Callable[[], Any], name: str, labelnames: Sequence[str], description: str = "",
+                 registry: Optional[Registry] = REGISTRY):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self._factory = factory
+        self.kind = factory().kind
+        self._children: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+        if registry is not None:
+            registry.register(self)
+
+    def labels(self, *values) -> Any:
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.get(key)
+                if child is None:
+                    child = self._children[key] = self._factory()
+        return child
+
+    def children(self) -> List[Tuple[Dict[str, str], Any]]:
+        with self._lock:
+            items = list(self._children.items())
+        return [(dict(zip(self.labelnames, key)), child) for key, child in items]
+
+
+def HistogramVec(name: str, buckets: Sequence[float], labelnames: Sequence[str], description: str = "") -> MetricVec:
+    return MetricVec(lambda: Histogram(name, buckets, registry=None), name, labelnames, description)
+
+
+def CounterVec(name: str, labelnames: Sequence[str], description: str = "") -> MetricVec:
+    return MetricVec(lambda: Counter(name, registry=None), name, labelnames, description)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_prometheus(metrics: Optional[Iterable[Any]] = None) -> str:
+    """Render metrics (default: everything in `REGISTRY`) in Prometheus text format 0.0.4."""
+    lines: List[str] = []
+    for metric in (REGISTRY.metrics() if metrics is None else metrics):
+        children = metric.children() if isinstance(metric, MetricVec) else [({}, metric)]
+        try:
+            samples = []
+            for labels, child in children:
+                if metric.kind == "histogram":
+                    snap = child.snapshot()
+                    for bound, count in snap["buckets"].items():
+                        samples.append(f"{metric.name}_bucket{_labels({**labels, 'le': bound})} {count}")
+                    samples.append(f"{metric.name}_sum{_labels(labels)} {_format_value(snap['sum'])}")
+                    samples.append(f"{metric.name}_count{_labels(labels)} {snap['count']}")
+                else:
+                    samples.append(f"{metric.name}{_labels(labels)} {_format_value(child.value)}")
+        except Exception:
+            # A gauge callback failing (e.g. no pool yet) must not break the whole scrape
+            continue
+        if metric.description:
+            lines.append(f"# HELP {metric.name} {metric.description}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(samples)
+    return "\n".join(lines) + "\n"
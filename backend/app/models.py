@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, Float, Boolean, DateTime, ForeignKey, UniqueConstraint
+from sqlalchemy import Column, Integer, String, Text, Float, Boolean, DateTime, ForeignKey, UniqueConstraint, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from sqlalchemy.dialects.postgresql import JSONB
@@ -74,6 +74,16 @@ class Category(Base):
     products = relationship("Product", back_populates="category")
 
 
+class CategoryClosure(Base):
+    """Every (ancestor, descendant) pair of the category tree, including each
+    category paired with itself at depth 0. Maintained by `category_tree`."""
+    __tablename__ = "category_closure"
+
+    ancestor_id = Column(Integer, ForeignKey("categories.id", ondelete="CASCADE"), primary_key=True)
+    descendant_id = Column(Integer, ForeignKey("categories.id", ondelete="CASCADE"), primary_key=True, index=True)
+    depth = Column(Integer, nullable=False, default=0)
+
+
 class Product(Base):
     __tablename__ = "products"
     
@@ -91,6 +101,9 @@ class Product(Base):
     weight = Column(Float, nullable=True)
     dimensions = Column(JSONB if settings.use_supabase else JSON, nullable=True)  # {"length": 10, "width": 5, "height": 2}
     images = Column(JSONB if settings.use_supabase else JSON, nullable=True)  # ["image1.jpg", "image2.jpg"]
+    # Resolved, ordered URLs for `images` and the first of them; see product_images.refresh_image_urls
+    image_urls = Column(JSONB if settings.use_supabase else JSON, nullable=True)
+    primary_image_url = Column(String, nullable=True)
     is_active = Column(Boolean, default=True)
     is_featured = Column(Boolean, default=False)
     has_variants = Column(Boolean, default=False)  # NEW: Product has color/size variants
@@ -211,6 +224,25 @@ class OrderItem(Base):
     variant = relationship("ProductVariant", foreign_keys=[variant_id])  # NEW
 
 
+class OrderIdempotencyKey(Base):
+    """Client-supplied `Idempotency-Key` for POST /orders, written in the same
+    transaction as the order it created so a retry can return that order."""
+    __tablename__ = "order_idempotency_keys"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    key = Column(String(255), nullable=False)
+    request_hash = Column(String(64), nullable=False)  # sha256 of the request body
+    order_id = Column(Integer, ForeignKey("orders.id"), nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    order = relationship("Order")
+
+    __table_args__ = (
+        UniqueConstraint('user_id', 'key', name='_user_idempotency_key_uc'),
+    )
+
+
 class Return(Base):
     __tablename__ = "returns"
     
@@ -514,3 +546,34 @@ class ProductVariantOption(Base):
     # Relationships
     product = relationship("Product")
     variant = relationship("ProductVariant")
+
+
+class OutboxJob(Base):
+    """Deferred side-effect (notification, loyalty award, ...) written in the
+    same transaction as the change that caused it and run by `app.jobs`."""
+    __tablename__ = "outbox_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    job_type = Column(String, nullable=False)
+    payload = Column(JSONB if settings.use_supabase else JSON, nullable=False)
+    status = Column(String, nullable=False, default="pending")  # pending, running, done, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    run_after = Column(DateTime(timezone=True), server_default=func.now())
+    locked_at = Column(DateTime(timezone=True), nullable=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+    __table_args__ = (
+        Index('ix_outbox_jobs_status_run_after', 'status', 'run_after'),
+    )
+
+
+class UserBadgeCounter(Base):
+    """Unread counts per user, maintained by database triggers on `messages`
+    and `notifications` (see `app.badge_counters`)."""
+    __tablename__ = "user_badge_counters"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    unread_messages = Column(Integer, nullable=False, default=0, server_default="0")
+    unread_notifications = Column(Integer, nullable=False, default=0, server_default="0")
@@ -0,0 +1,116 @@
+"""
+Bulk notification fan-out for announcements and order notices that go to
+many users at once.
+
+`create_notifications` writes one row per recipient in chunks of
+`notification_fanout_chunk_size`: one id lookup (dropping unknown and inactive
+users), one executemany INSERT and one commit per chunk. SQLAlchemy turns the
+executemany into batched multi-row INSERT ... VALUES statements on both
+Postgres and SQLite.
+
+`push_notifications` sends a single websocket event to all recipients. With
+the Redis bridge up it is published to the channels of the recipients who are
+online, on whichever workers hold their sockets; otherwise it goes to the
+connections in this process.
+"""
+from datetime import datetime
+from typing import Iterable, List, Optional
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from . import models
+from .config import settings
+from .ws_redis import bridge
+
+
+def create_notifications(
+    db: Session,
+    user_ids: Iterable[int],
+    title: str,
+    message: str,
+    notification_type: str = "info",
+    related_id: Optional[int] = None,
+    chunk_size: Optional[int] = None
+) -> List[int]:
+    """Insert the same notification for every user in `user_ids`.
+
+    Returns the ids of the users a notification was written for. Each chunk is
+    committed on its own, so a failure part-way keeps the chunks already sent.
+    """
+    chunk_size = chunk_size or settings.notification_fanout_chunk_size
+    recipients = list(dict.fromkeys(int(user_id) for user_id in user_ids))
+    delivered: List[int] = []
+    for start in range(0, len(recipients), chunk_size):
+        chunk = recipients[start:start + chunk_size]
+        try:
+            existing = [user_id for (user_id,) in db.query(models.User.id).filter(
+                models.User.id.in_(chunk),
+                models.User.is_active == True
+            ).all()]
+            if not existing:
+                continue
+            db.execute(insert(models.Notification), [
+                {
+                    "user_id": user_id,
+                    "title": title,
+                    "message": message,
+                    "type": notification_type,
+                    "related_id": related_id,
+                    "is_read": False,
+                }
+                for user_id in existing
+            ])
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        delivered.extend(existing)
+    return delivered
+
+
+async def push_notifications(
+    user_ids: List[int],
+    title: str,
+    message: str,
+    notification_type: str = "info",
+    related_id: Optional[int] = None
+) -> int:
+    """Send one `notification` websocket event to `user_ids`.
+
+    Returns the number of sockets written to in this process, or the number
+    of online recipients the event was published for on the Redis bridge.
+    """
+    payload = {
+        "type": "notification",
+        "notification": {
+            "title": title,
+            "message": message,
+            "type": notification_type,
+            "related_id": related_id,
+            "created_at": datetime.utcnow().isoformat(),
+        },
+    }
+    return await bridge.send_to_users(user_ids, payload)
+
+
+async def fan_out(
+    db: Session,
+    user_ids: Iterable[int],
+    title: str,
+    message: str,
+    notification_type: str = "info",
+    related_id: Optional[int] = None
+) -> int:
+    """Store and push a notification to many users; returns how many were stored."""
+    delivered = await run_in_threadpool(
+        create_notifications, db, user_ids, title, message, notification_type, related_id
+    )
+    if delivered:
+        try:
+            await push_notifications(delivered, title, message, notification_type, related_id)
+        except Exception as e:
+            # The rows are committed; clients still see them on their next fetch
+            print(f"[WARNING] Notification push failed: {e}")
+    return len(delivered)
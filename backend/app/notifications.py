@@ -4,6 +4,7 @@ Notification system for order updates and customer notifications
 from typing import List, Optional
 from sqlalchemy.orm import Session
 from . import models, schemas
+from .notification_fanout import create_notifications
 import logging
 
 logger = logging.getLogger(__name__)
@@ -29,7 +30,7 @@ class NotificationService:
                 title=title,
                 message=message,
                 type=notification_type,
-                related_order_id=related_order_id,
+                related_id=related_order_id,
                 is_read=False
             )
             self.db.add(notification)
@@ -91,23 +92,24 @@ class NotificationService:
     def notify_sellers_new_order(self, order: models.Order):
         """Notify sellers when they receive a new order"""
         try:
-            # Get all sellers involved in this order
-            seller_ids = set()
-            for item in order.items:
-                if item.product and item.product.seller_id:
-                    seller_ids.add(item.product.seller_id)
+            # User ids of every seller with an item in this order, in one query
+            seller_user_ids = [user_id for (user_id,) in self.db.query(models.Seller.user_id).join(
+                models.Product, models.Product.seller_id == models.Seller.id
+            ).join(
+                models.OrderItem, models.OrderItem.product_id == models.Product.id
+            ).filter(
+                models.OrderItem.order_id == order.id,
+                models.Seller.user_id.isnot(None)
+            ).distinct().all()]
             
-            # Create notifications for each seller
-            for seller_id in seller_ids:
-                seller = self.db.query(models.Seller).filter(models.Seller.id == seller_id).first()
-                if seller and seller.user_id:
-                    self.create_notification(
-                        user_id=seller.user_id,
-                        title="New Order Received",
-                        message=f"You have received a new order #{order.id}. Please review and confirm the order.",
-                        notification_type="new_order",
-                        related_order_id=order.id
-                    )
+            create_notifications(
+                self.db,
+                seller_user_ids,
+                title="New Order Received",
+                message=f"You have received a new order #{order.id}. Please review and confirm the order.",
+                notification_type="new_order",
+                related_id=order.id
+            )
                     
         except Exception as e:
             logger.error(f"Failed to notify sellers of new order: {e}")
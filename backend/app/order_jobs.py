@@ -0,0 +1,100 @@
+"""
+Outbox handlers for a newly placed order. `crud.create_order` enqueues both
+jobs in the checkout transaction; see `app.jobs`.
+"""
+from typing import Dict, List
+
+from sqlalchemy.orm import Session
+
+from . import crud, models
+from .jobs import ORDER_LOYALTY_POINTS, ORDER_NOTIFICATIONS, handler
+
+
+def _seller_summary(items: List[dict]) -> str:
+    # Summarize items: up to 3 titles + count
+    titles = ", ".join([i["title"] for i in items[:3]])
+    more = len(items) - 3
+    if more > 0:
+        titles += f" and {more} more"
+    return titles
+
+
+@handler(ORDER_NOTIFICATIONS)
+def notify_order_placed(db: Session, payload: dict) -> None:
+    """Notify the buyer and every seller with items in the order.
+
+    All notifications are added to the session and committed together with
+    the job, so a retry never duplicates them.
+    """
+    order = db.get(models.Order, payload["order_id"])
+    if order is None:
+        return
+
+    notifications = [models.Notification(
+        user_id=order.user_id,
+        title=f"Order #{order.order_number} Placed Successfully",
+        message=f"Your order for ${float(order.total_amount or 0):.2f} has been placed and is awaiting confirmation.",
+        type="new_order",
+        related_id=order.id
+    )]
+
+    # seller_user_id -> list of item summaries, from one join over the order's items
+    seller_items_map: Dict[int, List[dict]] = {}
+    seller_rows = db.query(
+        models.Seller.user_id, models.OrderItem.product_name, models.OrderItem.quantity
+    ).join(
+        models.Product, models.Product.id == models.OrderItem.product_id
+    ).join(
+        models.Seller, models.Seller.id == models.Product.seller_id
+    ).filter(models.OrderItem.order_id == order.id).all()
+    for seller_user_id, title, quantity in seller_rows:
+        if seller_user_id:
+            seller_items_map.setdefault(int(seller_user_id), []).append({
+                "title": title,
+                "quantity": int(quantity)
+            })
+
+    for seller_user_id, items in seller_items_map.items():
+        total_qty = sum(i["quantity"] for i in items)
+        notifications.append(models.Notification(
+            user_id=seller_user_id,
+            title=f"New order #{order.order_number}",
+            message=f"You sold {total_qty} item(s): {_seller_summary(items)}",
+            type="seller_new_order",
+            related_id=order.id
+        ))
+    db.add_all(notifications)
+
+
+@handler(ORDER_LOYALTY_POINTS)
+def award_order_points(db: Session, payload: dict) -> None:
+    """Award loyalty points for the purchase (1 point per $100 spent on final amount).
+
+    The award is flushed, not committed, so it commits together with the job.
+    A job claimed again after that commit finds the order's transaction and
+    does nothing.
+    """
+    order = db.get(models.Order, payload["order_id"])
+    if order is None:
+        return
+    loyalty_account = crud.get_loyalty_account_by_user(db, order.user_id)
+    if not loyalty_account:
+        return
+    already_awarded = db.query(models.PointsTransaction.id).filter(
+        models.PointsTransaction.loyalty_account_id == loyalty_account.id,
+        models.PointsTransaction.type == "earn",
+        models.PointsTransaction.related_order_id == order.id
+    ).first()
+    if already_awarded:
+        return
+    final_amount = float(order.total_amount or 0)
+    points_earned = int(final_amount / 100)  # 1 point per $100
+    crud.award_points(
+        db=db,
+        loyalty_account_id=loyalty_account.id,
+        points=points_earned,
+        source="purchase",
+        description=f"Earned {points_earned} points from order #{order.order_number}",
+        related_order_id=order.id,
+        commit=False
+    )
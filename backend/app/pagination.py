@@ -0,0 +1,128 @@
+"""
+Keyset (cursor) pagination helpers.
+
+Listings paginate on ``(sort_column, id)`` instead of ``OFFSET``, so a deep page
+costs the same as the first one: the database seeks straight to the last row
+of the previous page using the index on the sort column.
+
+Cursors are opaque to clients: a URL-safe base64 JSON blob holding the sort
+value and id of the last row that was returned. An empty cursor (``?cursor=``)
+requests the first page in cursor mode.
+
+SQLite stores DATETIME columns as text, and ``server_default=func.now()``
+writes ``'YYYY-MM-DD HH:MM:SS'`` while a bound ``datetime`` is rendered with
+microseconds, so the two compare as strings that are never equal. On SQLite
+the cursor's datetime is therefore bound as text in the stored format.
+
+A row-value comparison against NULL is never true, so a nullable sort column
+needs a `null_value`: the column is coalesced to it in the ORDER BY, the cursor
+predicate and the cursor itself, and NULL rows page like that value.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import String, asc, desc, func, literal, tuple_
+
+
+def encode_cursor(sort_value: Any, row_id: int) -> str:
+    """Encode the position of a row into an opaque cursor string."""
+    if isinstance(sort_value, datetime):
+        value = {"dt": sort_value.isoformat()}
+    else:
+        value = {"v": sort_value}
+    raw = json.dumps([value, row_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[Any, int]:
+    """Decode a cursor produced by `encode_cursor`. Raises 400 on garbage input."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        value, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if "dt" in value:
+            sort_value = datetime.fromisoformat(value["dt"])
+        else:
+            sort_value = value["v"]
+        return sort_value, int(row_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _cursor_value(sort_value: Any, dialect: Optional[str]):
+    """Bind `sort_value` so it compares like the stored column value."""
+    if dialect == "sqlite" and isinstance(sort_value, datetime):
+        fmt = "%Y-%m-%d %H:%M:%S.%f" if sort_value.microsecond else "%Y-%m-%d %H:%M:%S"
+        return literal(sort_value.strftime(fmt), String)
+    return sort_value
+
+
+def _apply_keyset(query, sort_column, id_column, cursor: Optional[str], descending: bool,
+                  dialect: Optional[str] = None, null_value: Any = None):
+    """Add the cursor predicate and ordering to a Query or select()."""
+    if null_value is not None:
+        sort_column = func.coalesce(sort_column, null_value)
+    if cursor:
+        sort_value, last_id = decode_cursor(cursor)
+        if sort_value is None:
+            sort_value = null_value
+        sort_value = _cursor_value(sort_value, dialect)
+        position = tuple_(sort_column, id_column)
+        if descending:
+            query = query.filter(position < tuple_(sort_value, last_id))
+        else:
+            query = query.filter(position > tuple_(sort_value, last_id))
+    direction = desc if descending else asc
+    return query.order_by(direction(sort_column), direction(id_column))
+
+
+def _trim_page(rows: List[Any], sort_column, id_column, limit: int,
+               null_value: Any = None) -> Tuple[List[Any], Optional[str]]:
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        sort_value = getattr(last, sort_column.key)
+        if sort_value is None:
+            sort_value = null_value
+        next_cursor = encode_cursor(sort_value, getattr(last, id_column.key))
+    return rows, next_cursor
+
+
+def paginate_keyset(
+    query,
+    sort_column,
+    id_column,
+    limit: int,
+    cursor: Optional[str] = None,
+    descending: bool = True,
+    null_value: Any = None,
+) -> Tuple[List[Any], Optional[str]]:
+    """Return one page of `query` ordered by (sort_column, id) and the next cursor.
+
+    `query` must not already be ordered. One extra row is fetched to detect
+    whether another page exists, so no COUNT query is needed. Pass
+    `null_value` when `sort_column` is nullable.
+    """
+    dialect = query.session.get_bind().dialect.name
+    query = _apply_keyset(query, sort_column, id_column, cursor, descending, dialect, null_value)
+    rows = query.limit(limit + 1).all()
+    return _trim_page(rows, sort_column, id_column, limit, null_value)
+
+
+async def paginate_keyset_async(
+    db,
+    stmt,
+    sort_column,
+    id_column,
+    limit: int,
+    cursor: Optional[str] = None,
+    descending: bool = True,
+    null_value: Any = None,
+) -> Tuple[List[Any], Optional[str]]:
+    """`paginate_keyset` for a `select()` of ORM entities run on an AsyncSession."""
+    stmt = _apply_keyset(stmt, sort_column, id_column, cursor, descending, db.get_bind().dialect.name, null_value)
+    rows = (await db.execute(stmt.limit(limit + 1))).scalars().all()
+    return _trim_page(list(rows), sort_column, id_column, limit, null_value)
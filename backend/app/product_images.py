@@ -0,0 +1,139 @@
+"""
+Product image URL resolution.
+
+`products.images` holds either ProductImage IDs or (legacy) raw URLs, and an
+empty list means "use the product's ProductImage rows". Turning that into the
+ordered URL list shown to clients takes extra queries, so the result is also
+stored on the product row:
+
+- `products.image_urls`: the resolved, ordered URL list
+- `products.primary_image_url`: its first entry (the listing thumbnail)
+
+`refresh_image_urls` recomputes both and must be called after anything that
+changes a product's images or its ProductImage rows. A NULL `image_urls`
+means "not computed yet" and readers fall back to resolving live.
+"""
+import json
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from . import models
+
+
+def _normalize_image_url(u) -> str:
+    """Normalize relative URLs into served /uploads paths."""
+    try:
+        s = str(u)
+    except Exception:
+        return str(u)
+    if s.startswith('http'):
+        return s
+    if s.startswith('/uploads/'):
+        return s
+    if s.startswith('uploads/'):
+        return '/' + s
+    if s.startswith('/products/'):
+        return '/uploads' + s
+    if s.startswith('products/'):
+        return '/uploads/' + s
+    return s
+
+
+def _image_sort_key(img):
+    """Primary first, non-placeholder next, then by sort_order."""
+    placeholder_penalty = 1 if "placeholder-" in str(img.image_url) else 0
+    primary_rank = 0 if getattr(img, "is_primary", False) else 1
+    return (primary_rank, placeholder_penalty, getattr(img, "sort_order", 0))
+
+
+def _ordered_image_urls(image_objs) -> list[str]:
+    return [_normalize_image_url(str(img.image_url)) for img in sorted(image_objs, key=_image_sort_key)]
+
+
+def _ordered_raw_urls(values) -> list[str]:
+    """Normalize a legacy URL list and move the first real (non-placeholder) image to the front."""
+    urls = [_normalize_image_url(str(x)) for x in values]
+    if len(urls) > 1:
+        non_placeholder = [u for u in urls if "placeholder-" not in u]
+        if non_placeholder:
+            first_real = non_placeholder[0]
+            urls = [first_real] + [u for u in urls if u != first_real]
+    return urls
+
+
+def _parse_variant_images(raw) -> Optional[list]:
+    """ProductVariant.images is a Text column holding a JSON list (IDs or URLs)."""
+    if isinstance(raw, list):
+        return raw
+    if isinstance(raw, str) and raw.strip():
+        try:
+            parsed = json.loads(raw)
+        except Exception:
+            return None
+        return parsed if isinstance(parsed, list) else None
+    return None
+
+
+def _is_id_list(values) -> bool:
+    return all(isinstance(x, int) for x in values)
+
+
+def load_images(
+    db: Session,
+    products: Iterable[Any],
+    extra_image_ids: Iterable[int] = (),
+) -> Tuple[Dict[int, Any], Dict[int, list]]:
+    """Fetch, in one query, the ProductImage rows needed to resolve `products`.
+
+    Returns `(images_by_id, images_by_product)`. `extra_image_ids` lets callers
+    fold in IDs referenced elsewhere (e.g. by variants).
+    """
+    image_ids: set[int] = set(extra_image_ids)
+    fallback_product_ids: list[int] = []
+    for product in products:
+        if isinstance(product.images, list) and product.images:
+            if _is_id_list(product.images):
+                image_ids.update(product.images)
+        else:
+            fallback_product_ids.append(product.id)
+
+    conditions = []
+    if image_ids:
+        conditions.append(models.ProductImage.id.in_(image_ids))
+    if fallback_product_ids:
+        conditions.append(models.ProductImage.product_id.in_(fallback_product_ids))
+
+    images_by_id: Dict[int, Any] = {}
+    images_by_product: Dict[int, list] = {}
+    if conditions:
+        for img in db.query(models.ProductImage).filter(or_(*conditions)).all():
+            images_by_id[img.id] = img
+            images_by_product.setdefault(img.product_id, []).append(img)
+    return images_by_id, images_by_product
+
+
+def resolve_image_urls(product, images_by_id: Dict[int, Any], images_by_product: Dict[int, list]) -> List[str]:
+    """Ordered image URLs for `product` using rows from `load_images`."""
+    if isinstance(product.images, list) and product.images:
+        if _is_id_list(product.images):
+            image_objs = [images_by_id[i] for i in dict.fromkeys(product.images) if i in images_by_id]
+            return _ordered_image_urls(image_objs)
+        return _ordered_raw_urls(product.images)
+    # Fallback: product.images is empty or None but ProductImage rows may exist
+    return _ordered_image_urls(images_by_product.get(product.id, []))
+
+
+def refresh_image_urls(db: Session, product_ids: Iterable[int]) -> None:
+    """Recompute the stored image URL columns for `product_ids` and commit."""
+    product_ids = list(dict.fromkeys(pid for pid in product_ids if pid is not None))
+    if not product_ids:
+        return
+    products = db.query(models.Product).filter(models.Product.id.in_(product_ids)).all()
+    images_by_id, images_by_product = load_images(db, products)
+    for product in products:
+        urls = resolve_image_urls(product, images_by_id, images_by_product)
+        product.image_urls = urls
+        product.primary_image_url = urls[0] if urls else None
+    db.commit()
@@ -0,0 +1,93 @@
+"""
+Full-text product search.
+
+Postgres: matches against the generated `products.search_vector` tsvector
+column (GIN indexed) and ranks with `ts_rank`.
+SQLite: matches against the `products_fts` FTS5 shadow table, kept in sync by
+triggers, and ranks with the built-in bm25 `rank` column.
+
+Both backends index title, short_description and description and treat every
+search word as a prefix, so "lapt" finds "laptop". When neither index exists
+(e.g. a SQLite build without FTS5) searches fall back to ILIKE.
+
+The index objects themselves are created by `db_migrations.ensure_product_search_index`.
+"""
+import re
+from typing import List, Optional
+
+from sqlalchemy import asc, desc, func, literal_column, or_, select, table, text
+from sqlalchemy.orm import Session
+
+from . import models
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# Dialect name -> whether the full-text index exists, checked once per process
+_fts_available: dict = {}
+
+
+def tokenize(query: str) -> List[str]:
+    """Split a user query into index-safe words (drops operators and punctuation)."""
+    return _TOKEN_RE.findall(query.lower())
+
+
+def _postgres_tsquery(tokens: List[str]):
+    # 'lapt':* & 'gaming':*  -- every word must match, each as a prefix
+    return func.to_tsquery("english", " & ".join(f"{t}:*" for t in tokens))
+
+
+def _sqlite_match(tokens: List[str]) -> str:
+    # "lapt"* "gaming"*  -- implicit AND of quoted prefix terms
+    return " ".join(f'"{t}"*' for t in tokens)
+
+
+def _has_index(db: Session) -> bool:
+    dialect = db.get_bind().dialect.name
+    if dialect not in _fts_available:
+        if dialect == "postgresql":
+            found = db.execute(text(
+                "SELECT 1 FROM information_schema.columns "
+                "WHERE table_name = 'products' AND column_name = 'search_vector'"
+            )).first()
+        elif dialect == "sqlite":
+            found = db.execute(text(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'products_fts'"
+            )).first()
+        else:
+            found = None
+        _fts_available[dialect] = found is not None
+    return _fts_available[dialect]
+
+
+def match_criterion(db: Session, query: str):
+    """WHERE criterion selecting products that match `query`."""
+    tokens = tokenize(query)
+    if tokens and _has_index(db):
+        dialect = db.get_bind().dialect.name
+        if dialect == "postgresql":
+            return literal_column("products.search_vector").op("@@")(_postgres_tsquery(tokens))
+        matched_ids = select(literal_column("rowid")).select_from(table("products_fts")).where(
+            literal_column("products_fts").op("MATCH")(_sqlite_match(tokens))
+        )
+        return models.Product.id.in_(matched_ids)
+    pattern = f"%{query}%"
+    return or_(
+        models.Product.title.ilike(pattern),
+        models.Product.short_description.ilike(pattern),
+        models.Product.description.ilike(pattern),
+    )
+
+
+def relevance_order(db: Session, query: str) -> Optional[object]:
+    """ORDER BY expression putting the best matches first, or None without an index."""
+    tokens = tokenize(query)
+    if not tokens or not _has_index(db):
+        return None
+    if db.get_bind().dialect.name == "postgresql":
+        return desc(func.ts_rank(literal_column("products.search_vector"), _postgres_tsquery(tokens)))
+    # bm25 rank is negative; lower means more relevant
+    rank = select(literal_column("rank")).select_from(table("products_fts")).where(
+        literal_column("products_fts").op("MATCH")(_sqlite_match(tokens)),
+        literal_column("products_fts.rowid") == models.Product.id,
+    ).scalar_subquery()
+    return asc(rank)
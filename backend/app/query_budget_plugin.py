@@ -0,0 +1,63 @@
+"""
+pytest plugin for SQL query budgets.
+
+Enable it with `pytest -p app.query_budget_plugin`, or add
+`pytest_plugins = ["app.query_budget_plugin"]` to a conftest.py. Then either
+mark a test:
+
+    @pytest.mark.query_budget(4)
+    def test_cart_total(client, auth_headers):
+        client.get("/api/v1/cart/total", headers=auth_headers)
+
+or budget a block with the fixture:
+
+    def test_product_list(client, query_budget):
+        client.get("/api/v1/products/")          # warm-up, not counted
+        with query_budget(3):
+            client.get("/api/v1/products/")
+
+Statements are counted on every engine and thread (the TestClient runs the
+app on its own thread) through `request_metrics.track_queries`. A test over
+budget fails with the statements grouped by shape, most repeated first, so
+an N+1 shows up as one shape with a large count.
+"""
+from contextlib import contextmanager
+
+import pytest
+
+from .request_metrics import RequestStats, track_queries
+
+
+def _check(stats: RequestStats, budget: int, label: str) -> None:
+    if stats.queries <= budget:
+        return
+    lines = [f"{label} ran {stats.queries} SQL statements, budget is {budget}:"]
+    for shape, n in stats.shapes()[:15]:
+        lines.append(f"  {n:>4}x {shape[:200]}")
+    pytest.fail("\n".join(lines), pytrace=False)
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "query_budget(n): fail if the test body runs more than n SQL statements")
+
+
+@pytest.hookimpl(wrapper=True)
+def pytest_runtest_call(item):
+    marker = item.get_closest_marker("query_budget")
+    if marker is None:
+        return (yield)
+    with track_queries() as stats:
+        result = yield
+    _check(stats, int(marker.args[0]), item.nodeid)
+    return result
+
+
+@pytest.fixture
+def query_budget():
+    """`with query_budget(n): ...` fails the test if the block runs more than n statements."""
+    @contextmanager
+    def budget(max_queries: int):
+        with track_queries() as stats:
+            yield stats
+        _check(stats, max_queries, f"Block with a budget of {max_queries}")
+    return budget
@@ -0,0 +1,212 @@
+"""
+Rate limiting shared by every worker.
+
+Budgets are GCRA (generic cell rate algorithm) buckets. Each key holds one
+"theoretical arrival time", which allows `limit` requests per `period`,
+including a burst of up to `limit`. A check is one atomic Lua script on Redis
+at `settings.redis_url` (`rate_limit_use_redis`), so all uvicorn workers
+share the same budgets. When Redis is disabled or unreachable, the limiter
+falls back to per-process fixed-window counters. Those keep one dict entry
+per key and cost O(1) per check.
+
+A request is charged against:
+- its caller's budget: `rate_limit_user` keyed by the JWT subject for
+  authenticated requests, otherwise `rate_limit_default` keyed by client IP
+- the budget of the first `rate_limit_routes` rule matching
+  "METHOD /path-prefix", counted per caller (e.g. login, checkout)
+"""
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from jose import JWTError, jwt
+
+from .config import settings
+
+try:
+    from redis.asyncio import Redis
+except Exception:
+    Redis = None
+
+logger = logging.getLogger(__name__)
+
+PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+# KEYS[1] bucket; ARGV[1] period (ms); ARGV[2] limit.
+# Returns {allowed, remaining, reset_after_ms, retry_after_ms}. Uses the Redis
+# clock so workers on different hosts agree on "now".
+GCRA_LUA = """
+local period = tonumber(ARGV[1])
+local limit = tonumber(ARGV[2])
+local interval = period / limit
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local tat = tonumber(redis.call('GET', KEYS[1]))
+if not tat or tat < now then
+  tat = now
+end
+local new_tat = tat + interval
+local diff = new_tat - now
+if diff > period then
+  return {0, 0, math.ceil(tat - now), math.ceil(diff - period)}
+end
+redis.call('SET', KEYS[1], new_tat, 'PX', math.ceil(diff))
+return {1, math.floor((period - diff) / interval), math.ceil(diff), 0}
+"""
+
+
+@dataclass(frozen=True)
+class Rate:
+    limit: int
+    period: int  # seconds
+
+    @classmethod
+    def parse(cls, spec: str) -> "Rate":
+        """Parse "300/minute" (units: second, minute, hour, day)."""
+        count, _, unit = spec.partition("/")
+        unit = unit.strip().lower().rstrip("s")
+        if unit not in PERIODS or int(count) <= 0:
+            raise ValueError(f"Invalid rate limit '{spec}'")
+        return cls(int(count), PERIODS[unit])
+
+
+@dataclass
+class RateLimitResult:
+    allowed: bool
+    limit: int
+    remaining: int
+    reset_after: float  # seconds until the budget is full again
+    retry_after: float = 0.0  # seconds until the next request would be allowed
+
+
+class FixedWindowCounter:
+    """Per-process fallback: one (window end, count) pair per key."""
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._windows: Dict[str, Tuple[float, int]] = {}
+        self._lock = threading.Lock()
+
+    def hit(self, key: str, rate: Rate) -> RateLimitResult:
+        now = time.time()
+        with self._lock:
+            window_end, count = self._windows.get(key, (0.0, 0))
+            if now >= window_end:
+                window_end, count = (now // rate.period + 1) * rate.period, 0
+            allowed = count < rate.limit
+            if allowed:
+                count += 1
+                self._windows[key] = (window_end, count)
+                if len(self._windows) > self.max_keys:
+                    self._prune(now)
+        reset_after = window_end - now
+        return RateLimitResult(
+            allowed=allowed,
+            limit=rate.limit,
+            remaining=rate.limit - count,
+            reset_after=reset_after,
+            retry_after=0.0 if allowed else reset_after
+        )
+
+    def _prune(self, now: float) -> None:
+        expired = [key for key, (window_end, _) in self._windows.items() if window_end <= now]
+        for key in expired:
+            del self._windows[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._windows.clear()
+
+
+class RateLimiter:
+    def __init__(self, redis_url: Optional[str] = None, prefix: str = "rl"):
+        self.prefix = prefix
+        self.local = FixedWindowCounter()
+        self.redis = None
+        self._script = None
+        self._redis_retry_at = 0.0
+        if redis_url and Redis is not None:
+            try:
+                self.redis = Redis.from_url(redis_url, socket_timeout=0.25, socket_connect_timeout=0.25)
+                self._script = self.redis.register_script(GCRA_LUA)
+            except Exception as e:
+                logger.warning("Rate limiter: Redis disabled (%s)", e)
+                self.redis = None
+
+    async def hit(self, key: str, rate: Rate) -> RateLimitResult:
+        """Charge one request to `key` under `rate`."""
+        if self._script is not None and time.monotonic() >= self._redis_retry_at:
+            try:
+                allowed, remaining, reset_ms, retry_ms = await self._script(
+                    keys=[f"{self.prefix}:{key}:{rate.limit}/{rate.period}"],
+                    args=[rate.period * 1000, rate.limit]
+                )
+                return RateLimitResult(
+                    allowed=bool(allowed),
+                    limit=rate.limit,
+                    remaining=int(remaining),
+                    reset_after=int(reset_ms) / 1000,
+                    retry_after=int(retry_ms) / 1000
+                )
+            except Exception as e:
+                # Fall back to per-process counters and give Redis a few seconds to recover
+                logger.warning("Rate limiter: Redis check failed, using local counters (%s)", e)
+                self._redis_retry_at = time.monotonic() + 5
+        return self.local.hit(key, rate)
+
+    async def close(self) -> None:
+        if self.redis is not None:
+            await self.redis.close()
+
+
+class RateLimitPolicy:
+    """Which budgets a request is charged against."""
+
+    def __init__(self, default: str, user: str, routes: Dict[str, str], exempt_paths: List[str]):
+        self.default = Rate.parse(default)
+        self.user = Rate.parse(user)
+        self.exempt_paths = tuple(exempt_paths)
+        self.routes: List[Tuple[str, str, Rate]] = []
+        for rule, spec in routes.items():
+            method, _, prefix = rule.strip().partition(" ")
+            self.routes.append((method.upper(), prefix.strip().rstrip("/"), Rate.parse(spec)))
+        # Longest prefix first so specific rules win over general ones
+        self.routes.sort(key=lambda r: len(r[1]), reverse=True)
+
+    def is_exempt(self, method: str, path: str) -> bool:
+        return method == "OPTIONS" or path.startswith(self.exempt_paths)
+
+    def budgets(self, method: str, path: str, caller: str) -> List[Tuple[str, Rate]]:
+        rate = self.user if caller.startswith("user:") else self.default
+        budgets = [(caller, rate)]
+        path = path.rstrip("/")
+        for rule_method, prefix, rule_rate in self.routes:
+            # Match whole path segments: "/api/v1/orders" covers "/api/v1/orders/5",
+            # not "/api/v1/orders-export"
+            if rule_method in (method, "*") and (path == prefix or path.startswith(prefix + "/")):
+                budgets.append((f"{caller}:{rule_method} {prefix}", rule_rate))
+                break
+        return budgets
+
+
+def identify(authorization: Optional[str], client_ip: str) -> str:
+    """`user:<sub>` for a valid bearer token, else `ip:<client ip>`."""
+    if authorization and authorization[:7].lower() == "bearer ":
+        try:
+            payload = jwt.decode(authorization[7:], settings.secret_key, algorithms=[settings.algorithm])
+            if payload.get("sub"):
+                return f"user:{payload['sub']}"
+        except JWTError:
+            pass
+    return f"ip:{client_ip}"
+
+
+limiter = RateLimiter(settings.redis_url if settings.rate_limit_use_redis else None)
+policy = RateLimitPolicy(
+    settings.rate_limit_default,
+    settings.rate_limit_user,
+    settings.rate_limit_routes,
+    settings.rate_limit_exempt_paths
+)
@@ -0,0 +1,199 @@
+"""
+Per-request metrics: latency by route template, requests in flight, and how
+many SQL statements each request ran and how long they took.
+
+`RequestMetricsMiddleware` puts a `RequestStats` in a context variable for
+the duration of each HTTP request. Engine-wide cursor events count every
+statement executed while it is set. The counts follow the request into
+threadpool endpoints and `AsyncSession.run_sync`, because both copy the
+context. Requests are labelled by route template (`/api/v1/products/{product_id}`),
+never by raw path, to keep label cardinality bounded.
+
+N+1 detection: statements are grouped by shape (the SQL text with IN-lists
+collapsed). A request that runs one shape `sql_repeated_statement_threshold`
+times or more is logged as a likely N+1 and counted in
+`http_request_repeated_statements_total`. With `sql_debug_headers` on (by
+default when `debug` is on), responses carry `X-DB-Query-Count`,
+`X-DB-Query-Time-Ms` and, if any, `X-DB-Repeated-Statements`.
+
+`track_queries()` counts statements from every thread while a block runs.
+It backs the pytest query-budget plugin in `app/query_budget_plugin.py`.
+"""
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .config import settings
+from .metrics import CounterVec, Gauge, HistogramVec
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+QUERY_COUNT_BUCKETS = [0, 1, 2, 3, 5, 10, 20, 50, 100, 250]
+
+request_duration = HistogramVec(
+    "http_request_duration_seconds", LATENCY_BUCKETS, ("method", "route", "status"),
+    "HTTP request latency by route template"
+)
+request_db_queries = HistogramVec(
+    "http_request_db_queries", QUERY_COUNT_BUCKETS, ("method", "route"),
+    "SQL statements executed per HTTP request"
+)
+request_db_seconds = HistogramVec(
+    "http_request_db_seconds", LATENCY_BUCKETS, ("method", "route"),
+    "Time spent executing SQL per HTTP request"
+)
+requests_in_flight = Gauge("http_requests_in_flight", "HTTP requests currently being served")
+repeated_statements_total = CounterVec(
+    "http_request_repeated_statements_total", ("method", "route"),
+    "Requests that ran one statement shape at least sql_repeated_statement_threshold times (likely N+1)"
+)
+
+# A parenthesised list of 2+ bind placeholders in any DBAPI paramstyle
+_PLACEHOLDER = r"\s*(?:\?|%s|%\(\w+\)s|\$\d+|:\w+)\s*"
+_BIND_LIST = re.compile(r"\((?:" + _PLACEHOLDER + r",)+" + _PLACEHOLDER + r"\)")
+
+
+def statement_shape(statement: str) -> str:
+    """SQL text with IN-lists collapsed and whitespace normalised, so the same
+    query issued for different rows (or id batches) groups together."""
+    return " ".join(_BIND_LIST.sub("(...)", statement).split())
+
+
+class RequestStats:
+    __slots__ = ("queries", "db_seconds", "statements")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.statements: Dict[str, int] = {}  # raw SQL text -> executions
+
+    def record(self, statement: str, seconds: float) -> None:
+        self.queries += 1
+        self.db_seconds += seconds
+        self.statements[statement] = self.statements.get(statement, 0) + 1
+
+    def shapes(self) -> List[Tuple[str, int]]:
+        """(shape, executions) pairs, most executed first."""
+        counts: Counter = Counter()
+        for statement, n in self.statements.items():
+            counts[statement_shape(statement)] += n
+        return counts.most_common()
+
+    def repeated(self, threshold: int) -> List[Tuple[str, int]]:
+        if threshold <= 0:
+            return []
+        return [(shape, n) for shape, n in self.shapes() if n >= threshold]
+
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+_observers: List[RequestStats] = []  # track_queries() blocks, across all threads
+
+
+def current_stats() -> Optional[RequestStats]:
+    """Stats of the request being served, or None outside a request."""
+    return _current.get()
+
+
+@contextmanager
+def track_queries() -> Iterator[RequestStats]:
+    """Count every statement executed on any engine and thread during the block."""
+    stats = RequestStats()
+    _observers.append(stats)
+    try:
+        yield stats
+    finally:
+        _observers.remove(stats)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _observers or _current.get() is not None:
+        context._request_query_started = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    if stats is None and not _observers:
+        return
+    started = getattr(context, "_request_query_started", None)
+    seconds = time.perf_counter() - started if started is not None else 0.0
+    if stats is not None:
+        stats.record(statement, seconds)
+    for observer in list(_observers):
+        observer.record(statement, seconds)
+
+
+def _debug_headers_enabled() -> bool:
+    return settings.debug if settings.sql_debug_headers is None else settings.sql_debug_headers
+
+
+def route_template(scope: Scope) -> str:
+    route = scope.get("route")
+    if route is not None:
+        return getattr(route, "path_format", None) or getattr(route, "path", "<unknown>")
+    if scope.get("endpoint") is not None and scope.get("root_path"):
+        return scope["root_path"] + "/*"  # a mounted app, e.g. /uploads
+    return "<unmatched>"
+
+
+class RequestMetricsMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        status_code = 500
+        started = time.perf_counter()
+        requests_in_flight.inc()
+
+        debug_headers = _debug_headers_enabled()
+
+        async def send_with_status(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if debug_headers:
+                    headers = [
+                        (b"x-db-query-count", str(stats.queries).encode()),
+                        (b"x-db-query-time-ms", f"{stats.db_seconds * 1000:.1f}".encode()),
+                    ]
+                    repeated = stats.repeated(settings.sql_repeated_statement_threshold)
+                    if repeated:
+                        headers.append((b"x-db-repeated-statements", str(len(repeated)).encode()))
+                    message["headers"] = [*message.get("headers", []), *headers]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            duration = time.perf_counter() - started
+            requests_in_flight.dec()
+            _current.reset(token)
+            method = scope["method"]
+            route = route_template(scope)
+            request_duration.labels(method, route, status_code).observe(duration)
+            request_db_queries.labels(method, route).observe(stats.queries)
+            request_db_seconds.labels(method, route).observe(stats.db_seconds)
+            repeated = stats.repeated(settings.sql_repeated_statement_threshold)
+            if repeated:
+                repeated_statements_total.labels(method, route).inc()
+                shape, n = repeated[0]
+                logger.warning(
+                    "Possible N+1 in %s %s: %d statements, one shape ran %d times: %.300s",
+                    method, route, stats.queries, n, shape
+                )
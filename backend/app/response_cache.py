@@ -0,0 +1,197 @@
+"""
+Two-tier response cache for the anonymous catalogue endpoints.
+
+Tier 1 is a bounded in-process LRU (`TTLCache`). Tier 2, enabled with
+`settings.response_cache_use_redis`, is Redis at `settings.redis_url` and is
+shared by every worker.
+
+Invalidation is tag based. Each tag has a version counter (in Redis when
+available, otherwise in process) and the current versions of an entry's tags
+are part of its cache key. `invalidate("products")` bumps the counter, so every
+entry built from the old data becomes unreachable at once and ages out of the
+LRU/TTL on its own.
+
+Endpoints call `lookup` before touching the database. A hit is answered from the
+stored body, or with 304 when the client's `If-None-Match` matches the ETag.
+On a miss the endpoint builds its payload and returns `store(...)`. Async
+endpoints await `lookup_async`/`store_async` instead, which run the blocking
+Redis calls in the threadpool so a slow Redis can't stall the event loop.
+"""
+import hashlib
+import json
+import logging
+import threading
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+from starlette.concurrency import run_in_threadpool
+
+from .cache import TTLCache
+from .config import settings
+
+try:
+    import redis as redis_lib
+except Exception:
+    redis_lib = None
+
+logger = logging.getLogger(__name__)
+
+PRODUCTS_TAG = "products"
+CATEGORIES_TAG = "categories"
+
+
+class ResponseCache:
+    def __init__(self, enabled: bool, maxsize: int, ttl: int, redis_url: Optional[str] = None, prefix: str = "rc"):
+        self.enabled = enabled
+        self.ttl = ttl
+        self.prefix = prefix
+        self.local = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._local_versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.redis = None
+        if enabled and redis_url and redis_lib is not None:
+            try:
+                self.redis = redis_lib.Redis.from_url(
+                    redis_url, socket_timeout=0.25, socket_connect_timeout=0.25
+                )
+            except Exception as e:
+                logger.warning("Response cache: Redis tier disabled (%s)", e)
+
+    # -- tags -------------------------------------------------------------
+    def _tag_versions(self, tags: Tuple[str, ...]) -> Tuple[int, ...]:
+        if self.redis is not None:
+            try:
+                values = self.redis.mget([f"{self.prefix}:tag:{t}" for t in tags])
+                return tuple(int(v or 0) for v in values)
+            except Exception as e:
+                logger.debug("Response cache: Redis MGET failed (%s)", e)
+        with self._lock:
+            return tuple(self._local_versions.get(t, 0) for t in tags)
+
+    def invalidate(self, *tags: str) -> None:
+        """Make every cached response carrying any of `tags` unreachable."""
+        if not self.enabled:
+            return
+        with self._lock:
+            for t in tags:
+                self._local_versions[t] = self._local_versions.get(t, 0) + 1
+        if self.redis is not None:
+            try:
+                pipe = self.redis.pipeline()
+                for t in tags:
+                    pipe.incr(f"{self.prefix}:tag:{t}")
+                pipe.execute()
+            except Exception as e:
+                logger.warning("Response cache: Redis invalidation failed (%s)", e)
+
+    # -- entries ----------------------------------------------------------
+    def _key(self, request: Request, tags: Tuple[str, ...]) -> str:
+        query = "&".join(sorted(f"{k}={v}" for k, v in request.query_params.multi_items()))
+        versions = ",".join(str(v) for v in self._tag_versions(tags))
+        raw = f"{request.url.path}?{query}|{','.join(tags)}={versions}"
+        return f"{self.prefix}:resp:{hashlib.sha1(raw.encode()).hexdigest()}"
+
+    def _get(self, key: str) -> Optional[tuple]:
+        entry = self.local.get(key)
+        if entry is not None or self.redis is None:
+            return entry
+        try:
+            raw = self.redis.get(key)
+        except Exception as e:
+            logger.debug("Response cache: Redis GET failed (%s)", e)
+            return None
+        if raw is None:
+            return None
+        stored = json.loads(raw)
+        entry = (stored["etag"], stored["body"].encode(), stored["headers"])
+        self.local.set(key, entry)
+        return entry
+
+    def _put(self, key: str, entry: tuple) -> None:
+        self.local.set(key, entry)
+        if self.redis is not None:
+            etag, body, headers = entry
+            try:
+                self.redis.setex(key, self.ttl, json.dumps({"etag": etag, "body": body.decode(), "headers": headers}))
+            except Exception as e:
+                logger.debug("Response cache: Redis SETEX failed (%s)", e)
+
+    @staticmethod
+    def _respond(request: Request, etag: str, body: bytes, headers: Dict[str, str], status: str) -> Response:
+        out_headers = dict(headers)
+        out_headers["ETag"] = etag
+        out_headers["X-Cache"] = status
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match:
+            candidates = [t.strip() for t in if_none_match.split(",")]
+            if "*" in candidates or etag in candidates:
+                return Response(status_code=304, headers=out_headers)
+        return Response(content=body, media_type="application/json", headers=out_headers)
+
+    def lookup(self, request: Request, tags: Iterable[str]) -> Optional[Response]:
+        """Return a cached response (200 or 304) or None on a miss."""
+        if not self.enabled:
+            return None
+        tags = tuple(tags)
+        key = self._key(request, tags)
+        # Remember the key computed before the DB read so `store` files the
+        # payload under the tag versions it was built from.
+        request.state.response_cache_key = key
+        entry = self._get(key)
+        if entry is None:
+            return None
+        etag, body, headers = entry
+        return self._respond(request, etag, body, headers, "HIT")
+
+    def store(
+        self,
+        request: Request,
+        payload: Any,
+        tags: Iterable[str],
+        response_model: Any = None,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> Response:
+        """Serialize `payload` like FastAPI would, cache it and return the response."""
+        if response_model is not None:
+            adapter = TypeAdapter(response_model)
+            data = adapter.dump_python(adapter.validate_python(payload, from_attributes=True), mode="json")
+        else:
+            data = jsonable_encoder(payload)
+        body = json.dumps(data, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+        etag = f'W/"{hashlib.sha1(body).hexdigest()}"'
+        headers = dict(headers or {})
+        if self.enabled:
+            key = getattr(request.state, "response_cache_key", None) or self._key(request, tuple(tags))
+            self._put(key, (etag, body, headers))
+        return self._respond(request, etag, body, headers, "MISS")
+
+    async def lookup_async(self, request: Request, tags: Iterable[str]) -> Optional[Response]:
+        """`lookup` for async endpoints."""
+        if self.redis is None:
+            return self.lookup(request, tags)
+        return await run_in_threadpool(self.lookup, request, tuple(tags))
+
+    async def store_async(
+        self,
+        request: Request,
+        payload: Any,
+        tags: Iterable[str],
+        response_model: Any = None,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> Response:
+        """`store` for async endpoints."""
+        if self.redis is None:
+            return self.store(request, payload, tags, response_model=response_model, headers=headers)
+        return await run_in_threadpool(
+            self.store, request, payload, tuple(tags), response_model=response_model, headers=headers
+        )
+
+
+response_cache = ResponseCache(
+    enabled=settings.response_cache_enabled,
+    maxsize=settings.response_cache_max_entries,
+    ttl=settings.response_cache_ttl,
+    redis_url=settings.redis_url if settings.response_cache_use_redis else None,
+)
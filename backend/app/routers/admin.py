@@ -1,10 +1,14 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import func, or_
 from typing import List, Optional, Dict, Any
 from datetime import datetime, timedelta
-from .. import crud, schemas, auth
+from .. import crud, schemas, auth, category_tree
+from ..notification_fanout import fan_out
 from ..database import get_db
+from ..pagination import paginate_keyset
+from ..response_cache import response_cache, PRODUCTS_TAG
 import math
 
 router = APIRouter(prefix="/admin", tags=["admin"])
@@ -77,6 +81,7 @@ def get_all_users(
     page: int = Query(1, ge=1),
     per_page: int = Query(20, ge=1, le=100),
     search: Optional[str] = Query(None),
+    cursor: Optional[str] = Query(None, description="Opaque keyset cursor; pass an empty value for the first page"),
     current_user: schemas.User = Depends(auth.get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -94,9 +99,14 @@ def get_all_users(
             crud.models.User.full_name.ilike(f"%{search}%")
         )
     
-    total = query.count()
-    users = query.offset(skip).limit(per_page).all()
-    pages = math.ceil(total / per_page) if total > 0 else 0
+    next_cursor = None
+    if cursor is not None:
+        users, next_cursor = paginate_keyset(query, crud.models.User.created_at, crud.models.User.id, per_page, cursor=cursor)
+        total, pages = None, None
+    else:
+        total = query.count()
+        users = query.offset(skip).limit(per_page).all()
+        pages = math.ceil(total / per_page) if total > 0 else 0
     
     # Convert users to dictionaries for serialization
     users_data = [
@@ -118,7 +128,8 @@ def get_all_users(
         "total": total,
         "page": page,
         "per_page": per_page,
-        "pages": pages
+        "pages": pages,
+        "next_cursor": next_cursor
     }
 
 @router.put("/users/{user_id}/status")
@@ -138,6 +149,7 @@ def update_user_status(
     
     user.is_active = is_active
     db.commit()
+    auth.invalidate_principal(user.id, user.username)
     db.refresh(user)
     
     return {"message": f"User {'activated' if is_active else 'deactivated'} successfully"}
@@ -159,8 +171,10 @@ def delete_user(
     if user.id == current_user.id:
         raise HTTPException(status_code=400, detail="Cannot delete yourself")
     
+    user_id, username = user.id, user.username
     db.delete(user)
     db.commit()
+    auth.invalidate_principal(user_id, username)
     
     return {"message": "User deleted successfully"}
 
@@ -171,6 +185,7 @@ def get_all_products_admin(
     per_page: int = Query(20, ge=1, le=100),
     search: Optional[str] = Query(None),
     category_id: Optional[int] = Query(None),
+    cursor: Optional[str] = Query(None, description="Opaque keyset cursor; pass an empty value for the first page"),
     current_user: schemas.User = Depends(auth.get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -190,9 +205,14 @@ def get_all_products_admin(
     if category_id:
         query = query.filter(crud.models.Product.category_id == category_id)
     
-    total = query.count()
-    products = query.offset(skip).limit(per_page).all()
-    pages = math.ceil(total / per_page) if total > 0 else 0
+    next_cursor = None
+    if cursor is not None:
+        products, next_cursor = paginate_keyset(query, crud.models.Product.created_at, crud.models.Product.id, per_page, cursor=cursor)
+        total, pages = None, None
+    else:
+        total = query.count()
+        products = query.offset(skip).limit(per_page).all()
+        pages = math.ceil(total / per_page) if total > 0 else 0
     
     # Convert products to dictionaries for serialization
     products_data = [
@@ -216,7 +236,8 @@ def get_all_products_admin(
         "total": total,
         "page": page,
         "per_page": per_page,
-        "pages": pages
+        "pages": pages,
+        "next_cursor": next_cursor
     }
 
 @router.put("/products/{product_id}/status")
@@ -237,6 +258,7 @@ def update_product_status(
     product.is_active = is_active
     db.commit()
     db.refresh(product)
+    response_cache.invalidate(PRODUCTS_TAG)
     
     return {"message": f"Product {'activated' if is_active else 'deactivated'} successfully"}
 
@@ -257,6 +279,7 @@ def delete_product_admin(
     product.is_active = False
     db.commit()
     db.refresh(product)
+    response_cache.invalidate(PRODUCTS_TAG)
 
     
     return {"message": "Product deleted successfully"}
@@ -267,6 +290,7 @@ def get_all_orders_admin(
     page: int = Query(1, ge=1),
     per_page: int = Query(20, ge=1, le=100),
     status: Optional[str] = Query(None),
+    cursor: Optional[str] = Query(None, description="Opaque keyset cursor; pass an empty value for the first page"),
     current_user: schemas.User = Depends(auth.get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -280,9 +304,14 @@ def get_all_orders_admin(
     if status:
         query = query.filter(crud.models.Order.status == status)
     
-    total = query.count()
-    orders = query.order_by(crud.models.Order.created_at.desc()).offset(skip).limit(per_page).all()
-    pages = math.ceil(total / per_page) if total > 0 else 0
+    next_cursor = None
+    if cursor is not None:
+        orders, next_cursor = paginate_keyset(query, crud.models.Order.created_at, crud.models.Order.id, per_page, cursor=cursor)
+        total, pages = None, None
+    else:
+        total = query.count()
+        orders = query.order_by(crud.models.Order.created_at.desc()).offset(skip).limit(per_page).all()
+        pages = math.ceil(total / per_page) if total > 0 else 0
     
     # Convert orders to dictionaries for serialization
     orders_data = [
@@ -322,7 +351,8 @@ def get_all_orders_admin(
         "total": total,
         "page": page,
         "per_page": per_page,
-        "pages": pages
+        "pages": pages,
+        "next_cursor": next_cursor
     }
 
 @router.put("/orders/{order_id}/status")
@@ -350,6 +380,36 @@ def update_order_status_admin(
     
     return {"message": f"Order status updated to {status}"}
 
+# Announcements
+@router.post("/notifications/broadcast")
+async def broadcast_notification(
+    broadcast: schemas.NotificationBroadcast,
+    current_user: schemas.User = Depends(auth.get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Send a notification to every user in an audience (all, buyers, sellers) or to `user_ids`"""
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    valid_audiences = ["all", "buyers", "sellers"]
+    if broadcast.user_ids is None and broadcast.audience not in valid_audiences:
+        raise HTTPException(status_code=400, detail=f"Invalid audience. Must be one of: {valid_audiences}")
+    
+    def recipient_ids():
+        if broadcast.user_ids is not None:
+            return broadcast.user_ids
+        query = db.query(crud.models.User.id).filter(crud.models.User.is_active == True)
+        if broadcast.audience == "sellers":
+            query = query.filter(crud.models.User.is_seller == True)
+        elif broadcast.audience == "buyers":
+            query = query.filter(or_(crud.models.User.is_seller == False, crud.models.User.is_seller.is_(None)))
+        return [user_id for (user_id,) in query.all()]
+    
+    user_ids = await run_in_threadpool(recipient_ids)
+    sent = await fan_out(db, user_ids, broadcast.title, broadcast.message, notification_type=broadcast.type)
+    
+    return {"message": f"Notification sent to {sent} users", "recipients": sent}
+
 # Category Management
 @router.post("/categories", response_model=schemas.Category)
 def create_category_admin(
@@ -378,14 +438,11 @@ def update_category_admin(
     if not category:
         raise HTTPException(status_code=404, detail="Category not found")
     
-    category.name = category_update.name
-    category.description = category_update.description
-    category.slug = category_update.slug
-    
-    db.commit()
-    db.refresh(category)
+    parent_id = category_update.parent_id
+    if parent_id is not None and category_tree.is_descendant(db, parent_id, category_id):
+        raise HTTPException(status_code=400, detail="A category cannot be moved under itself or its subcategories")
     
-    return category
+    return crud.update_category(db, category, category_update)
 
 @router.delete("/categories/{category_id}")
 def delete_category_admin(
@@ -406,8 +463,7 @@ def delete_category_admin(
     if products_count > 0:
         raise HTTPException(status_code=400, detail="Cannot delete category with existing products")
     
-    db.delete(category)
-    db.commit()
+    crud.delete_category(db, category)
     
     return {"message": "Category deleted successfully"}
 
@@ -418,6 +474,7 @@ def get_all_messages_admin(
     page: int = Query(1, ge=1),
     per_page: int = Query(20, ge=1, le=100),
     search: Optional[str] = Query(None),
+    cursor: Optional[str] = Query(None, description="Opaque keyset cursor; pass an empty value for the first page"),
     current_user: schemas.User = Depends(auth.get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -438,9 +495,14 @@ def get_all_messages_admin(
             crud.models.User.username.ilike(f"%{search}%")
         )
     
-    total = query.count()
-    messages = query.order_by(crud.models.Message.created_at.desc()).offset(skip).limit(per_page).all()
-    pages = math.ceil(total / per_page) if total > 0 else 0
+    next_cursor = None
+    if cursor is not None:
+        messages, next_cursor = paginate_keyset(query, crud.models.Message.created_at, crud.models.Message.id, per_page, cursor=cursor)
+        total, pages = None, None
+    else:
+        total = query.count()
+        messages = query.order_by(crud.models.Message.created_at.desc()).offset(skip).limit(per_page).all()
+        pages = math.ceil(total / per_page) if total > 0 else 0
     
     # Convert messages to dictionaries for serialization
     messages_data = []
@@ -477,7 +539,8 @@ def get_all_messages_admin(
         "total": total,
         "page": page,
         "per_page": per_page,
-        "pages": pages
+        "pages": pages,
+        "next_cursor": next_cursor
     }
 
 
@@ -828,6 +891,7 @@ def admin_list_withdrawals(
     page: int = Query(1, ge=1),
     per_page: int = Query(50, ge=1, le=200),
     status: Optional[str] = Query(None),
+    cursor: Optional[str] = Query(None, description="Opaque keyset cursor; pass an empty value for the first page"),
     current_user: schemas.User = Depends(auth.get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -838,8 +902,13 @@ def admin_list_withdrawals(
     query = db.query(crud.models.WithdrawalRequest)
     if status:
         query = query.filter(crud.models.WithdrawalRequest.status == status)
-    total = query.count()
-    items = query.order_by(crud.models.WithdrawalRequest.created_at.desc()).offset(skip).limit(per_page).all()
+    next_cursor = None
+    if cursor is not None:
+        items, next_cursor = paginate_keyset(query, crud.models.WithdrawalRequest.created_at, crud.models.WithdrawalRequest.id, per_page, cursor=cursor)
+        total = None
+    else:
+        total = query.count()
+        items = query.order_by(crud.models.WithdrawalRequest.created_at.desc()).offset(skip).limit(per_page).all()
     data = [
         {
             "id": w.id,
@@ -860,7 +929,7 @@ def admin_list_withdrawals(
         }
         for w in items
     ]
-    return {"items": data, "total": total, "page": page, "per_page": per_page}
+    return {"items": data, "total": total, "page": page, "per_page": per_page, "next_cursor": next_cursor}
 
 
 @router.put("/withdrawals/{withdrawal_id}/approve")
@@ -895,6 +964,7 @@ def admin_process_withdrawal(
 def get_pending_sellers(
     page: int = Query(1, ge=1),
     per_page: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = Query(None, description="Opaque keyset cursor; pass an empty value for the first page"),
     current_user: schemas.User = Depends(auth.get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -904,8 +974,13 @@ def get_pending_sellers(
     
     skip = (page - 1) * per_page
     query = db.query(crud.models.Seller).filter(crud.models.Seller.is_verified == False)
-    total = query.count()
-    sellers = query.order_by(crud.models.Seller.created_at.desc()).offset(skip).limit(per_page).all()
+    next_cursor = None
+    if cursor is not None:
+        sellers, next_cursor = paginate_keyset(query, crud.models.Seller.created_at, crud.models.Seller.id, per_page, cursor=cursor)
+        total = None
+    else:
+        total = query.count()
+        sellers = query.order_by(crud.models.Seller.created_at.desc()).offset(skip).limit(per_page).all()
     
     data = [
         {
@@ -924,7 +999,7 @@ def get_pending_sellers(
         }
         for s in sellers
     ]
-    return {"items": data, "total": total, "page": page, "per_page": per_page}
+    return {"items": data, "total": total, "page": page, "per_page": per_page, "next_cursor": next_cursor}
 
 
 @router.put("/sellers/{seller_id}/approve")
@@ -368,6 +368,7 @@ def reset_password(
     reset_token.used_at = datetime.utcnow()
     
     db.commit()
+    auth.invalidate_principal(user.id, user.username)
     
     return {"message": "Password has been reset successfully"}
 
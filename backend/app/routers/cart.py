@@ -1,9 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import List
 from .. import crud, schemas, auth, models
 from typing import cast
 from ..database import get_db
+from ..database_async import get_async_db
 
 router = APIRouter(prefix="/cart", tags=["cart"])
 
@@ -11,12 +14,12 @@ router = APIRouter(prefix="/cart", tags=["cart"])
 # Support both trailing and non-trailing clash to avoid browser CORS issues on redirects
 @router.get("/", response_model=List[schemas.CartItem])
 @router.get("", response_model=List[schemas.CartItem])
-def get_cart(
-    db: Session = Depends(get_db),
-    current_user: schemas.User = Depends(auth.get_current_active_user)
+async def get_cart(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: schemas.User = Depends(auth.get_current_active_user_async)
 ):
     """Get current user's cart items"""
-    cart_items = crud.get_cart_items(db=db, user_id=current_user.id)
+    cart_items = await crud.get_cart_items_async(db=db, user_id=current_user.id)
     return cart_items
 
 
@@ -143,25 +146,38 @@ def clear_cart(
 
 
 @router.get("/count")
-def get_cart_count(
-    db: Session = Depends(get_db),
-    current_user: schemas.User = Depends(auth.get_current_active_user)
+async def get_cart_count(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: schemas.User = Depends(auth.get_current_active_user_async)
 ):
     """Get total number of items in cart"""
-    cart_items = crud.get_cart_items(db=db, user_id=current_user.id)
-    total_items = sum(item.quantity for item in cart_items)
+    total_items = (await db.execute(
+        select(func.coalesce(func.sum(models.CartItem.quantity), 0)).where(
+            models.CartItem.user_id == current_user.id
+        )
+    )).scalar()
     return {"count": total_items}
 
 
 @router.get("/total")
-def get_cart_total(
-    db: Session = Depends(get_db),
-    current_user: schemas.User = Depends(auth.get_current_active_user)
+async def get_cart_total(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: schemas.User = Depends(auth.get_current_active_user_async)
 ):
-    """Get cart total amount"""
-    cart_items = crud.get_cart_items(db=db, user_id=current_user.id)
-    total_amount = sum(item.quantity * item.product.price for item in cart_items if item.product)
-    total_items = sum(item.quantity for item in cart_items)
+    """Get cart total amount (variant lines include the variant's price adjustment)"""
+    rows = (await db.execute(
+        select(
+            models.CartItem.quantity, models.Product.price, models.ProductVariant.price_adjustment
+        ).outerjoin(
+            models.Product, models.Product.id == models.CartItem.product_id
+        ).outerjoin(
+            models.ProductVariant, models.ProductVariant.id == models.CartItem.variant_id
+        ).where(models.CartItem.user_id == current_user.id)
+    )).all()
+    total_amount = sum(
+        quantity * (price + (adjustment or 0.0)) for quantity, price, adjustment in rows if price is not None
+    )
+    total_items = sum(quantity for quantity, _, _ in rows)
     
     return {
         "total_amount": total_amount,
@@ -1,21 +1,33 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from sqlalchemy.orm import Session
 from typing import List
 from .. import crud, schemas, auth
 from ..database import get_db
+from ..response_cache import response_cache, PRODUCTS_TAG, CATEGORIES_TAG
+from .products import format_products_for_response
 
 router = APIRouter(prefix="/categories", tags=["categories"])
 
 
 @router.get("/", response_model=List[schemas.Category])
 def get_categories(
+    request: Request,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=200),
     db: Session = Depends(get_db)
 ):
     """Get all categories"""
+    cached = response_cache.lookup(request, tags=(CATEGORIES_TAG,))
+    if cached is not None:
+        return cached
     categories = crud.get_categories(db=db, skip=skip, limit=limit)
-    return categories
+    return response_cache.store(request, categories, tags=(CATEGORIES_TAG,), response_model=List[schemas.Category])
+
+
+@router.get("/tree", response_model=List[schemas.CategoryTreeNode])
+def get_category_tree(db: Session = Depends(get_db)):
+    """Get active categories as a nested tree"""
+    return crud.get_category_tree(db=db)
 
 
 @router.get("/{category_id}", response_model=schemas.Category)
@@ -48,13 +60,16 @@ def create_category(
 @router.get("/{category_id}/products", response_model=List[schemas.Product])
 def get_category_products(
     category_id: int,
+    request: Request,
     skip: int = Query(0, ge=0),
     limit: int = Query(50, ge=1, le=100),
     db: Session = Depends(get_db)
 ):
     """Get products in a category"""
-    from ..models import ProductImage
-    
+    tags = (PRODUCTS_TAG, CATEGORIES_TAG)
+    cached = response_cache.lookup(request, tags=tags)
+    if cached is not None:
+        return cached
     category = crud.get_category(db=db, category_id=category_id)
     if not category:
         raise HTTPException(status_code=404, detail="Category not found")
@@ -66,54 +81,6 @@ def get_category_products(
         category_id=category_id
     )
     
-    # Convert image IDs to URLs for each product
-    result = []
-    for product in products:
-        product_dict = {
-            "id": product.id,
-            "seller_id": product.seller_id,
-            "category_id": product.category_id,
-            "title": product.title,
-            "slug": product.slug,
-            "description": product.description,
-            "short_description": product.short_description,
-            "price": product.price,
-            "compare_price": product.compare_price,
-            "sku": product.sku,
-            "inventory_count": product.inventory_count,
-            "weight": product.weight,
-            "dimensions": product.dimensions,
-            "images": [],
-            "is_active": product.is_active,
-            "is_featured": product.is_featured,
-            "has_variants": product.has_variants,
-            "rating": product.rating,
-            "review_count": product.review_count,
-            "view_count": product.view_count,
-            "created_at": product.created_at,
-            "updated_at": product.updated_at,
-            "approval_status": product.approval_status,
-            "rejection_reason": product.rejection_reason,
-            "approved_at": product.approved_at,
-            "approved_by": product.approved_by,
-            "variants": product.variants or [],
-            "seller": product.seller,
-        }
-        
-        # Fetch actual image URLs
-        if product.images is not None:
-            image_ids = product.images if isinstance(product.images, list) else []
-            try:
-                if len(image_ids) > 0:
-                    product_images = db.query(ProductImage).filter(
-                        ProductImage.id.in_(image_ids)
-                    ).all()
-                    product_dict["images"] = [img.image_url for img in product_images] if product_images else []
-            except Exception:
-                product_dict["images"] = []
-        
-        result.append(product_dict)
-    
-    return result
-
-
+    # Convert image IDs to URLs for the whole page in a constant number of queries
+    payload = format_products_for_response(products, db)
+    return response_cache.store(request, payload, tags=tags, response_model=List[schemas.Product])
@@ -1,11 +1,11 @@
 from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
 from sqlalchemy import text, func
-from typing import Dict, Any, cast
+from typing import Dict, Any
 from datetime import datetime, timedelta
 from .. import auth, schemas, models
-from ..database import get_db
-import psutil
+from ..database import get_db, get_db_stats
+from ..system_metrics import sampler as system_sampler
 import time
 import os
 
@@ -28,25 +28,13 @@ def get_system_health(
     uptime = datetime.now() - SERVER_START_TIME
     uptime_seconds = uptime.total_seconds()
     
-    # CPU and Memory usage
-    cpu_percent = psutil.cpu_percent(interval=1)
-    cpu_count = psutil.cpu_count()
-    memory = psutil.virtual_memory()
-    disk = psutil.disk_usage('/')
-    
-    # Network statistics
-    try:
-        net_io = psutil.net_io_counters()
-        network_stats = {
-            "bytes_sent_mb": round(net_io.bytes_sent / (1024 * 1024), 2),
-            "bytes_recv_mb": round(net_io.bytes_recv / (1024 * 1024), 2),
-            "packets_sent": net_io.packets_sent,
-            "packets_recv": net_io.packets_recv,
-            "errors_in": net_io.errin,
-            "errors_out": net_io.errout
-        }
-    except:
-        network_stats = None
+    # CPU, memory, disk and network from the background sampler (never blocks)
+    system = system_sampler.snapshot()
+    cpu_percent = system["cpu_percent"]
+    cpu_count = system["cpu_count"]
+    memory = system["memory"]
+    disk = system["disk"]
+    network_stats = system["network"]
     
     # Database health and statistics
     db_start = time.time()
@@ -132,24 +120,9 @@ def get_system_health(
         db_status = f"unhealthy: {str(e)}"
     
     # Process information
-    process = psutil.Process(os.getpid())
-    process_memory = process.memory_info().rss
-    process_cpu = process.cpu_percent(interval=0.1)
-    
-    # System load average
-    try:
-        getloadavg = getattr(os, "getloadavg", None)
-        if callable(getloadavg):
-            load_avg = cast(tuple[float, float, float], getloadavg())
-            load_average = {
-                "1min": round(load_avg[0], 2),
-                "5min": round(load_avg[1], 2),
-                "15min": round(load_avg[2], 2)
-            }
-        else:
-            load_average = None
-    except (AttributeError, OSError):
-        load_average = None
+    process_memory = system["process_memory_bytes"]
+    process_cpu = system["process_cpu_percent"]
+    load_average = system["load_average"]
     
     # Check for potential issues
     issues = []
@@ -157,13 +130,13 @@ def get_system_health(
         issues.append({"severity": "warning", "message": "High CPU usage detected"})
     if cpu_percent > 95:
         issues.append({"severity": "critical", "message": "Critical CPU usage"})
-    if memory.percent > 80:
+    if memory["percent"] > 80:
         issues.append({"severity": "warning", "message": "High memory usage detected"})
-    if memory.percent > 95:
+    if memory["percent"] > 95:
         issues.append({"severity": "critical", "message": "Critical memory usage"})
-    if disk.percent > 85:
+    if disk["percent"] > 85:
         issues.append({"severity": "warning", "message": "Disk space running low"})
-    if disk.percent > 95:
+    if disk["percent"] > 95:
         issues.append({"severity": "critical", "message": "Critical disk space"})
     if db_latency > 100:
         issues.append({"severity": "warning", "message": f"High database latency: {db_latency:.2f}ms"})
@@ -197,16 +170,17 @@ def get_system_health(
             "cpu_usage_percent": round(cpu_percent, 2),
             "cpu_count": cpu_count,
             "load_average": load_average,
-            "memory_usage_percent": round(memory.percent, 2),
-            "memory_total_bytes": memory.total,
-            "memory_used_bytes": memory.used,
-            "memory_available_bytes": memory.available,
-            "disk_usage_percent": round(disk.percent, 2),
-            "disk_total_bytes": disk.total,
-            "disk_used_bytes": disk.used,
-            "disk_free_bytes": disk.free
+            "memory_usage_percent": round(memory["percent"], 2),
+            "memory_total_bytes": memory["total"],
+            "memory_used_bytes": memory["used"],
+            "memory_available_bytes": memory["available"],
+            "disk_usage_percent": round(disk["percent"], 2),
+            "disk_total_bytes": disk["total"],
+            "disk_used_bytes": disk["used"],
+            "disk_free_bytes": disk["free"]
         },
         "network": network_stats,
+        "sampled_at": datetime.fromtimestamp(system["sampled_at"]).isoformat(),
         "database": {
             "status": db_status,
             "latency_ms": round(db_latency, 2) if db_latency > 0 else None,
@@ -238,5 +212,7 @@ def get_system_metrics(
     
     return {
         "current": health_data,
+        # Pool occupancy plus checkout-wait / checked-out histograms for pool sizing
+        "database_pool": get_db_stats(),
         "history": []  # Could be populated from a metrics table
     }
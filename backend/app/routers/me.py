@@ -0,0 +1,16 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+from .. import schemas, auth
+from ..badge_counters import get_badges_async
+from ..database_async import get_async_db
+
+router = APIRouter(prefix="/me", tags=["me"])
+
+
+@router.get("/badges")
+async def get_badges(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: schemas.User = Depends(auth.get_current_active_user_async)
+):
+    """Unread message and notification counts for the current user in one call"""
+    return await get_badges_async(db, current_user.id)
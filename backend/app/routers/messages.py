@@ -1,11 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from sqlalchemy import or_, and_, func
+from sqlalchemy import or_, and_, case, func
 from typing import List, Optional
 from .. import crud, schemas, auth, models
+from ..badge_counters import get_badges
 from ..database import get_db
+from ..pagination import paginate_keyset
 from .notifications import create_notification
-from ..ws_manager import manager
 from ..ws_redis import bridge
 
 router = APIRouter(prefix="/messages", tags=["messages"])
@@ -69,21 +70,12 @@ async def send_message(
             "created_at": db_message.created_at.isoformat()
         },
         "receiver_id": db_message.receiver_id,
-        "unread_count": db.query(models.Message).filter(models.Message.receiver_id == db_message.receiver_id, models.Message.is_read == False).count()
+        "unread_count": get_badges(db, db_message.receiver_id)["unread_messages"]
     }
 
-    # Publish to Redis (if configured) and also send to in-memory manager as fallback
+    # Delivered via Redis to whichever worker holds the receiver's socket, or locally without Redis
     try:
-        # schedule publish as background task so HTTP response isn't delayed by Redis
-        import asyncio
-        if hasattr(bridge, 'publish') and bridge is not None:
-            asyncio.create_task(bridge.publish(payload))
-    except Exception:
-        # best-effort; continue
-        pass
-
-    try:
-        await manager.send_personal_message(db_message.receiver_id, payload)
+        await bridge.send_to_user(db_message.receiver_id, payload)
     except Exception:
         pass
 
@@ -96,6 +88,7 @@ def get_messages(
     limit: int = Query(50, ge=1, le=100),
     conversation_with: Optional[int] = Query(None),
     conversation_id: Optional[int] = Query(None),
+    cursor: Optional[str] = Query(None, description="Opaque keyset cursor; pass an empty value for the first page"),
     db: Session = Depends(get_db),
     current_user: schemas.User = Depends(auth.get_current_active_user)
 ):
@@ -117,7 +110,13 @@ def get_messages(
         )
     
     # Order by created_at ascending for proper chat display (oldest first)
-    messages = query.order_by(models.Message.created_at.asc()).offset(skip).limit(limit).all()
+    next_cursor = None
+    if cursor is not None:
+        messages, next_cursor = paginate_keyset(
+            query, models.Message.created_at, models.Message.id, limit, cursor=cursor, descending=False
+        )
+    else:
+        messages = query.order_by(models.Message.created_at.asc()).offset(skip).limit(limit).all()
     
     # Mark messages as read if they are received by current user
     if conversation_with:
@@ -155,6 +154,13 @@ def get_messages(
         messages_data.append(msg_dict)
     
     # Return in the expected format with data wrapper
+    if cursor is not None:
+        return {
+            "data": messages_data,
+            "limit": limit,
+            "next_cursor": next_cursor,
+            "has_more": next_cursor is not None
+        }
     return {
         "data": messages_data,
         "total": query.count(),
@@ -163,56 +169,75 @@ def get_messages(
     }
 
 
+def _conversation_inbox_query(db: Session, user_id: int):
+    """One row per conversation partner: the latest message, the partner and
+    the number of messages from them that `user_id` hasn't read.
+
+    Window functions partition the user's messages by partner, so the whole
+    inbox is a single statement instead of three queries per partner.
+    """
+    partner_id = case(
+        (models.Message.sender_id == user_id, models.Message.receiver_id),
+        else_=models.Message.sender_id
+    )
+    unread = case(
+        (and_(models.Message.receiver_id == user_id, models.Message.is_read == False), 1),
+        else_=0
+    )
+    ranked = db.query(
+        models.Message.id.label("id"),
+        models.Message.content.label("content"),
+        models.Message.created_at.label("created_at"),
+        models.Message.sender_id.label("sender_id"),
+        models.Message.is_read.label("is_read"),
+        partner_id.label("partner_id"),
+        func.row_number().over(
+            partition_by=partner_id,
+            order_by=(models.Message.created_at.desc(), models.Message.id.desc())
+        ).label("rn"),
+        func.sum(unread).over(partition_by=partner_id).label("unread_count"),
+    ).filter(
+        or_(
+            models.Message.sender_id == user_id,
+            models.Message.receiver_id == user_id
+        )
+    ).subquery()
+
+    query = db.query(
+        ranked.c.id,
+        ranked.c.content,
+        ranked.c.created_at,
+        ranked.c.sender_id,
+        ranked.c.is_read,
+        ranked.c.unread_count,
+        models.User,
+    ).join(models.User, models.User.id == ranked.c.partner_id).filter(ranked.c.rn == 1)
+    return query, ranked
+
+
 @router.get("/conversations")
 def get_conversations(
+    limit: int = Query(50, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="Opaque keyset cursor; pass an empty value for the first page"),
     db: Session = Depends(get_db),
     current_user: schemas.User = Depends(auth.get_current_active_user)
 ):
-    """Get list of conversations for current user with improved logic"""
-    
-    # Get all unique conversation partners
-    # Subquery for users current user sent messages to
-    sent_to_subquery = db.query(models.Message.receiver_id.label('user_id')).filter(
-        models.Message.sender_id == current_user.id
-    ).distinct().subquery()
-    
-    # Subquery for users who sent messages to current user
-    received_from_subquery = db.query(models.Message.sender_id.label('user_id')).filter(
-        models.Message.receiver_id == current_user.id
-    ).distinct().subquery()
-    
-    # Union both subqueries to get all conversation partners
-    conversation_partners_query = db.query(sent_to_subquery.c.user_id).union(
-        db.query(received_from_subquery.c.user_id)
-    )
-    
+    """Get list of conversations for current user, most recent first"""
+    query, ranked = _conversation_inbox_query(db, current_user.id)
+
+    next_cursor = None
+    if cursor is not None:
+        rows, next_cursor = paginate_keyset(
+            query, ranked.c.created_at, ranked.c.id, limit, cursor=cursor, descending=True
+        )
+    else:
+        rows = query.order_by(ranked.c.created_at.desc(), ranked.c.id.desc()).all()
+
     conversations = []
-    
-    for partner_result in conversation_partners_query.all():
-        partner_id = partner_result[0]
-        
-        # Get user details
-        partner_user = db.query(models.User).filter(models.User.id == partner_id).first()
-        if not partner_user:
-            continue
-            
-        # Get latest message in conversation
-        latest_message = db.query(models.Message).filter(
-            or_(
-                and_(models.Message.sender_id == current_user.id, models.Message.receiver_id == partner_id),
-                and_(models.Message.sender_id == partner_id, models.Message.receiver_id == current_user.id)
-            )
-        ).order_by(models.Message.created_at.desc()).first()
-        
-        # Count unread messages from this partner
-        unread_count = db.query(models.Message).filter(
-            models.Message.sender_id == partner_id,
-            models.Message.receiver_id == current_user.id,
-            models.Message.is_read == False
-        ).count()
-        
-        conversation_data = {
-            "id": f"conv_{partner_id}",
+    for row in rows:
+        partner_user = row.User
+        conversations.append({
+            "id": f"conv_{partner_user.id}",
             "other_user": {
                 "id": partner_user.id,
                 "full_name": partner_user.full_name,
@@ -222,24 +247,23 @@ def get_conversations(
                 "is_seller": partner_user.is_seller
             },
             "last_message": {
-                "id": latest_message.id,
-                "content": latest_message.content,
-                "created_at": latest_message.created_at.isoformat() if latest_message.created_at else None,
-                "sender_id": latest_message.sender_id,
-                "is_read": latest_message.is_read
-            } if latest_message else None,
-            "unread_count": unread_count,
+                "id": row.id,
+                "content": row.content,
+                "created_at": row.created_at.isoformat() if row.created_at else None,
+                "sender_id": row.sender_id,
+                "is_read": row.is_read
+            },
+            "unread_count": int(row.unread_count or 0),
             "related_product": None  # Add if needed
+        })
+
+    if cursor is not None:
+        return {
+            "data": conversations,
+            "limit": limit,
+            "next_cursor": next_cursor,
+            "has_more": next_cursor is not None
         }
-        
-        conversations.append(conversation_data)
-    
-    # Sort conversations by latest message timestamp (most recent first)
-    conversations.sort(
-        key=lambda x: x["last_message"]["created_at"] if x["last_message"] else "1970-01-01",
-        reverse=True
-    )
-    
     return {
         "data": conversations
     }
@@ -272,12 +296,7 @@ def get_unread_count(
     current_user: schemas.User = Depends(auth.get_current_active_user)
 ):
     """Get count of unread messages"""
-    count = db.query(models.Message).filter(
-        models.Message.receiver_id == current_user.id,
-        models.Message.is_read == False
-    ).count()
-    
-    return {"unread_count": count}
+    return {"unread_count": get_badges(db, current_user.id)["unread_messages"]}
 
 
 @router.post("/start-conversation")
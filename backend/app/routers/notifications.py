@@ -1,39 +1,60 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from sqlalchemy import desc
+from sqlalchemy import desc, func, select, insert
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from .. import crud, schemas, auth, models
+from ..badge_counters import get_badges_async
 from ..database import get_db
+from ..database_async import get_async_db
+from ..pagination import paginate_keyset_async
 
 router = APIRouter(prefix="/notifications", tags=["notifications"])
 
 
 @router.get("/")
-def get_notifications(
+async def get_notifications(
     skip: int = Query(0, ge=0),
     limit: int = Query(50, ge=1, le=100),
     unread_only: bool = Query(False),
     notification_type: Optional[str] = Query(None),
-    db: Session = Depends(get_db),
-    current_user: schemas.User = Depends(auth.get_current_active_user)
+    cursor: Optional[str] = Query(None, description="Opaque keyset cursor; pass an empty value for the first page"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: schemas.User = Depends(auth.get_current_active_user_async)
 ):
     """Get notifications for current user with improved filtering"""
     try:
-        query = db.query(models.Notification).filter(
-            models.Notification.user_id == current_user.id
-        )
+        criteria = [models.Notification.user_id == current_user.id]
         
         if unread_only:
-            query = query.filter(models.Notification.is_read == False)
+            criteria.append(models.Notification.is_read == False)
         
         if notification_type:
-            query = query.filter(models.Notification.type == notification_type)
+            criteria.append(models.Notification.type == notification_type)
+        
+        query = select(models.Notification).where(*criteria)
+        
+        if cursor is not None:
+            # Keyset mode: newest first on (created_at, id), no total count
+            notifications, next_cursor = await paginate_keyset_async(
+                db, query, models.Notification.created_at, models.Notification.id, limit, cursor=cursor
+            )
+            return {
+                "data": notifications,
+                "limit": limit,
+                "next_cursor": next_cursor,
+                "has_more": next_cursor is not None
+            }
         
         # Order by created_at descending (newest first)
-        notifications = query.order_by(desc(models.Notification.created_at)).offset(skip).limit(limit).all()
+        notifications = (await db.execute(
+            query.order_by(desc(models.Notification.created_at)).offset(skip).limit(limit)
+        )).scalars().all()
         
         # Get total count for pagination
-        total_count = query.count()
+        total_count = (await db.execute(
+            select(func.count(models.Notification.id)).where(*criteria)
+        )).scalar()
         
         # Return in the expected format with data wrapper
         return {
@@ -44,6 +65,8 @@ def get_notifications(
             "has_more": (skip + limit) < total_count
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching notifications: {str(e)}")
 
@@ -107,18 +130,14 @@ def mark_all_notifications_as_read(
 
 
 @router.get("/unread-count")
-def get_unread_notifications_count(
-    db: Session = Depends(get_db),
-    current_user: schemas.User = Depends(auth.get_current_active_user)
+async def get_unread_notifications_count(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: schemas.User = Depends(auth.get_current_active_user_async)
 ):
     """Get count of unread notifications"""
     try:
-        count = db.query(models.Notification).filter(
-            models.Notification.user_id == current_user.id,
-            models.Notification.is_read == False
-        ).count()
-        
-        return {"unread_count": count}
+        badges = await get_badges_async(db, current_user.id)
+        return {"unread_count": badges["unread_notifications"]}
         
     except Exception as e:
         # Return 0 on error to prevent UI breaking
@@ -192,7 +211,7 @@ def create_notification(
             title=title,
             message=message,
             type=notification_type,
-            related_order_id=related_order_id
+            related_id=related_order_id
         )
         
         db.add(notification)
@@ -211,19 +230,19 @@ def create_bulk_notifications(
     db: Session,
     notifications_data: List[dict]
 ):
-    """Create multiple notifications at once"""
+    """Create multiple notifications at once (one executemany INSERT and one commit).
+
+    To send the same notification to many users, use `notification_fanout.fan_out`.
+    """
     try:
-        notifications = []
-        for data in notifications_data:
-            notification = models.Notification(**data)
-            notifications.append(notification)
-        
-        db.add_all(notifications)
+        if not notifications_data:
+            return 0
+        db.execute(insert(models.Notification), notifications_data)
         db.commit()
         
-        return notifications
+        return len(notifications_data)
         
     except Exception as e:
         db.rollback()
         print(f"Error creating bulk notifications: {str(e)}")
-        return []
+        return 0
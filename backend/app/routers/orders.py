@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Header, Query, Response
 from sqlalchemy.orm import Session
 from typing import List, Optional, Dict, Any
 from .. import crud, schemas, auth, models
@@ -11,18 +11,42 @@ import json
 router = APIRouter(prefix="/orders", tags=["orders"])
 
 
+def _replay_order(existing: models.OrderIdempotencyKey, request_hash: str, response: Response):
+    """Return the order stored under an Idempotency-Key, if the request matches it."""
+    if existing.request_hash != request_hash:
+        raise HTTPException(
+            status_code=422,
+            detail="Idempotency-Key was already used with a different request"
+        )
+    response.headers["Idempotent-Replayed"] = "true"
+    return existing.order
+
+
 @router.post("/", response_model=schemas.Order)
 def create_order(
     order: schemas.OrderCreate,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=255),
     db: Session = Depends(get_db),
     current_user: schemas.User = Depends(auth.get_current_active_user)
 ):
-    """Create a new order with optional discount code"""
+    """Create a new order with optional discount code.
+
+    Send an `Idempotency-Key` header to make retries safe: a repeated key
+    returns the order the first request created without running checkout
+    again, and reusing a key with a different body is rejected with 422.
+    """
     from datetime import datetime
     
+    request_hash = None
+    if idempotency_key:
+        request_hash = crud.order_request_hash(order)
+        existing = crud.get_order_idempotency_key(db, current_user.id, idempotency_key)
+        if existing:
+            return _replay_order(existing, request_hash, response)
+    
     # Validate discount code if provided
-    discount_amount = 0.0
-    applied_redemption_id = None
+    redemption = None
     
     if order.discount_code:
         # Get user's loyalty account
@@ -60,134 +84,19 @@ def create_order(
                 status_code=400,
                 detail="This code has expired"
             )
-        
-        # Get discount amount
-        discount_amount = float(getattr(redemption, "reward_value", 0))
-        applied_redemption_id = int(getattr(redemption, "id", 0))  # type: ignore
     
-    # Validate all products exist and are available
-    # Collect seller notifications context: seller_user_id -> list of item summaries
-    seller_items_map = {}
-    for item in order.items:
-        product = crud.get_product(db=db, product_id=item.product_id)
-        if not product:
-            raise HTTPException(status_code=404, detail=f"Product {item.product_id} not found")
-        
-        product_typed = cast(models.Product, product)
-        is_active = cast(bool, product_typed.is_active)
-        if is_active is False:
-            raise HTTPException(status_code=400, detail=f"Product {product.title} is not available")
-        
-        inventory = cast(int, product_typed.inventory_count)
-        if int(item.quantity) > inventory:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Only {inventory} items available for {product.title}"
-            )
-        
-        # Set unit price from product
-        unit_price_val = cast(float, product_typed.price)
-        item.unit_price = unit_price_val
-
-        # Track items per seller for notifications
-        try:
-            if product.seller and product.seller.user_id:
-                sid = int(product.seller.user_id)
-                entry = seller_items_map.setdefault(sid, [])
-                entry.append({
-                    "title": getattr(product, "title", str(product.id)),
-                    "quantity": int(item.quantity)
-                })
-        except Exception:
-            # best-effort, continue
-            pass
-    
-    # Create the order (this calculates totals)
-    db_order = crud.create_order(db=db, order=order, user_id=current_user.id)
-    
-    # Apply discount if provided
-    if discount_amount > 0 and applied_redemption_id:
-        # Update order with discount
-        setattr(db_order, "discount_amount", discount_amount)
-        discount_code_str = order.discount_code.strip() if order.discount_code else ""
-        setattr(db_order, "discount_code", discount_code_str)
-        setattr(db_order, "applied_redemption_id", applied_redemption_id)
-        
-        # Recalculate total after discount
-        current_total = cast(float, getattr(db_order, "total_amount", 0))
-        new_total = max(0.0, current_total - discount_amount)
-        setattr(db_order, "total_amount", new_total)
-        
-        # Mark redemption as used
-        redemption = db.query(models.Redemption).filter(
-            models.Redemption.id == applied_redemption_id
-        ).first()
-        if redemption:
-            setattr(redemption, "status", "used")
-            setattr(redemption, "order_id", int(getattr(db_order, "id", 0)))  # type: ignore
-            setattr(redemption, "used_at", datetime.utcnow())
-        
-        db.commit()
-        db.refresh(db_order)
-    
-    # Create notification for order placement
-    create_notification(
-        db=db,
-        user_id=current_user.id,
-        title=f"Order #{db_order.order_number} Placed Successfully",
-        message=f"Your order for ${cast(float, db_order.total_amount):.2f} has been placed and is awaiting confirmation.",
-        notification_type="new_order",
-        related_order_id=cast(int, db_order.id)
-    )
-    
-    # Update inventory
-    for item in order.items:
-        product = crud.get_product(db=db, product_id=item.product_id)
-        if product:
-            inv_now = cast(int, product.inventory_count)
-            new_inv = int(inv_now - int(item.quantity))
-            setattr(product, "inventory_count", new_inv)
-            db.commit()
-    
-    # Clear cart after successful order
-    crud.clear_cart(db=db, user_id=current_user.id)
-    
-    # Award loyalty points for the purchase (1 point per $100 spent on final amount)
-    loyalty_account = crud.get_loyalty_account_by_user(db, current_user.id)
-    if loyalty_account:
-        final_amount = cast(float, getattr(db_order, "total_amount", 0))
-        points_earned = int(final_amount / 100)  # 1 point per $100
-        crud.award_points(
-            db=db,
-            loyalty_account_id=cast(int, loyalty_account.id),  # type: ignore
-            points=points_earned,
-            source="purchase",
-            source_id=str(getattr(db_order, "id", 0)),
-            description=f"Earned {points_earned} points from order #{getattr(db_order, 'order_number', 'Unknown')}",
-            metadata={"order_number": getattr(db_order, "order_number", ""), "order_amount": final_amount}
-        )
-    
-    # Notify each seller with items included in the order
+    # Validate stock, take inventory, write the order and clear the cart in one transaction
     try:
-        for seller_user_id, items in seller_items_map.items():
-            # Summarize items: up to 3 titles + count
-            titles = ", ".join([i["title"] for i in items[:3]])
-            more = len(items) - 3
-            if more > 0:
-                titles += f" and {more} more"
-            total_qty = sum(i["quantity"] for i in items)
-            create_notification(
-                db=db,
-                user_id=seller_user_id,
-                title=f"New order #{db_order.order_number}",
-                message=f"You sold {total_qty} item(s): {titles}",
-                notification_type="seller_new_order",
-                related_order_id=cast(int, db_order.id)
-            )
-    except Exception:
-        # best-effort
-        pass
+        db_order = crud.create_order(
+            db=db, order=order, user_id=current_user.id, redemption=redemption,
+            idempotency_key=idempotency_key, request_hash=request_hash
+        )
+    except crud.DuplicateOrderRequest as e:
+        return _replay_order(e.existing, request_hash, response)
+    except crud.OrderError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
     
+    # Buyer/seller notifications and loyalty points were queued with the order (see app/order_jobs.py)
     return db_order
 
     
@@ -196,14 +105,24 @@ def create_order(
 @router.get("/", response_model=List[schemas.Order])
 @router.get("", response_model=List[schemas.Order])
 def get_user_orders(
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(10, ge=1, le=50),
+    cursor: Optional[str] = Query(None, description="Opaque keyset cursor; pass an empty value for the first page"),
     db: Session = Depends(get_db),
     current_user: schemas.User = Depends(auth.get_current_active_user)
 ):
-    """Get current user's orders"""
+    """Get current user's orders.
+
+    With `cursor`, pages by (created_at, id) and returns the next cursor in the `X-Next-Cursor` header.
+    """
     print(f"[orders.py] 🔍 get_user_orders called: user_id={current_user.id}, skip={skip}, limit={limit}")
-    orders = crud.get_orders_by_user(db=db, user_id=current_user.id, skip=skip, limit=limit)
+    if cursor is not None:
+        orders, next_cursor = crud.get_orders_by_user_keyset(db=db, user_id=current_user.id, cursor=cursor, limit=limit)
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+    else:
+        orders = crud.get_orders_by_user(db=db, user_id=current_user.id, skip=skip, limit=limit)
     print(f"[orders.py] 📦 Found {len(orders)} orders for user {current_user.id}")
     for i, o in enumerate(orders):
         print(f"[orders.py]   Order {i}: id={o.id}, order_number={o.order_number}, status={o.status}, user_id={o.user_id}")
@@ -23,6 +23,8 @@ from app.schemas import (
 )
 from app.auth import get_current_user
 from app.crud import get_user
+from app.response_cache import response_cache, PRODUCTS_TAG
+from app.product_images import refresh_image_urls
 
 def _authorized_for_product(db: Session, product_id: int, current_user: User) -> bool:
     """Check if the current user owns the product or is an admin, using scalar values."""
@@ -78,6 +80,8 @@ def add_product_image(
     )
     db.add(db_image)
     db.commit()
+    refresh_image_urls(db, [product_id])
+    response_cache.invalidate(PRODUCTS_TAG)
     db.refresh(db_image)
     
     return db_image
@@ -146,6 +150,8 @@ def update_product_image(
             ProductImage.product_id == product_id
         ).update(update_values)
         db.commit()
+        refresh_image_urls(db, [product_id])
+        response_cache.invalidate(PRODUCTS_TAG)
     # Return fresh row
     updated = db.query(ProductImage).filter(ProductImage.id == image_id).first()
     return updated
@@ -178,6 +184,8 @@ def delete_product_image(
     
     db.delete(image)
     db.commit()
+    refresh_image_urls(db, [product_id])
+    response_cache.invalidate(PRODUCTS_TAG)
     
     return {"message": "Image deleted successfully"}
 
@@ -216,6 +224,8 @@ def set_primary_image(
     # Set this as primary
     db.query(ProductImage).filter(ProductImage.id == image_id).update({ProductImage.is_primary: True})
     db.commit()
+    refresh_image_urls(db, [product_id])
+    response_cache.invalidate(PRODUCTS_TAG)
     
     return {"message": "Image set as primary", "image_id": image_id}
 
@@ -261,6 +271,7 @@ def create_product_variant(
     db.query(Product).filter(Product.id == product_id).update({Product.has_variants: True})
     
     db.commit()
+    response_cache.invalidate(PRODUCTS_TAG)
     db.refresh(db_variant)
     
     return db_variant
@@ -337,6 +348,7 @@ def update_product_variant(
         setattr(variant, field, value)
     
     db.commit()
+    response_cache.invalidate(PRODUCTS_TAG)
     db.refresh(variant)
     
     return variant
@@ -370,6 +382,7 @@ def delete_product_variant(
     
     db.delete(variant)
     db.commit()
+    response_cache.invalidate(PRODUCTS_TAG)
     
     return {"message": "Variant deleted successfully"}
 
@@ -452,6 +465,8 @@ def upload_variant_image(
         # Update variant with new images list using setattr to avoid type checking issues
         setattr(variant, 'images', json.dumps(existing_images))
         db.commit()
+        refresh_image_urls(db, [product_id])
+        response_cache.invalidate(PRODUCTS_TAG)
         db.refresh(db_image)
         
         # Get created_at value safely
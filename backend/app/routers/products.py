@@ -1,12 +1,24 @@
 from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File, Request, Response
 from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy import and_
+from sqlalchemy import and_, or_
 from sqlalchemy.sql import expression
 from typing import List, Optional, Dict, Any, cast
 from .. import crud, schemas, auth
 from ..database import get_db
+from ..database_async import get_async_db
 from ..config import settings
+from ..response_cache import response_cache, PRODUCTS_TAG
+from ..product_images import (
+    _ordered_raw_urls,
+    _ordered_image_urls,
+    _parse_variant_images,
+    _is_id_list,
+    load_images,
+    resolve_image_urls,
+    refresh_image_urls,
+)
 from app import models
 
 # Whether to run AI-powered semantic search. Read from settings if available,
@@ -30,10 +42,11 @@ router = APIRouter(prefix="/products", tags=["products"])
 # search and recommendations.
 
 
-def _format_variant_for_response(variant, db):
+def _format_variant_for_response(variant, db, images_by_id: Optional[Dict[int, Any]] = None):
     """Convert a ProductVariant ORM object into a dict with image URLs resolved.
     - The model stores `images` as JSON string of ProductImage IDs or URLs (in Text column).
     - This resolves IDs to URLs and orders: primary first, non-placeholder next, placeholders last.
+    - When `images_by_id` is given (bulk formatting), IDs are resolved from it instead of the DB.
     """
     # Base fields
     variant_dict = {
@@ -56,52 +69,18 @@ def _format_variant_for_response(variant, db):
         "images": []
     }
 
-    # Helper to normalize relative URLs into served /uploads paths
-    def _norm(u: str) -> str:
-        try:
-            s = str(u)
-        except Exception:
-            return str(u)
-        if s.startswith('http'):
-            return s
-        if s.startswith('/uploads/'):
-            return s
-        if s.startswith('uploads/'):
-            return '/' + s
-        if s.startswith('/products/'):
-            return '/uploads' + s
-        if s.startswith('products/'):
-            return '/uploads/' + s
-        return s
-
     # Resolve images from JSON/Text
     try:
-        raw = getattr(variant, "images", None)
-        imgs = None
-        if isinstance(raw, list):
-            imgs = raw
-        elif isinstance(raw, str) and raw.strip():
-            try:
-                imgs = json.loads(raw)
-            except Exception:
-                imgs = None
-        if isinstance(imgs, list) and imgs:
-            if all(isinstance(x, int) for x in imgs):
-                image_objs = db.query(models.ProductImage).filter(models.ProductImage.id.in_(imgs)).all()
-                def image_sort_key(img):
-                    placeholder_penalty = 1 if "placeholder-" in str(img.image_url) else 0
-                    primary_rank = 0 if getattr(img, "is_primary", False) else 1
-                    return (primary_rank, placeholder_penalty, getattr(img, "sort_order", 0))
-                image_objs_sorted = sorted(image_objs, key=image_sort_key)
-                variant_dict["images"] = [_norm(str(img.image_url)) for img in image_objs_sorted]
+        imgs = _parse_variant_images(getattr(variant, "images", None))
+        if imgs:
+            if _is_id_list(imgs):
+                if images_by_id is not None:
+                    image_objs = [images_by_id[i] for i in dict.fromkeys(imgs) if i in images_by_id]
+                else:
+                    image_objs = db.query(models.ProductImage).filter(models.ProductImage.id.in_(imgs)).all()
+                variant_dict["images"] = _ordered_image_urls(image_objs)
             else:
-                urls = [_norm(str(x)) for x in imgs]
-                if len(urls) > 1:
-                    non_placeholder = [u for u in urls if "placeholder-" not in u]
-                    if non_placeholder:
-                        first_real = non_placeholder[0]
-                        urls = [first_real] + [u for u in urls if u != first_real]
-                variant_dict["images"] = urls
+                variant_dict["images"] = _ordered_raw_urls(imgs)
     except Exception as e:
         if settings.debug:
             print(f"[IMG_DEBUG] Variant {getattr(variant,'id','?')} image resolution error: {e}")
@@ -109,14 +88,8 @@ def _format_variant_for_response(variant, db):
     return variant_dict
 
 
-def format_product_for_response(product, db):
-    """Convert a Product ORM object to a response dict with image URLs instead of IDs.
-    
-    This helper ensures all product endpoints return consistent, valid data:
-    - Converts numeric image IDs to actual image URLs from the ProductImage table
-    - Follows the schemas.Product response model format
-    """
-    product_dict = {
+def _product_base_dict(product) -> Dict[str, Any]:
+    return {
         "id": product.id,
         "seller_id": product.seller_id,
         "category_id": product.category_id,
@@ -131,6 +104,7 @@ def format_product_for_response(product, db):
         "weight": product.weight,
         "dimensions": product.dimensions,
         "images": [],
+        "primary_image_url": product.primary_image_url,
         "is_active": product.is_active,
         "is_featured": product.is_featured,
         "has_variants": product.has_variants,
@@ -147,84 +121,98 @@ def format_product_for_response(product, db):
         "variants": [],
         "seller": product.seller,
     }
-    
-    # Helper to normalize relative URLs into served /uploads paths
-    def _norm(u: str) -> str:
-        try:
-            s = str(u)
-        except Exception:
-            return str(u)
-        if s.startswith('http'):
-            return s
-        if s.startswith('/uploads/'):
-            return s
-        if s.startswith('uploads/'):
-            return '/' + s
-        if s.startswith('/products/'):
-            return '/uploads' + s
-        if s.startswith('products/'):
-            return '/uploads/' + s
-        return s
-
-    # Resolve images: support both legacy URL lists and normalized ID lists
+
+
+def format_products_for_response(products, db) -> List[Dict[str, Any]]:
+    """Bulk version of `format_product_for_response` for listing pages.
+
+    Product images come from the stored `image_urls` column, so products cost
+    no image queries at all. The page still needs:
+    - one query for the variants of every product on the page
+    - one `IN (...)` query for the ProductImage IDs referenced by those variants,
+      plus the images of any product whose URL columns haven't been backfilled
+    """
+    products = list(products)
+    if not products:
+        return []
+
+    product_ids = [p.id for p in products]
+
+    # Batch-load variants instead of touching each product's lazy relationship
+    variants_by_product: Dict[int, list] = {pid: [] for pid in product_ids}
     try:
-        if isinstance(product.images, list):
-            if all(isinstance(x, int) for x in product.images):
-                id_list = list(product.images)
-                if id_list:
-                    image_objs = db.query(models.ProductImage).filter(
-                        models.ProductImage.id.in_(id_list)
-                    ).all()
-                    def image_sort_key(img):
-                        placeholder_penalty = 1 if "placeholder-" in str(img.image_url) else 0
-                        primary_rank = 0 if getattr(img, "is_primary", False) else 1
-                        return (primary_rank, placeholder_penalty, getattr(img, "sort_order", 0))
-                    image_objs_sorted = sorted(image_objs, key=image_sort_key)
-                    ordered_urls = [_norm(str(img.image_url)) for img in image_objs_sorted]
-                    product_dict["images"] = ordered_urls
-                    if settings.debug:
-                        print(f"[IMG_DEBUG] Product {product.slug} IDs->{id_list} resolved->{ordered_urls[:3]}")
-            else:
-                raw_urls = [_norm(str(x)) for x in list(product.images)]
-                if len(raw_urls) > 1:
-                    non_placeholder = [u for u in raw_urls if "placeholder-" not in u]
-                    if non_placeholder:
-                        first_real = non_placeholder[0]
-                        raw_urls = [first_real] + [u for u in raw_urls if u != first_real]
-                product_dict["images"] = raw_urls
-                if settings.debug:
-                    print(f"[IMG_DEBUG] Product {product.slug} raw URLs->{raw_urls[:3]}")
-        # Fallback: if product.images is empty or None but ProductImage rows exist, pull them.
-        if (not isinstance(product.images, list) or len(product.images) == 0):
-            image_objs = db.query(models.ProductImage).filter(models.ProductImage.product_id == product.id).all()
-            if image_objs:
-                def image_sort_key(img):
-                    placeholder_penalty = 1 if "placeholder-" in str(img.image_url) else 0
-                    primary_rank = 0 if getattr(img, "is_primary", False) else 1
-                    return (primary_rank, placeholder_penalty, getattr(img, "sort_order", 0))
-                image_objs_sorted = sorted(image_objs, key=image_sort_key)
-                fallback_urls = [_norm(str(img.image_url)) for img in image_objs_sorted]
-                product_dict["images"] = fallback_urls
-                if settings.debug:
-                    print(f"[IMG_DEBUG] Product {product.slug} fallback ProductImage rows -> {fallback_urls[:3]}")
+        variant_rows = db.query(models.ProductVariant).filter(
+            models.ProductVariant.product_id.in_(product_ids)
+        ).order_by(models.ProductVariant.id).all()
+        for v in variant_rows:
+            variants_by_product.setdefault(v.product_id, []).append(v)
     except Exception as e:
-        product_dict["images"] = []
         if settings.debug:
-            print(f"[IMG_DEBUG] Product {getattr(product,'slug','?')} image resolution error: {e}")
-    
-    # Attach formatted variants (if any), resolving variant images to URLs
+            print(f"[IMG_DEBUG] Variant batch load error: {e}")
+
+    variant_image_ids: set[int] = set()
+    for variants in variants_by_product.values():
+        for v in variants:
+            imgs = _parse_variant_images(getattr(v, "images", None))
+            if imgs and _is_id_list(imgs):
+                variant_image_ids.update(imgs)
+
+    # Products written before the URL columns existed are resolved live
+    unresolved = [p for p in products if p.image_urls is None]
+    images_by_id: Dict[int, Any] = {}
+    images_by_product: Dict[int, list] = {}
     try:
-        if getattr(product, "variants", None):
-            product_dict["variants"] = [_format_variant_for_response(v, db) for v in product.variants]
+        images_by_id, images_by_product = load_images(db, unresolved, extra_image_ids=variant_image_ids)
     except Exception as e:
         if settings.debug:
-            print(f"[IMG_DEBUG] Product {getattr(product,'slug','?')} variant formatting error: {e}")
+            print(f"[IMG_DEBUG] Image batch load error: {e}")
+
+    results = []
+    for product in products:
+        product_dict = _product_base_dict(product)
+
+        try:
+            if product.image_urls is not None:
+                product_dict["images"] = list(product.image_urls)
+            else:
+                product_dict["images"] = resolve_image_urls(product, images_by_id, images_by_product)
+                if product_dict["primary_image_url"] is None and product_dict["images"]:
+                    product_dict["primary_image_url"] = product_dict["images"][0]
+            if settings.debug:
+                print(f"[IMG_DEBUG] Product {product.slug} images -> {product_dict['images'][:3]}")
+        except Exception as e:
+            product_dict["images"] = []
+            if settings.debug:
+                print(f"[IMG_DEBUG] Product {getattr(product,'slug','?')} image resolution error: {e}")
+
+        # Attach formatted variants (if any), resolving variant images to URLs
+        try:
+            product_dict["variants"] = [
+                _format_variant_for_response(v, db, images_by_id=images_by_id)
+                for v in variants_by_product.get(product.id, [])
+            ]
+        except Exception as e:
+            if settings.debug:
+                print(f"[IMG_DEBUG] Product {getattr(product,'slug','?')} variant formatting error: {e}")
+
+        results.append(product_dict)
 
-    return product_dict
+    return results
+
+
+def format_product_for_response(product, db):
+    """Convert a Product ORM object to a response dict with image URLs instead of IDs.
+    
+    This helper ensures all product endpoints return consistent, valid data:
+    - Converts numeric image IDs to actual image URLs from the ProductImage table
+    - Follows the schemas.Product response model format
+    """
+    return format_products_for_response([product], db)[0]
 
 
 @router.get("/")
-def get_products(
+async def get_products(
+    request: Request,
     page: int = Query(1, ge=1),
     per_page: int = Query(50, ge=1, le=100),
     q: Optional[str] = Query(None),
@@ -235,18 +223,27 @@ def get_products(
     sort_by: str = Query("created_at"),
     sort_order: str = Query("desc"),
     with_meta: bool = Query(False),
-    response: Response = None,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = Query(None, description="Opaque keyset cursor; pass an empty value for the first page"),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get products with filtering, sorting, and pagination"""
-    try:
+    """Get products with filtering, sorting, and pagination.
+
+    Passing `cursor` switches to keyset pagination: the response carries
+    `next_cursor` (also sent as the `X-Next-Cursor` header) and skips the total count.
+    """
+    cached = await response_cache.lookup_async(request, tags=(PRODUCTS_TAG,))
+    if cached is not None:
+        return cached
+
+    # Add caching headers for better performance
+    headers = {"Cache-Control": "public, max-age=300"}
+
+    # Sync query/format helpers run on the async connection via run_sync
+    def build_page(db: Session):
         skip = (page - 1) * per_page
         # Support both `q` and `search` query params for compatibility with different clients/tests
         search_query = q or search
-        products = crud.get_products(
-            db=db,
-            skip=skip,
-            limit=per_page,
+        filters = dict(
             search=search_query,
             semantic_search=get_semantic_search_query(search_query) if ai_search and search_query else None,
             category_id=category_id,
@@ -255,36 +252,41 @@ def get_products(
             sort_by=sort_by,
             sort_order=sort_order
         )
-        
-        total = crud.count_products(
-            db=db,
-            search=search_query,
-            semantic_search=get_semantic_search_query(search_query) if ai_search and search_query else None,
-            category_id=category_id,
-            min_price=min_price,
-            max_price=max_price
-        )
-        
-        pages = math.ceil(total / per_page) if total > 0 else 0
-        
-        # Convert products to dict format using the helper
-        products_data = [format_product_for_response(product, db) for product in products]
-        
-        # Add caching headers for better performance
-        if response:
-            response.headers["Cache-Control"] = "public, max-age=300"
-        
-        if with_meta:
-            return {
-                "items": products_data,
+
+        if cursor is not None:
+            products, next_cursor = crud.get_products_keyset(db=db, cursor=cursor, limit=per_page, **filters)
+            if next_cursor:
+                headers["X-Next-Cursor"] = next_cursor
+            payload = {
+                "items": format_products_for_response(products, db),
+                "per_page": per_page,
+                "next_cursor": next_cursor,
+                "has_more": next_cursor is not None
+            }
+        elif with_meta:
+            # Page and exact total in one pass (window count on Postgres, cached count elsewhere)
+            products, total = crud.get_products_with_total(db=db, skip=skip, limit=per_page, **filters)
+            pages = math.ceil(total / per_page) if total > 0 else 0
+            payload = {
+                "items": format_products_for_response(products, db),
                 "total": total,
                 "page": page,
                 "per_page": per_page,
                 "pages": pages
             }
+        else:
+            # Plain list clients don't get a total; probe one extra row to tell them whether more exist
+            products = crud.get_products(db=db, skip=skip, limit=per_page + 1, **filters)
+            has_more = len(products) > per_page
+            headers["X-Has-More"] = "true" if has_more else "false"
+            # Historically some clients expect a plain list; return list for compatibility
+            payload = format_products_for_response(products[:per_page], db)
+        return payload
 
-        # Historically some clients expect a plain list; return list for compatibility
-        return products_data
+    try:
+        payload = await db.run_sync(build_page)
+    except HTTPException:
+        raise
     except Exception as e:
         # Print full traceback to logs when debug is enabled to aid diagnosis in production
         try:
@@ -294,20 +296,22 @@ def get_products(
             pass
         raise HTTPException(status_code=500, detail=f"Error fetching products: {str(e)}")
 
+    return await response_cache.store_async(request, payload, tags=(PRODUCTS_TAG,), headers=headers)
+
 
 @router.get("/featured/")
 @router.get("/featured")
-def get_featured_products(limit: int = Query(8, ge=1, le=20), db: Session = Depends(get_db)):
+def get_featured_products(request: Request, limit: int = Query(8, ge=1, le=20), db: Session = Depends(get_db)):
     """Get featured products"""
+    cached = response_cache.lookup(request, tags=(PRODUCTS_TAG,))
+    if cached is not None:
+        return cached
     try:
-        products = db.query(crud.models.Product).filter(
-            crud.models.Product.is_featured == True,
-            crud.models.Product.is_active == True,
-            crud.models.Product.approval_status == "approved"
-        ).limit(limit).all()
+        products = crud.get_featured_products(db=db, limit=limit)
         
-        # Convert products to dict format using the helper
-        return [format_product_for_response(product, db) for product in products]
+        # Convert products to dict format using the bulk helper
+        payload = format_products_for_response(products, db)
+        return response_cache.store(request, payload, tags=(PRODUCTS_TAG,))
     except Exception as e:
         try:
             if getattr(settings, 'debug', False):
@@ -318,22 +322,95 @@ def get_featured_products(limit: int = Query(8, ge=1, le=20), db: Session = Depe
 
 
 
+def _search_item(product, formatted: Dict[str, Any]) -> Dict[str, Any]:
+    """Flat search result row; `formatted` is the product's entry from the bulk formatter."""
+    image_urls: list[str] = formatted.get("images", [])
+    return {
+        "id": product.id,
+        "seller_id": product.seller_id,
+        "category_id": product.category_id,
+        "title": product.title,
+        "slug": product.slug,
+        "description": product.description,
+        "short_description": product.short_description,
+        "price": product.price,
+        "compare_price": product.compare_price,
+        "sku": product.sku,
+        "inventory_count": product.inventory_count,
+        "weight": product.weight,
+        "dimensions": product.dimensions,
+        "images": image_urls,
+        "is_active": product.is_active,
+        "is_featured": product.is_featured,
+        "rating": product.rating,
+        "review_count": product.review_count,
+        "created_at": product.created_at.isoformat() if product.created_at is not None else None,
+        "updated_at": product.updated_at.isoformat() if product.updated_at is not None else None
+    }
+
+
 @router.get("/search")
 @router.get("/search/")
-def search_products(
+async def search_products(
+    request: Request,
     q: str = Query(..., min_length=1),
     skip: int = Query(0, ge=0),
     limit: int = Query(20, ge=1, le=100),
     category_id: Optional[int] = Query(None),
     min_price: Optional[float] = Query(None, ge=0),
     max_price: Optional[float] = Query(None, ge=0),
-    sort_by: str = Query("created_at", regex="^(created_at|price|rating|title)$"),
+    sort_by: str = Query("created_at", regex="^(created_at|price|rating|title|relevance)$"),
     sort_order: str = Query("desc", regex="^(asc|desc)$"),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = Query(None, description="Opaque keyset cursor; pass an empty value for the first page"),
+    facets: bool = Query(False, description="Include category, price and rating facet counts"),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Search products"""
-    try:
-        products = crud.get_products(
+    """Search products by full-text match on title, short description and description.
+
+    Words match as prefixes; `sort_by=relevance` ranks the best matches first.
+    With `facets=true` the response also carries sidebar counts for the search.
+    """
+    cached = await response_cache.lookup_async(request, tags=(PRODUCTS_TAG,))
+    if cached is not None:
+        return cached
+
+    def build_results(db: Session):
+        facet_counts = None
+        if facets:
+            facet_counts = crud.get_product_facets(
+                db=db,
+                search=q,
+                semantic_search=get_semantic_search_query(q) if ai_search and q else None,
+                category_id=category_id,
+                min_price=min_price,
+                max_price=max_price
+            )
+
+        if cursor is not None:
+            products, next_cursor = crud.get_products_keyset(
+                db=db,
+                cursor=cursor,
+                limit=limit,
+                search=q,
+                semantic_search=get_semantic_search_query(q) if ai_search and q else None,
+                category_id=category_id,
+                min_price=min_price,
+                max_price=max_price,
+                sort_by=sort_by,
+                sort_order=sort_order
+            )
+            formatted_page = format_products_for_response(products, db)
+            result = {
+                "items": [_search_item(product, formatted) for product, formatted in zip(products, formatted_page)],
+                "per_page": limit,
+                "next_cursor": next_cursor,
+                "has_more": next_cursor is not None
+            }
+            if facet_counts is not None:
+                result["facets"] = facet_counts
+            return result
+
+        products, total = crud.get_products_with_total(
             db=db,
             skip=skip,
             limit=limit,
@@ -346,56 +423,29 @@ def search_products(
             sort_order=sort_order
         )
         
-        total = crud.count_products(
-            db=db,
-            search=q,
-            semantic_search=get_semantic_search_query(q) if ai_search and q else None,
-            category_id=category_id,
-            min_price=min_price,
-            max_price=max_price
-        )
-        
         pages = math.ceil(total / limit) if total > 0 else 0
         page = (skip // limit) + 1
         
         # Convert products to dict format
-        products_data = []
-        for product in products:
-            # Use unified formatter for consistency (includes image ordering logic)
-            formatted = format_product_for_response(product, db)
-            image_urls: list[str] = formatted.get("images", [])
-
-            product_dict = {
-                "id": product.id,
-                "seller_id": product.seller_id,
-                "category_id": product.category_id,
-                "title": product.title,
-                "slug": product.slug,
-                "description": product.description,
-                "short_description": product.short_description,
-                "price": product.price,
-                "compare_price": product.compare_price,
-                "sku": product.sku,
-                "inventory_count": product.inventory_count,
-                "weight": product.weight,
-                "dimensions": product.dimensions,
-                "images": image_urls,
-                "is_active": product.is_active,
-                "is_featured": product.is_featured,
-                "rating": product.rating,
-                "review_count": product.review_count,
-                "created_at": product.created_at.isoformat() if product.created_at is not None else None,
-                "updated_at": product.updated_at.isoformat() if product.updated_at is not None else None
-            }
-            products_data.append(product_dict)
+        # Use unified bulk formatter for consistency (includes image ordering logic)
+        formatted_page = format_products_for_response(products, db)
+        products_data = [_search_item(product, formatted) for product, formatted in zip(products, formatted_page)]
         
-        return {
+        result = {
             "items": products_data,
             "total": total,
             "page": page,
             "per_page": limit,
             "pages": pages
         }
+        if facet_counts is not None:
+            result["facets"] = facet_counts
+        return result
+
+    try:
+        result = await db.run_sync(build_results)
+    except HTTPException:
+        raise
     except Exception as e:
         try:
             if getattr(settings, 'debug', False):
@@ -404,25 +454,35 @@ def search_products(
             pass
         raise HTTPException(status_code=500, detail=f"Error searching products: {str(e)}")
 
+    return await response_cache.store_async(request, result, tags=(PRODUCTS_TAG,))
 
-@router.get("/slug/{slug}", response_model=schemas.Product)
-@router.get("/slug/{slug}/", response_model=schemas.Product)
-def get_product_by_slug(slug: str, db: Session = Depends(get_db)):
-    """Get product by slug using unified formatter for consistent image ordering."""
-    product = crud.get_product_by_slug(db=db, slug=slug)
+
+def _product_detail(db: Session, product) -> Dict[str, Any]:
     if product is None:
         raise HTTPException(status_code=404, detail="Product not found")
     return format_product_for_response(product, db)
 
 
+@router.get("/slug/{slug}", response_model=schemas.Product)
+@router.get("/slug/{slug}/", response_model=schemas.Product)
+async def get_product_by_slug(slug: str, request: Request, db: AsyncSession = Depends(get_async_db)):
+    """Get product by slug using unified formatter for consistent image ordering."""
+    cached = await response_cache.lookup_async(request, tags=(PRODUCTS_TAG,))
+    if cached is not None:
+        return cached
+    payload = await db.run_sync(lambda s: _product_detail(s, crud.get_product_by_slug(db=s, slug=slug)))
+    return await response_cache.store_async(request, payload, tags=(PRODUCTS_TAG,), response_model=schemas.Product)
+
+
 @router.get("/{product_id}", response_model=schemas.Product)
 @router.get("/{product_id}/", response_model=schemas.Product)
-def get_product(product_id: int, db: Session = Depends(get_db)):
+async def get_product(product_id: int, request: Request, db: AsyncSession = Depends(get_async_db)):
     """Get product by ID using unified formatter for consistent image ordering."""
-    product = crud.get_product(db=db, product_id=product_id)
-    if product is None:
-        raise HTTPException(status_code=404, detail="Product not found")
-    return format_product_for_response(product, db)
+    cached = await response_cache.lookup_async(request, tags=(PRODUCTS_TAG,))
+    if cached is not None:
+        return cached
+    payload = await db.run_sync(lambda s: _product_detail(s, crud.get_product(db=s, product_id=product_id)))
+    return await response_cache.store_async(request, payload, tags=(PRODUCTS_TAG,), response_model=schemas.Product)
 
 
 # -----------------------------
@@ -468,6 +528,8 @@ def set_primary_image(
         models.ProductImage.is_primary: True
     })
     db.commit()
+    refresh_image_urls(db, [product_id])
+    response_cache.invalidate(PRODUCTS_TAG)
     return {"message": "Primary image updated."}
 
 
@@ -505,6 +567,8 @@ def reorder_images(
             models.ProductImage.id == iid
         ).update({models.ProductImage.sort_order: order})
     db.commit()
+    refresh_image_urls(db, [product_id])
+    response_cache.invalidate(PRODUCTS_TAG)
     return {"message": "Images reordered.", "order": payload.image_ids}
 
 
@@ -751,6 +815,7 @@ def delete_product(
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to delete product: {e}")
+    response_cache.invalidate(PRODUCTS_TAG)
 
     return {"message": "Product deleted", "success": True}
 
@@ -828,7 +893,7 @@ def get_product_recommendations_endpoint(
     if not recommendations:
         raise HTTPException(status_code=404, detail="No recommendations found for this product.")
     # Convert ORM objects to dicts with image URLs
-    return [format_product_for_response(product, db) for product in recommendations]
+    return format_products_for_response(recommendations, db)
 
 
 
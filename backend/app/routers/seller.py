@@ -4,7 +4,6 @@ from sqlalchemy import func
 from typing import List
 from .. import crud, schemas, auth
 from ..database import get_db
-from typing import cast
 from datetime import datetime
 
 router = APIRouter(prefix="/seller", tags=["seller"])
@@ -29,18 +28,12 @@ def get_seller_products(
     search: str = Query(None, description="Search by product name or category"),
     status: str = Query(None, description="Filter by status: active, inactive, or out_of_stock"),
     db: Session = Depends(get_db),
-    current_user: schemas.User = Depends(auth.get_current_seller)
+    seller_id: int = Depends(auth.get_current_seller_id)
 ):
     """Get current seller's products with optional search and filters"""
     from sqlalchemy import or_
     from ..models import Product, Category
     
-    seller = crud.get_seller_by_user_id(db=db, user_id=current_user.id)
-    if not seller:
-        raise HTTPException(status_code=404, detail="Seller profile not found")
-    
-    seller_id = cast(int, seller.id)
-    
     # Build query
     query = db.query(Product).filter(Product.seller_id == seller_id)
     
@@ -124,20 +117,16 @@ def get_seller_orders(
     skip: int = Query(0, ge=0),
     limit: int = Query(20, ge=1, le=100),
     db: Session = Depends(get_db),
-    current_user: schemas.User = Depends(auth.get_current_seller)
+    seller_id: int = Depends(auth.get_current_seller_id)
 ):
     """Get orders containing seller's products"""
-    seller = crud.get_seller_by_user_id(db=db, user_id=current_user.id)
-    if not seller:
-        raise HTTPException(status_code=404, detail="Seller profile not found")
-    
     # Get orders that contain products from this seller
     orders = db.query(crud.models.Order).join(
         crud.models.OrderItem
     ).join(
         crud.models.Product
     ).filter(
-        crud.models.Product.seller_id == seller.id
+        crud.models.Product.seller_id == seller_id
     ).options(
         joinedload(crud.models.Order.order_items).joinedload(crud.models.OrderItem.product),
         joinedload(crud.models.Order.user)
@@ -149,20 +138,16 @@ def get_seller_orders(
 def get_seller_order_detail(
     order_id: int,
     db: Session = Depends(get_db),
-    current_user: schemas.User = Depends(auth.get_current_seller)
+    seller_id: int = Depends(auth.get_current_seller_id)
 ):
     """Get a specific order by ID if it contains current seller's products"""
-    seller = crud.get_seller_by_user_id(db=db, user_id=current_user.id)
-    if not seller:
-        raise HTTPException(status_code=404, detail="Seller profile not found")
-
     order = db.query(crud.models.Order).join(
         crud.models.OrderItem
     ).join(
         crud.models.Product
     ).filter(
         crud.models.Order.id == order_id,
-        crud.models.Product.seller_id == seller.id
+        crud.models.Product.seller_id == seller_id
     ).options(
         joinedload(crud.models.Order.order_items).joinedload(crud.models.OrderItem.product),
         joinedload(crud.models.Order.user)
@@ -274,13 +259,9 @@ def get_seller_dashboard(
 @router.get("/analytics")
 def get_seller_analytics(
     db: Session = Depends(get_db),
-    current_user: schemas.User = Depends(auth.get_current_seller)
+    seller_id: int = Depends(auth.get_current_seller_id)
 ):
     """Get seller analytics data"""
-    seller = crud.get_seller_by_user_id(db=db, user_id=current_user.id)
-    if not seller:
-        raise HTTPException(status_code=404, detail="Seller profile not found")
-    
     # Get top selling products
     top_products = db.query(
         crud.models.Product.title,
@@ -289,7 +270,7 @@ def get_seller_analytics(
     ).join(
         crud.models.OrderItem
     ).filter(
-        crud.models.Product.seller_id == seller.id
+        crud.models.Product.seller_id == seller_id
     ).group_by(
         crud.models.Product.id, crud.models.Product.title
     ).order_by(
@@ -302,7 +283,7 @@ def get_seller_analytics(
     ).join(
         crud.models.Product
     ).filter(
-        crud.models.Product.seller_id == seller.id
+        crud.models.Product.seller_id == seller_id
     ).distinct().order_by(
         crud.models.Order.created_at.desc()
     ).limit(10).all()
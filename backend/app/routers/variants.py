@@ -6,6 +6,7 @@ from sqlalchemy.orm import Session
 from typing import List
 from app import models, schemas, auth
 from app.database import get_db
+from app.response_cache import response_cache, PRODUCTS_TAG
 import json
 
 router = APIRouter(prefix="/products", tags=["product-variants"])
@@ -87,6 +88,7 @@ def create_product_variant(
         )
     
     db.commit()
+    response_cache.invalidate(PRODUCTS_TAG)
     db.refresh(db_variant)
     
     # Build response dict to avoid SQLAlchemy attribute access issues
@@ -248,6 +250,7 @@ def update_product_variant(
             setattr(variant, field, value)
     
     db.commit()
+    response_cache.invalidate(PRODUCTS_TAG)
     db.refresh(variant)
     
     # Build response dict
@@ -328,5 +331,6 @@ def delete_product_variant(
         )
     
     db.commit()
+    response_cache.invalidate(PRODUCTS_TAG)
     
     return None
@@ -3,14 +3,24 @@ from fastapi import WebSocketDisconnect
 from sqlalchemy.orm import Session
 from ..database import SessionLocal
 from .. import auth, crud
-from ..ws_manager import manager
+from ..ws_manager import PONG, manager
+from ..ws_redis import bridge
+import json
 import logging
+import time
 from typing import cast
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
 
+def _event_type(data: str):
+    try:
+        return json.loads(data).get("type")
+    except (ValueError, AttributeError):
+        return None
+
+
 def get_user_from_token(token: str):
     """Decode token to username and fetch user from DB (synchronous helper)."""
     credentials_exception = Exception("Invalid token")
@@ -45,14 +55,24 @@ async def websocket_messages(websocket: WebSocket, token: str = Query(None)):
         return
 
     user_id = cast(int, user.id)
-    await manager.connect(user_id, websocket)
+    conn = await manager.connect(user_id, websocket)
     logger.info(f"User {user_id} connected to websocket")
     try:
+        await bridge.user_connected(user_id)
         while True:
-            # Keep the connection alive and optionally receive messages
             data = await websocket.receive_text()
+            # Any frame counts as activity for idle reaping
+            conn.last_seen = time.monotonic()
+            if data == "ping" or _event_type(data) == "ping":
+                conn.offer(PONG)
+                continue
             # Optionally handle client-sent events (typing, read receipts)
             logger.debug(f"WS received from {user_id}: {data}")
     except WebSocketDisconnect:
-        manager.disconnect(user_id, websocket)
         logger.info(f"User {user_id} disconnected from websocket")
+    except Exception as e:
+        logger.warning(f"WS connection for user {user_id} failed: {e!r}")
+    finally:
+        # Always unregister, whatever ended the loop, so nothing leaks in the registry
+        manager.disconnect(user_id, websocket)
+        await bridge.user_disconnected(user_id)
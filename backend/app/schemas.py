@@ -101,6 +101,9 @@ class Category(CategoryBase):
     created_at: datetime
     class Config: from_attributes = True
 
+class CategoryTreeNode(Category):
+    children: List["CategoryTreeNode"] = []
+
 # Product Schemas
 class ProductBase(BaseModel):
     title: str
@@ -210,6 +213,7 @@ class Product(ProductBase):
     is_active: bool
     is_featured: bool
     has_variants: bool = False
+    primary_image_url: Optional[str] = None
     variants: List['ProductVariant'] = []
     approval_status: Optional[str] = "pending"
     rejection_reason: Optional[str] = None
@@ -245,6 +249,7 @@ class CartItem(CartItemBase):
 # Order Schemas
 class OrderItemBase(BaseModel):
     product_id: Optional[int] = None
+    variant_id: Optional[int] = None
     quantity: int
     unit_price: float
 
@@ -384,6 +389,13 @@ class Notification(NotificationBase):
     created_at: datetime
     class Config: from_attributes = True
 
+class NotificationBroadcast(BaseModel):
+    title: str
+    message: str
+    type: str = "announcement"
+    audience: str = "all"  # all, buyers, sellers
+    user_ids: Optional[List[int]] = None  # explicit recipients; overrides audience
+
 # Return Schemas
 class ReturnItemBase(BaseModel):
     order_item_id: int
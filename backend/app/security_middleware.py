@@ -2,187 +2,178 @@
 Security Middleware - Rate Limiting, CSRF Protection, and Request Logging
 Enhances application security with multiple layers of protection
 """
-from fastapi import Request, HTTPException, status
+from fastapi import status
 from fastapi.responses import JSONResponse
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 from datetime import datetime, timedelta
-from collections import defaultdict
 import time
 import logging
 import hashlib
+import math
 import secrets
 from typing import Dict, Tuple
+from . import rate_limit
+from .rate_limit import RateLimiter, RateLimitPolicy
 
 logger = logging.getLogger(__name__)
 
-# Rate limiting storage (in-memory - use Redis for production)
-rate_limit_storage: Dict[str, list] = defaultdict(list)
-blocked_ips: Dict[str, datetime] = {}
-
-class RateLimitMiddleware(BaseHTTPMiddleware):
+class RateLimitMiddleware:
     """
     Rate limiting middleware to prevent API abuse
-    Configurable limits per endpoint and IP address
+    Budgets per user/IP and per route come from `app.rate_limit` and are shared
+    across workers through Redis when `rate_limit_use_redis` is on
     """
     
-    def __init__(self, app, requests_per_minute: int = 300, requests_per_hour: int = 5000):
-        super().__init__(app)
-        self.requests_per_minute = requests_per_minute
-        self.requests_per_hour = requests_per_hour
-        self.cleanup_interval = 300  # Cleanup old entries every 5 minutes
-        self.last_cleanup = time.time()
+    def __init__(self, app: ASGIApp, limiter: RateLimiter = rate_limit.limiter, policy: RateLimitPolicy = rate_limit.policy):
+        self.app = app
+        self.limiter = limiter
+        self.policy = policy
     
-    async def dispatch(self, request: Request, call_next):
-        # Get client IP
-        client_ip = request.client.host if request.client else "unknown"
-        
-        # Check if IP is blocked
-        if client_ip in blocked_ips:
-            if datetime.now() < blocked_ips[client_ip]:
-                return JSONResponse(
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        method = scope["method"]
+        path = scope["path"]
+        if self.policy.is_exempt(method, path):
+            await self.app(scope, receive, send)
+            return
+        
+        client = scope.get("client")
+        client_ip = client[0] if client else "unknown"
+        caller = rate_limit.identify(Headers(scope=scope).get("authorization"), client_ip)
+        
+        # Report the tightest budget in the headers
+        tightest = None
+        for key, rate in self.policy.budgets(method, path, caller):
+            result = await self.limiter.hit(key, rate)
+            if not result.allowed:
+                logger.warning("%s exceeded rate limit %s/%ss on %s %s", caller, rate.limit, rate.period, method, path)
+                response = JSONResponse(
                     status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                    content={"detail": "Too many requests. Your IP is temporarily blocked."}
+                    content={"detail": "Rate limit exceeded. Please slow down."},
+                    headers={
+                        "Retry-After": str(max(1, math.ceil(result.retry_after))),
+                        "X-RateLimit-Limit": str(result.limit),
+                        "X-RateLimit-Remaining": "0",
+                        "X-RateLimit-Reset": str(math.ceil(result.reset_after)),
+                    }
                 )
-            else:
-                del blocked_ips[client_ip]
-        
-        # Get current timestamp
-        now = time.time()
-        
-        # Cleanup old entries periodically
-        if now - self.last_cleanup > self.cleanup_interval:
-            self._cleanup_old_entries()
-            self.last_cleanup = now
-        
-        # Get request history for this IP
-        request_times = rate_limit_storage[client_ip]
-        
-        # Remove requests older than 1 hour
-        request_times[:] = [t for t in request_times if now - t < 3600]
-        
-        # Check hourly limit
-        if len(request_times) >= self.requests_per_hour:
-            # Block IP for 1 hour
-            blocked_ips[client_ip] = datetime.now() + timedelta(hours=1)
-            logger.warning(f"IP {client_ip} blocked for exceeding hourly rate limit")
-            return JSONResponse(
-                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                content={"detail": "Hourly rate limit exceeded. Try again later."}
-            )
-        
-        # Check per-minute limit
-        recent_requests = [t for t in request_times if now - t < 60]
-        if len(recent_requests) >= self.requests_per_minute:
-            logger.warning(f"IP {client_ip} exceeded per-minute rate limit")
-            return JSONResponse(
-                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                content={"detail": "Rate limit exceeded. Please slow down."}
-            )
-        
-        # Add current request
-        request_times.append(now)
-        
-        # Process request
-        response = await call_next(request)
-        
-        # Add rate limit headers
-        response.headers["X-RateLimit-Limit"] = str(self.requests_per_minute)
-        response.headers["X-RateLimit-Remaining"] = str(self.requests_per_minute - len(recent_requests) - 1)
-        response.headers["X-RateLimit-Reset"] = str(int(now + 60))
-        
-        return response
-    
-    def _cleanup_old_entries(self):
-        """Remove expired entries from storage"""
-        now = time.time()
-        expired_ips = []
-        
-        for ip, times in rate_limit_storage.items():
-            # Keep only requests from last hour
-            rate_limit_storage[ip] = [t for t in times if now - t < 3600]
-            if not rate_limit_storage[ip]:
-                expired_ips.append(ip)
-        
-        # Remove empty entries
-        for ip in expired_ips:
-            del rate_limit_storage[ip]
-        
-        logger.info(f"Cleaned up {len(expired_ips)} expired rate limit entries")
+                await response(scope, receive, send)
+                return
+            if tightest is None or result.remaining < tightest.remaining:
+                tightest = result
+        
+        rate_headers = [
+            (b"x-ratelimit-limit", str(tightest.limit).encode()),
+            (b"x-ratelimit-remaining", str(tightest.remaining).encode()),
+            (b"x-ratelimit-reset", str(math.ceil(tightest.reset_after)).encode()),
+        ]
+        
+        async def send_with_rate_headers(message: Message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", []), *rate_headers]
+            await send(message)
+        
+        await self.app(scope, receive, send_with_rate_headers)
 
 
-class RequestLoggingMiddleware(BaseHTTPMiddleware):
+class RequestLoggingMiddleware:
     """
     Logs all API requests for security monitoring and debugging
-    Includes request details, response status, and timing
+    Includes request details, response status, and timing (time to response
+    start, also sent as `X-Process-Time`). The log line is only formatted when
+    INFO logging is enabled for this module.
     """
     
-    async def dispatch(self, request: Request, call_next):
-        # Start timing
-        start_time = time.time()
-        
-        # Get request details
-        client_ip = request.client.host if request.client else "unknown"
-        method = request.method
-        path = request.url.path
-        
-        # Log request
-        logger.info(f"Request: {method} {path} from {client_ip}")
+    def __init__(self, app: ASGIApp):
+        self.app = app
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        start_time = time.perf_counter()
+        status_code = 500
+        
+        async def send_with_timing(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                duration = time.perf_counter() - start_time
+                message["headers"] = [*message.get("headers", []), (b"x-process-time", f"{duration:.3f}".encode())]
+            await send(message)
         
         try:
-            # Process request
-            response = await call_next(request)
-            
-            # Calculate duration
-            duration = time.time() - start_time
-            
-            # Log response
-            logger.info(
-                f"Response: {method} {path} - Status: {response.status_code} - "
-                f"Duration: {duration:.3f}s - IP: {client_ip}"
-            )
-            
-            # Add response time header
-            response.headers["X-Process-Time"] = f"{duration:.3f}"
-            
-            return response
-            
+            await self.app(scope, receive, send_with_timing)
         except Exception as e:
-            duration = time.time() - start_time
+            duration = time.perf_counter() - start_time
             logger.error(
-                f"Error: {method} {path} - Error: {str(e)} - "
-                f"Duration: {duration:.3f}s - IP: {client_ip}"
+                "Error: %s %s - Error: %s - Duration: %.3fs - IP: %s",
+                scope["method"], scope["path"], e, duration, _client_ip(scope)
             )
             raise
+        
+        if logger.isEnabledFor(logging.INFO):
+            duration = time.perf_counter() - start_time
+            logger.info(
+                "Response: %s %s - Status: %s - Duration: %.3fs - IP: %s",
+                scope["method"], scope["path"], status_code, duration, _client_ip(scope)
+            )
+
+
+# OWASP recommended security headers, encoded once
+SECURITY_HEADERS = [
+    ("X-Content-Type-Options", "nosniff"),
+    ("X-Frame-Options", "DENY"),
+    ("X-XSS-Protection", "1; mode=block"),
+    ("Strict-Transport-Security", "max-age=31536000; includeSubDomains"),
+    ("Referrer-Policy", "strict-origin-when-cross-origin"),
+    ("Permissions-Policy", "geolocation=(), microphone=(), camera=()"),
+    # Content Security Policy (adjust as needed)
+    ("Content-Security-Policy", (
+        "default-src 'self'; "
+        "script-src 'self' 'unsafe-inline' 'unsafe-eval'; "
+        "style-src 'self' 'unsafe-inline'; "
+        "img-src 'self' data: https:; "
+        "font-src 'self' data:; "
+        "connect-src 'self' ws: wss:;"
+    )),
+]
+_RAW_SECURITY_HEADERS = [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in SECURITY_HEADERS]
+_SECURITY_HEADER_NAMES = {name for name, _ in _RAW_SECURITY_HEADERS}
 
 
-class SecurityHeadersMiddleware(BaseHTTPMiddleware):
+class SecurityHeadersMiddleware:
     """
     Adds security headers to all responses
     Implements OWASP recommended security headers
     """
     
-    async def dispatch(self, request: Request, call_next):
-        response = await call_next(request)
-        
-        # Add security headers
-        response.headers["X-Content-Type-Options"] = "nosniff"
-        response.headers["X-Frame-Options"] = "DENY"
-        response.headers["X-XSS-Protection"] = "1; mode=block"
-        response.headers["Strict-Transport-Security"] = "max-age=31536000; includeSubDomains"
-        response.headers["Referrer-Policy"] = "strict-origin-when-cross-origin"
-        response.headers["Permissions-Policy"] = "geolocation=(), microphone=(), camera=()"
-        
-        # Content Security Policy (adjust as needed)
-        response.headers["Content-Security-Policy"] = (
-            "default-src 'self'; "
-            "script-src 'self' 'unsafe-inline' 'unsafe-eval'; "
-            "style-src 'self' 'unsafe-inline'; "
-            "img-src 'self' data: https:; "
-            "font-src 'self' data:; "
-            "connect-src 'self' ws: wss:;"
-        )
-        
-        return response
+    def __init__(self, app: ASGIApp):
+        self.app = app
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        async def send_with_security_headers(message: Message):
+            if message["type"] == "http.response.start":
+                # Ours replace any the endpoint set, as before
+                headers = [h for h in message.get("headers", []) if h[0].lower() not in _SECURITY_HEADER_NAMES]
+                message["headers"] = headers + _RAW_SECURITY_HEADERS
+            await send(message)
+        
+        await self.app(scope, receive, send_with_security_headers)
+
+
+def _client_ip(scope: Scope) -> str:
+    client = scope.get("client")
+    return client[0] if client else "unknown"
 
 
 # CSRF Token storage (in-memory - use Redis for production)
@@ -221,33 +212,34 @@ def cleanup_csrf_tokens():
     logger.info(f"Cleaned up {len(expired)} expired CSRF tokens")
 
 
-class IPWhitelistMiddleware(BaseHTTPMiddleware):
+class IPWhitelistMiddleware:
     """
     Optional IP whitelist for admin endpoints
     Can be configured to restrict access to specific IPs
     """
     
-    def __init__(self, app, whitelist: list | None = None, admin_paths: list | None = None):
-        super().__init__(app)
+    def __init__(self, app: ASGIApp, whitelist: list | None = None, admin_paths: list | None = None):
+        self.app = app
         self.whitelist = set(whitelist or [])
-        self.admin_paths = admin_paths or ["/api/admin"]
+        self.admin_paths = tuple(admin_paths or ["/api/admin"])
         self.enabled = bool(whitelist)
     
-    async def dispatch(self, request: Request, call_next):
-        if not self.enabled:
-            return await call_next(request)
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if not self.enabled or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
         
         # Check if this is an admin path
-        is_admin_path = any(request.url.path.startswith(path) for path in self.admin_paths)
-        
-        if is_admin_path:
-            client_ip = request.client.host if request.client else "unknown"
+        if scope["path"].startswith(self.admin_paths):
+            client_ip = _client_ip(scope)
             
             if client_ip not in self.whitelist:
-                logger.warning(f"Blocked admin access attempt from unauthorized IP: {client_ip}")
-                return JSONResponse(
+                logger.warning("Blocked admin access attempt from unauthorized IP: %s", client_ip)
+                response = JSONResponse(
                     status_code=status.HTTP_403_FORBIDDEN,
                     content={"detail": "Access denied"}
                 )
+                await response(scope, receive, send)
+                return
         
-        return await call_next(request)
+        await self.app(scope, receive, send)
@@ -0,0 +1,114 @@
+"""
+Host and process statistics sampled with psutil in the background.
+
+`sampler.start()` (called at startup) refreshes `sampler.latest` every
+`system_metrics_interval` seconds on a worker thread, so health endpoints and
+`/metrics` read the last sample instead of blocking on
+`psutil.cpu_percent(interval=...)`. CPU percentages are measured over the
+time since the previous sample.
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Dict, Optional
+
+import psutil
+
+from .config import settings
+from .metrics import Gauge
+
+logger = logging.getLogger(__name__)
+
+
+class SystemSampler:
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.latest: Dict[str, Any] = {}
+        self._process = psutil.Process(os.getpid())
+        self._task: Optional[asyncio.Task] = None
+
+    def sample(self) -> Dict[str, Any]:
+        memory = psutil.virtual_memory()
+        disk = psutil.disk_usage('/')
+        try:
+            net_io = psutil.net_io_counters()
+            network = {
+                "bytes_sent_mb": round(net_io.bytes_sent / (1024 * 1024), 2),
+                "bytes_recv_mb": round(net_io.bytes_recv / (1024 * 1024), 2),
+                "packets_sent": net_io.packets_sent,
+                "packets_recv": net_io.packets_recv,
+                "errors_in": net_io.errin,
+                "errors_out": net_io.errout
+            }
+        except Exception:
+            network = None
+        try:
+            load_avg = os.getloadavg()
+            load_average = {
+                "1min": round(load_avg[0], 2),
+                "5min": round(load_avg[1], 2),
+                "15min": round(load_avg[2], 2)
+            }
+        except (AttributeError, OSError):
+            load_average = None
+        return {
+            "sampled_at": time.time(),
+            "cpu_percent": psutil.cpu_percent(interval=None),
+            "cpu_count": psutil.cpu_count(),
+            "load_average": load_average,
+            "memory": {
+                "percent": memory.percent,
+                "total": memory.total,
+                "used": memory.used,
+                "available": memory.available
+            },
+            "disk": {
+                "percent": disk.percent,
+                "total": disk.total,
+                "used": disk.used,
+                "free": disk.free
+            },
+            "network": network,
+            "process_memory_bytes": self._process.memory_info().rss,
+            "process_cpu_percent": self._process.cpu_percent(interval=None),
+        }
+
+    def snapshot(self) -> Dict[str, Any]:
+        """The latest sample; takes one synchronously if the sampler hasn't run yet."""
+        if not self.latest:
+            self.latest = self.sample()
+        return self.latest
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                self.latest = await asyncio.to_thread(self.sample)
+            except Exception as e:
+                logger.warning("System metrics sample failed: %s", e)
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+sampler = SystemSampler(settings.system_metrics_interval)
+
+Gauge("system_cpu_usage_percent", "Host CPU usage over the last sample interval",
+      fn=lambda: sampler.latest["cpu_percent"])
+Gauge("system_memory_usage_percent", "Host memory in use", fn=lambda: sampler.latest["memory"]["percent"])
+Gauge("system_disk_usage_percent", "Root filesystem usage", fn=lambda: sampler.latest["disk"]["percent"])
+Gauge("process_resident_memory_bytes", "Resident memory of this worker",
+      fn=lambda: sampler.latest["process_memory_bytes"])
+Gauge("process_cpu_usage_percent", "CPU usage of this worker over the last sample interval",
+      fn=lambda: sampler.latest["process_cpu_percent"])
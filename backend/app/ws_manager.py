@@ -1,43 +1,227 @@
+"""
+Registry of the websocket connections open on this worker.
+
+Each connection gets its own writer task draining a bounded outbound queue,
+so sending to a user (or to everyone) only serializes the event once and
+enqueues it; no caller ever waits on a socket. A slow client fills only its
+own queue. When the queue is full, `ws_slow_consumer_policy` decides what
+happens: "drop" discards the oldest queued event to make room, and
+"disconnect" closes the socket (code 1013, try again later) so the client
+reconnects and refetches. A send that takes longer than `ws_send_timeout`
+is treated as a dead connection.
+
+The heartbeat task (`start_heartbeat`, run at startup) queues a
+`{"type": "ping"}` event on every socket each `ws_heartbeat_interval`
+seconds, which surfaces half-open connections as failed or timed-out sends.
+Any frame from the client, such as its `{"type": "pong"}` reply, refreshes
+`Connection.last_seen`. When `ws_idle_timeout` is set, sockets silent for
+longer than that are closed with 1001 and unregistered. It is off by default
+because existing clients only receive and never answer the ping.
+"""
+import asyncio
 import json
-from typing import Dict, Set
+import logging
+import time
+from typing import Dict, Iterable, List, Optional, Set
 from fastapi import WebSocket
 
+from .config import settings
+from .metrics import Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+CLOSE_GOING_AWAY = 1001
+CLOSE_TRY_AGAIN_LATER = 1013
+PING = json.dumps({"type": "ping"})
+PONG = json.dumps({"type": "pong"})
+
+messages_sent_total = Counter("websocket_messages_sent_total", "Events written to websockets")
+messages_dropped_total = Counter(
+    "websocket_messages_dropped_total", "Events shed or undeliverable because a socket's queue was full"
+)
+connections_reaped_total = Counter(
+    "websocket_connections_reaped_total", "Websockets closed for being idle past ws_idle_timeout"
+)
+
+
+class Connection:
+    """One open socket and the task that writes its outbound queue."""
+
+    __slots__ = ("user_id", "websocket", "queue", "task", "closed", "dropped", "last_seen", "_manager")
+
+    def __init__(self, manager: "ConnectionManager", user_id: int, websocket: WebSocket, max_queue: int):
+        self._manager = manager
+        self.user_id = user_id
+        self.websocket = websocket
+        self.queue: "asyncio.Queue[str]" = asyncio.Queue(maxsize=max_queue)
+        self.task: Optional[asyncio.Task] = None
+        self.closed = False
+        self.dropped = 0
+        self.last_seen = time.monotonic()
+
+    def start(self) -> None:
+        self.task = self._manager._spawn(self._writer())
+
+    def offer(self, text: str) -> bool:
+        """Queue `text` without waiting; False if the connection is gone or shed it."""
+        if self.closed:
+            return False
+        try:
+            self.queue.put_nowait(text)
+            return True
+        except asyncio.QueueFull:
+            pass
+        self.dropped += 1
+        messages_dropped_total.inc()
+        if settings.ws_slow_consumer_policy == "disconnect":
+            logger.info("Closing slow websocket for user %s (%d events queued)", self.user_id, self.queue.qsize())
+            self.close(CLOSE_TRY_AGAIN_LATER)
+            return False
+        self.queue.get_nowait()  # make room by shedding the oldest event
+        self.queue.put_nowait(text)
+        return True
+
+    def stop(self) -> None:
+        """Unregister and stop writing. Safe to call more than once."""
+        if self.closed:
+            return
+        self.closed = True
+        self._manager._remove(self)
+        if self.task is not None and self.task is not asyncio.current_task():
+            self.task.cancel()
+
+    def close(self, code: int) -> None:
+        """Unregister and close the socket from outside the writer."""
+        self.stop()
+        self._manager._spawn(self._close(code))
+
+    async def _close(self, code: int) -> None:
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            pass
+
+    async def _writer(self) -> None:
+        try:
+            # Checked as well as cancelling the task: on Python < 3.12 wait_for
+            # swallows a cancel that lands just as the send completes
+            while not self.closed:
+                text = await self.queue.get()
+                await asyncio.wait_for(self.websocket.send_text(text), settings.ws_send_timeout)
+                messages_sent_total.inc()
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            # Broken or stalled socket; the endpoint's receive loop will see the close too
+            logger.info("Websocket send to user %s failed: %r", self.user_id, e)
+            self.stop()
+            await self._close(CLOSE_TRY_AGAIN_LATER)
+
 
 class ConnectionManager:
-    def __init__(self):
-        # map user_id -> set of WebSocket connections
-        self.active_connections: Dict[int, Set[WebSocket]] = {}
+    def __init__(self, max_queue: Optional[int] = None):
+        # map user_id -> {websocket: Connection}
+        self.active_connections: Dict[int, Dict[WebSocket, Connection]] = {}
+        self.max_queue = max_queue or settings.ws_send_queue_size
+        # Writer and close tasks, held until they finish so a stopped
+        # connection's task can't be garbage collected mid-cancellation
+        self._tasks: Set[asyncio.Task] = set()
+        self._heartbeat: Optional[asyncio.Task] = None
+
+    def _spawn(self, coro) -> asyncio.Task:
+        task = asyncio.get_running_loop().create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
 
     async def connect(self, user_id: int, websocket: WebSocket):
         await websocket.accept()
-        conns = self.active_connections.setdefault(user_id, set())
-        conns.add(websocket)
+        conn = Connection(self, user_id, websocket, self.max_queue)
+        self.active_connections.setdefault(user_id, {})[websocket] = conn
+        conn.start()
+        return conn
 
     def disconnect(self, user_id: int, websocket: WebSocket):
-        conns = self.active_connections.get(user_id)
-        if conns and websocket in conns:
-            conns.remove(websocket)
+        conn = self.active_connections.get(user_id, {}).get(websocket)
+        if conn is not None:
+            conn.stop()
+
+    def connections(self) -> List[Connection]:
+        return [conn for conns in list(self.active_connections.values()) for conn in list(conns.values())]
+
+    def connection_count(self) -> int:
+        return sum(len(conns) for conns in list(self.active_connections.values()))
+
+    def _remove(self, conn: Connection) -> None:
+        conns = self.active_connections.get(conn.user_id)
+        if conns is not None and conns.get(conn.websocket) is conn:
+            del conns[conn.websocket]
             if not conns:
-                del self.active_connections[user_id]
+                del self.active_connections[conn.user_id]
 
-    async def send_personal_message(self, user_id: int, message: dict):
-        conns = self.active_connections.get(user_id, set())
+    async def send_personal_message(self, user_id: int, message: dict) -> int:
+        return await self.send_text(user_id, json.dumps(message, default=str))
+
+    async def send_text(self, user_id: int, text: str) -> int:
+        """Queue an already-serialized event on every socket of `user_id`."""
+        return sum(conn.offer(text) for conn in list(self.active_connections.get(user_id, {}).values()))
+
+    async def send_to_users(self, user_ids: Iterable[int], message: dict) -> int:
+        """Send one message to many users; returns how many sockets it was queued on.
+
+        The message is serialized once. Users with no connection in this
+        process are skipped.
+        """
         text = json.dumps(message, default=str)
-        for ws in list(conns):
-            try:
-                await ws.send_text(text)
-            except Exception:
-                # remove broken connections
-                conns.discard(ws)
+        sent = 0
+        for user_id in user_ids:
+            conns = self.active_connections.get(user_id)
+            if conns:
+                sent += sum(conn.offer(text) for conn in list(conns.values()))
+        return sent
 
-    async def broadcast(self, message: dict):
+    async def broadcast(self, message: dict) -> int:
         text = json.dumps(message, default=str)
-        for conns in list(self.active_connections.values()):
-            for ws in list(conns):
-                try:
-                    await ws.send_text(text)
-                except Exception:
-                    conns.discard(ws)
+        return sum(conn.offer(text) for conn in self.connections())
+
+    def heartbeat(self) -> int:
+        """Reap sockets idle past `ws_idle_timeout` and ping the rest; returns how many were reaped."""
+        idle_before = time.monotonic() - settings.ws_idle_timeout
+        reaped = 0
+        for conn in self.connections():
+            if settings.ws_idle_timeout and conn.last_seen < idle_before:
+                logger.info("Closing idle websocket for user %s", conn.user_id)
+                conn.close(CLOSE_GOING_AWAY)
+                reaped += 1
+            else:
+                conn.offer(PING)
+        connections_reaped_total.inc(reaped)
+        return reaped
+
+    async def _heartbeat_loop(self) -> None:
+        while True:
+            await asyncio.sleep(settings.ws_heartbeat_interval)
+            try:
+                self.heartbeat()
+            except Exception as e:
+                logger.warning("Websocket heartbeat failed: %s", e)
+
+    def start_heartbeat(self) -> None:
+        if self._heartbeat is None:
+            self._heartbeat = asyncio.get_running_loop().create_task(self._heartbeat_loop())
+
+    async def stop_heartbeat(self) -> None:
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+            try:
+                await self._heartbeat
+            except asyncio.CancelledError:
+                pass
+            self._heartbeat = None
 
 
 manager = ConnectionManager()
+
+Gauge("websocket_connections", "Websockets open on this worker", fn=manager.connection_count)
+Gauge("websocket_users", "Distinct users with a websocket open on this worker",
+      fn=lambda: len(manager.active_connections))
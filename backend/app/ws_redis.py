@@ -1,7 +1,29 @@
+"""
+Cross-worker websocket delivery over Redis pub/sub.
+
+Each worker subscribes only to the channels of users with a socket open on it
+(`ws:user:<id>`), plus one shared broadcast channel. The subscription is added
+when a user's first local socket connects and dropped when the last one
+closes, so an event is delivered only to the workers that can use it.
+
+Presence is a Redis hash per user, `ws:presence:<id>`, with one field per
+worker that holds a socket for them. Each worker refreshes the TTL of its
+users' keys in the background, so a worker that dies without cleaning up
+stops counting once the TTL lapses. Publishers check presence first and skip
+offline users, which matters for large fan-outs where most recipients aren't
+connected.
+
+Without Redis (not installed, unreachable or `ws_redis_enabled` off), the
+bridge delivers through the in-process `manager`, which only reaches sockets
+on the current worker.
+"""
 import asyncio
 import json
-import os
 import logging
+import os
+import socket
+import uuid
+from typing import Iterable, List, Optional, Set
 
 try:
     # redis-py v4+ provides asyncio support under redis.asyncio
@@ -9,71 +31,212 @@ try:
 except Exception:
     Redis = None
 
+from .config import settings
 from .ws_manager import manager
 
 logger = logging.getLogger(__name__)
-CHANNEL = os.getenv("WS_REDIS_CHANNEL", "messages_events")
+
+USER_CHANNEL_PREFIX = "ws:user:"
+BROADCAST_CHANNEL = os.getenv("WS_REDIS_CHANNEL", "ws:broadcast")
+PRESENCE_PREFIX = "ws:presence:"
+
+
+def user_channel(user_id: int) -> str:
+    return f"{USER_CHANNEL_PREFIX}{user_id}"
+
+
+def presence_key(user_id: int) -> str:
+    return f"{PRESENCE_PREFIX}{user_id}"
 
 
 class RedisBridge:
     def __init__(self):
         self.redis = None
-        self._task = None
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._pubsub = None
+        self._subscribed: Set[int] = set()
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._presence_task: Optional[asyncio.Task] = None
 
     async def init(self):
         if Redis is None:
             logger.warning("redis.asyncio not available; Redis bridge disabled")
             return
-        url = os.getenv("REDIS_URL", "redis://localhost:6379")
-        self.redis = Redis.from_url(url, decode_responses=True)
-        # Start subscriber loop
+        redis = Redis.from_url(settings.redis_url, decode_responses=True)
+        try:
+            await redis.ping()
+        except Exception as e:
+            await redis.close()
+            logger.warning("Redis unreachable at startup; websocket delivery is local to this worker: %s", e)
+            return
+        self.redis = redis
         self._task = asyncio.create_task(self._subscriber_loop())
+        self._presence_task = asyncio.create_task(self._presence_loop())
 
     async def close(self):
-        if self._task:
-            self._task.cancel()
+        for task in (self._task, self._presence_task):
+            if task:
+                task.cancel()
         if self.redis:
+            try:
+                pipe = self.redis.pipeline(transaction=False)
+                for user_id in self._subscribed:
+                    pipe.hdel(presence_key(user_id), self.worker_id)
+                await pipe.execute()
+            except Exception:
+                pass
             await self.redis.close()
+            self.redis = None
 
-    async def publish(self, payload: dict):
+    # -- connection lifecycle (called by the websocket endpoint) -------------
+
+    async def user_connected(self, user_id: int) -> None:
+        await self._sync_user(user_id)
+
+    async def user_disconnected(self, user_id: int) -> None:
+        await self._sync_user(user_id)
+
+    async def _sync_user(self, user_id: int) -> None:
+        """Subscribe/register presence iff the user still has a local socket.
+
+        Re-reading `manager` under the lock makes interleaved connects and
+        disconnects for one user converge on the right state.
+        """
         if not self.redis:
-            # No-op when redis not configured
             return
-        try:
-            await self.redis.publish(CHANNEL, json.dumps(payload, default=str))
-        except Exception as e:
-            logger.exception("Failed to publish to Redis: %s", e)
+        async with self._lock:
+            connected = user_id in manager.active_connections
+            if connected == (user_id in self._subscribed):
+                return
+            try:
+                if connected:
+                    if self._pubsub is not None:
+                        await self._pubsub.subscribe(user_channel(user_id))
+                    await self.redis.pipeline(transaction=False).hset(
+                        presence_key(user_id), self.worker_id, 1
+                    ).expire(presence_key(user_id), settings.ws_presence_ttl).execute()
+                    self._subscribed.add(user_id)
+                else:
+                    self._subscribed.discard(user_id)
+                    if self._pubsub is not None:
+                        await self._pubsub.unsubscribe(user_channel(user_id))
+                    await self.redis.hdel(presence_key(user_id), self.worker_id)
+            except Exception:
+                logger.exception("Failed to update Redis subscription for user %s", user_id)
 
-    async def _subscriber_loop(self):
+    # -- publishing -----------------------------------------------------------
+
+    async def online(self, user_ids: Iterable[int]) -> List[int]:
+        """The subset of `user_ids` with a socket open on any worker."""
+        user_ids = list(user_ids)
         if not self.redis:
+            return [u for u in user_ids if u in manager.active_connections]
+        pipe = self.redis.pipeline(transaction=False)
+        for user_id in user_ids:
+            pipe.exists(presence_key(user_id))
+        flags = await pipe.execute()
+        return [u for u, flag in zip(user_ids, flags) if flag]
+
+    async def send_to_user(self, user_id: int, payload: dict) -> None:
+        await self.send_to_users([user_id], payload)
+
+    async def send_to_users(self, user_ids: Iterable[int], payload: dict) -> int:
+        """Deliver `payload` to every socket of `user_ids` on any worker.
+
+        Returns the number of online recipients it was published for (Redis)
+        or the number of local sockets written to (no Redis).
+        """
+        user_ids = list(user_ids)
+        if self.redis:
+            try:
+                targets = await self.online(user_ids)
+                if targets:
+                    text = json.dumps(payload, default=str)
+                    pipe = self.redis.pipeline(transaction=False)
+                    for user_id in targets:
+                        pipe.publish(user_channel(user_id), text)
+                    await pipe.execute()
+                return len(targets)
+            except Exception as e:
+                logger.warning("Redis publish failed, delivering locally only: %s", e)
+        return await manager.send_to_users(user_ids, payload)
+
+    async def broadcast(self, payload: dict) -> None:
+        if self.redis:
+            try:
+                await self.redis.publish(BROADCAST_CHANNEL, json.dumps(payload, default=str))
+                return
+            except Exception as e:
+                logger.warning("Redis publish failed, broadcasting locally only: %s", e)
+        await manager.broadcast(payload)
+
+    async def publish(self, payload: dict):
+        """Route a payload by its `user_ids`, `receiver_id` or `user_id`; broadcast if it has none."""
+        if payload.get("user_ids"):
+            user_ids = payload["user_ids"]
+            await self.send_to_users(user_ids, {k: v for k, v in payload.items() if k != "user_ids"})
             return
-        pubsub = self.redis.pubsub()
-        await pubsub.subscribe(CHANNEL)
-        logger.info(f"Subscribed to Redis channel: {CHANNEL}")
-        try:
-            async for message in pubsub.listen():
-                if message is None:
-                    continue
-                if message.get("type") != "message":
-                    continue
-                data = message.get("data")
+        receiver_id = payload.get("receiver_id") or payload.get("user_id")
+        if receiver_id:
+            await self.send_to_user(receiver_id, payload)
+        else:
+            await self.broadcast(payload)
+
+    # -- background tasks -----------------------------------------------------
+
+    async def _subscriber_loop(self):
+        backoff = 1.0
+        while True:
+            pubsub = self.redis.pubsub()
+            try:
+                async with self._lock:
+                    # (Re)subscribe everyone connected here, e.g. after a Redis restart
+                    channels = [user_channel(u) for u in manager.active_connections]
+                    await pubsub.subscribe(BROADCAST_CHANNEL, *channels)
+                    self._pubsub = pubsub
+                    self._subscribed = set(manager.active_connections)
+                logger.info("Subscribed to %d websocket channels on Redis", len(channels) + 1)
+                backoff = 1.0
+                async for message in pubsub.listen():
+                    if message is None or message.get("type") != "message":
+                        continue
+                    channel, data = message["channel"], message["data"]
+                    if channel == BROADCAST_CHANNEL:
+                        try:
+                            await manager.broadcast(json.loads(data))
+                        except ValueError:
+                            logger.exception("Invalid JSON from Redis: %s", data)
+                    elif channel.startswith(USER_CHANNEL_PREFIX):
+                        # Forward the serialized event as-is; no need to decode it
+                        await manager.send_text(int(channel[len(USER_CHANNEL_PREFIX):]), data)
+            except asyncio.CancelledError:
+                logger.info("Redis subscriber loop cancelled")
+                raise
+            except Exception:
+                logger.exception("Error in redis subscriber loop; reconnecting in %.0fs", backoff)
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+            finally:
+                self._pubsub = None
                 try:
-                    payload = json.loads(data)
+                    await pubsub.close()
                 except Exception:
-                    logger.exception("Invalid JSON from Redis: %s", data)
-                    continue
+                    pass
 
-                # Route to connected clients via manager
-                receiver_id = payload.get("receiver_id") or payload.get("user_id")
-                if receiver_id:
-                    await manager.send_personal_message(receiver_id, payload)
-                else:
-                    # broadcast if no specific receiver
-                    await manager.broadcast(payload)
-        except asyncio.CancelledError:
-            logger.info("Redis subscriber loop cancelled")
-        except Exception:
-            logger.exception("Error in redis subscriber loop")
+    async def _presence_loop(self):
+        """Keep presence keys of locally connected users from expiring."""
+        interval = max(settings.ws_presence_ttl / 3, 1.0)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                pipe = self.redis.pipeline(transaction=False)
+                for user_id in list(self._subscribed):
+                    pipe.hset(presence_key(user_id), self.worker_id, 1)
+                    pipe.expire(presence_key(user_id), settings.ws_presence_ttl)
+                await pipe.execute()
+            except Exception as e:
+                logger.warning("Failed to refresh websocket presence: %s", e)
 
 
 bridge = RedisBridge()
@@ -0,0 +1,55 @@
+"""Fill products.image_urls / products.primary_image_url in batches.
+
+Products written before these columns existed have NULLs and are resolved
+live on every listing. Run this once after deploying (and any time image data
+was edited outside the API) so listings can skip image queries entirely.
+
+Usage:
+  python scripts/backfill_product_image_urls.py [--all] [--batch-size N]
+
+By default only rows with NULL image_urls are processed; --all recomputes
+every product.
+"""
+from __future__ import annotations
+import argparse
+import sys
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+if str(BASE_DIR) not in sys.path:
+    sys.path.insert(0, str(BASE_DIR))
+
+from app.database import SessionLocal, engine
+from app import db_migrations, models
+from app.product_images import refresh_image_urls
+
+
+def main(batch_size: int, recompute_all: bool):
+    db_migrations.ensure_product_image_url_columns(engine)
+    db = SessionLocal()
+    try:
+        last_id = 0
+        updated = 0
+        while True:
+            query = db.query(models.Product.id).filter(models.Product.id > last_id)
+            if not recompute_all:
+                query = query.filter(models.Product.image_urls.is_(None))
+            ids = [pid for (pid,) in query.order_by(models.Product.id).limit(batch_size).all()]
+            if not ids:
+                break
+            refresh_image_urls(db, ids)
+            db.expunge_all()
+            updated += len(ids)
+            last_id = ids[-1]
+            print(f"updated {updated} products (last id {last_id})")
+        print({"updated_products": updated})
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--all", action="store_true", help="recompute every product, not just NULL rows")
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+    main(args.batch_size, args.all)
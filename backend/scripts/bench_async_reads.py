@@ -0,0 +1,107 @@
+"""Compare sync vs async database throughput for the hot read paths under concurrency.
+
+Each simulated request runs the product listing read (query + bulk formatter)
+and a cart read:
+  - sync: a sync Session per request on a threadpool capped like Starlette's
+    default (40 workers), which is how `def` endpoints using `get_db` run
+  - async: an AsyncSession per request on the event loop, which is how the
+    ported `async def` endpoints using `get_async_db` run
+
+Usage:
+  python scripts/bench_async_reads.py [--requests N] [--threads N] [concurrency ...]
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+if str(BASE_DIR) not in sys.path:
+    sys.path.insert(0, str(BASE_DIR))
+
+from app.database import SessionLocal
+from app.database_async import AsyncSessionLocal, dispose_async_engine
+from app import crud, models
+from app.routers.products import format_products_for_response
+
+PER_PAGE = 20
+
+
+def _sync_request(user_id):
+    db = SessionLocal()
+    try:
+        products = crud.get_products(db=db, skip=0, limit=PER_PAGE)
+        format_products_for_response(products, db)
+        if user_id is not None:
+            crud.get_cart_items(db=db, user_id=user_id)
+    finally:
+        db.close()
+
+
+async def _async_request(user_id):
+    async with AsyncSessionLocal() as db:
+        await db.run_sync(
+            lambda s: format_products_for_response(crud.get_products(db=s, skip=0, limit=PER_PAGE), s)
+        )
+        if user_id is not None:
+            await crud.get_cart_items_async(db=db, user_id=user_id)
+
+
+async def _run_sync(total, concurrency, executor, user_id):
+    loop = asyncio.get_running_loop()
+    gate = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with gate:
+            await loop.run_in_executor(executor, _sync_request, user_id)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    return time.perf_counter() - started
+
+
+async def _run_async(total, concurrency, user_id):
+    gate = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with gate:
+            await _async_request(user_id)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    return time.perf_counter() - started
+
+
+async def main(levels, total, threads):
+    db = SessionLocal()
+    try:
+        user_id = db.query(models.CartItem.user_id).limit(1).scalar()
+    finally:
+        db.close()
+
+    executor = ThreadPoolExecutor(max_workers=threads)
+    # Warm both pools and any per-process caches before timing
+    await _run_sync(threads, threads, executor, user_id)
+    await _run_async(threads, threads, user_id)
+
+    print(f"{'concurrency':>11} {'sync req/s':>11} {'async req/s':>12}")
+    try:
+        for concurrency in levels:
+            sync_s = await _run_sync(total, concurrency, executor, user_id)
+            async_s = await _run_async(total, concurrency, user_id)
+            print(f"{concurrency:>11} {total / sync_s:>11.1f} {total / async_s:>12.1f}")
+    finally:
+        executor.shutdown()
+        await dispose_async_engine()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("levels", nargs="*", type=int, default=[10, 50, 200])
+    parser.add_argument("--requests", type=int, default=500, help="requests per measurement")
+    parser.add_argument("--threads", type=int, default=40, help="sync threadpool size")
+    args = parser.parse_args()
+    asyncio.run(main(args.levels, args.requests, args.threads))
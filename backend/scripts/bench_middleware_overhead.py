@@ -0,0 +1,135 @@
+"""Measure middleware overhead in requests per second on a trivial endpoint.
+
+Builds three FastAPI apps that all serve GET /ping:
+  - bare:   no middleware
+  - legacy: the previous BaseHTTPMiddleware versions of the security-headers
+            and request-logging middleware (reproduced below)
+  - asgi:   the pure ASGI `SecurityHeadersMiddleware` and
+            `RequestLoggingMiddleware` from app.security_middleware
+and drives each one in-process through the ASGI interface, without a server
+or HTTP client, so the only difference between runs is the middleware.
+
+Usage:
+  python scripts/bench_middleware_overhead.py [--requests N] [--concurrency N]
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import logging
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+if str(BASE_DIR) not in sys.path:
+    sys.path.insert(0, str(BASE_DIR))
+
+from fastapi import FastAPI, Request
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from app.security_middleware import RequestLoggingMiddleware, SecurityHeadersMiddleware
+
+legacy_logger = logging.getLogger("bench.legacy")
+
+
+class LegacyRequestLoggingMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        start_time = time.time()
+        client_ip = request.client.host if request.client else "unknown"
+        method = request.method
+        path = request.url.path
+        legacy_logger.info(f"Request: {method} {path} from {client_ip}")
+        response = await call_next(request)
+        duration = time.time() - start_time
+        legacy_logger.info(
+            f"Response: {method} {path} - Status: {response.status_code} - "
+            f"Duration: {duration:.3f}s - IP: {client_ip}"
+        )
+        response.headers["X-Process-Time"] = f"{duration:.3f}"
+        return response
+
+
+class LegacySecurityHeadersMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        response = await call_next(request)
+        response.headers["X-Content-Type-Options"] = "nosniff"
+        response.headers["X-Frame-Options"] = "DENY"
+        response.headers["X-XSS-Protection"] = "1; mode=block"
+        response.headers["Strict-Transport-Security"] = "max-age=31536000; includeSubDomains"
+        response.headers["Referrer-Policy"] = "strict-origin-when-cross-origin"
+        response.headers["Permissions-Policy"] = "geolocation=(), microphone=(), camera=()"
+        response.headers["Content-Security-Policy"] = "default-src 'self'"
+        return response
+
+
+def _app(*middleware) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    # Same order as main.py: security headers added first, logging second
+    for cls in middleware:
+        app.add_middleware(cls)
+    return app
+
+
+async def _request(app) -> int:
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "GET", "scheme": "http", "path": "/ping", "raw_path": b"/ping",
+        "root_path": "", "query_string": b"", "headers": [(b"host", b"bench")],
+        "client": ("127.0.0.1", 50000), "server": ("bench", 80),
+    }
+    status = 0
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(scope, receive, send)
+    return status
+
+
+async def _measure(app, total: int, concurrency: int) -> float:
+    gate = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with gate:
+            assert await _request(app) == 200
+
+    await asyncio.gather(*(one() for _ in range(min(total, 500))))  # warm-up
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    return total / (time.perf_counter() - started)
+
+
+async def main(total: int, concurrency: int):
+    apps = {
+        "bare": _app(),
+        "legacy": _app(LegacySecurityHeadersMiddleware, LegacyRequestLoggingMiddleware),
+        "asgi": _app(SecurityHeadersMiddleware, RequestLoggingMiddleware),
+    }
+    results = {}
+    for name, app in apps.items():
+        results[name] = await _measure(app, total, concurrency)
+        print(f"{name:>7}: {results[name]:9.0f} req/s")
+    bare_cost = 1 / results["bare"]
+    for name in ("legacy", "asgi"):
+        overhead_us = (1 / results[name] - bare_cost) * 1e6
+        print(f"{name:>7} middleware overhead: {overhead_us:7.1f} us/request")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+    # INFO on, like production, so the per-request logging cost is included
+    logging.basicConfig(level=logging.INFO, handlers=[logging.NullHandler()])
+    asyncio.run(main(args.requests, args.concurrency))
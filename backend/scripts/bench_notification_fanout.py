@@ -0,0 +1,158 @@
+"""Benchmark notification fan-out to N recipients (default 10,000).
+
+Seeds N users into a scratch database, then times:
+  - legacy: `routers.notifications.create_notification` once per recipient
+    (existence query + insert + commit + refresh each)
+  - fan-out: `notification_fanout.create_notifications` (chunked executemany)
+and the websocket side against N fake connected sockets:
+  - legacy: `manager.send_personal_message` once per recipient
+  - fan-out: `manager.send_to_users` (serialize once, queue on every socket)
+
+Runs against a throwaway SQLite file by default; pass --url for a scratch
+Postgres database. It creates tables and rows, so never point it at data you
+care about. --legacy-sample times the legacy insert path on a subset and
+extrapolates, since it takes minutes at 10k.
+
+Usage:
+  python scripts/bench_notification_fanout.py [--url URL] [--recipients N] [--chunk-size N] [--legacy-sample N]
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+if str(BASE_DIR) not in sys.path:
+    sys.path.insert(0, str(BASE_DIR))
+
+from sqlalchemy import insert
+from sqlalchemy.orm import sessionmaker
+
+from app import models
+from app.database import create_db_engine
+from app.notification_fanout import create_notifications
+from app.routers.notifications import create_notification
+from app.ws_manager import ConnectionManager
+
+
+class FakeSocket:
+    """Stands in for a connected WebSocket; a send yields to the loop like a real write."""
+
+    def __init__(self):
+        self.sent = 0
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text: str):
+        self.sent += 1
+        await asyncio.sleep(0)
+
+
+def _seed_users(Session, count: int):
+    run = uuid.uuid4().hex[:8]
+    db = Session()
+    try:
+        db.execute(insert(models.User), [
+            {"email": f"fanout-{run}-{i}@example.com", "username": f"fanout-{run}-{i}",
+             "full_name": f"User {i}", "hashed_password": "x", "is_active": True}
+            for i in range(count)
+        ])
+        db.commit()
+        return [user_id for (user_id,) in db.query(models.User.id).filter(
+            models.User.username.like(f"fanout-{run}-%")
+        ).order_by(models.User.id).all()]
+    finally:
+        db.close()
+
+
+def _time_legacy_inserts(Session, user_ids):
+    db = Session()
+    try:
+        started = time.perf_counter()
+        for user_id in user_ids:
+            create_notification(db, user_id, "Bench", "Legacy fan-out", "announcement")
+        return time.perf_counter() - started
+    finally:
+        db.close()
+
+
+def _time_fanout_inserts(Session, user_ids, chunk_size):
+    db = Session()
+    try:
+        started = time.perf_counter()
+        delivered = create_notifications(db, user_ids, "Bench", "Bulk fan-out", "announcement", chunk_size=chunk_size)
+        elapsed = time.perf_counter() - started
+        assert len(delivered) == len(user_ids), f"only {len(delivered)} of {len(user_ids)} written"
+        return elapsed
+    finally:
+        db.close()
+
+
+async def _time_ws(user_ids):
+    payload = {"type": "notification", "notification": {"title": "Bench", "message": "x" * 200}}
+
+    legacy = ConnectionManager()
+    for user_id in user_ids:
+        await legacy.connect(user_id, FakeSocket())
+    started = time.perf_counter()
+    for user_id in user_ids:
+        await legacy.send_personal_message(user_id, payload)
+    legacy_s = time.perf_counter() - started
+
+    batched = ConnectionManager()
+    for user_id in user_ids:
+        await batched.connect(user_id, FakeSocket())
+    started = time.perf_counter()
+    sent = await batched.send_to_users(user_ids, payload)
+    batched_s = time.perf_counter() - started
+    assert sent == len(user_ids), f"only {sent} of {len(user_ids)} sockets written"
+    return legacy_s, batched_s
+
+
+def main(url: str, recipients: int, chunk_size: int, legacy_sample: int) -> int:
+    engine = create_db_engine(url)
+    models.Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    user_ids = _seed_users(Session, recipients)
+
+    sample = user_ids[:legacy_sample] if legacy_sample else user_ids
+    legacy_s = _time_legacy_inserts(Session, sample) * (len(user_ids) / len(sample))
+    fanout_s = _time_fanout_inserts(Session, user_ids, chunk_size)
+    ws_legacy_s, ws_batched_s = asyncio.run(_time_ws(user_ids))
+    engine.dispose()
+
+    note = f" (extrapolated from {len(sample)})" if len(sample) != len(user_ids) else ""
+    print(f"{recipients} recipients")
+    print(f"  insert  per-recipient: {legacy_s:8.2f}s{note}")
+    print(f"  insert  fan-out:       {fanout_s:8.2f}s  ({legacy_s / fanout_s:.0f}x)")
+    print(f"  ws push per-recipient: {ws_legacy_s:8.3f}s")
+    print(f"  ws push batched:       {ws_batched_s:8.3f}s  ({ws_legacy_s / ws_batched_s:.1f}x)")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="scratch database URL (default: temporary SQLite file)")
+    parser.add_argument("--recipients", type=int, default=10_000)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--legacy-sample", type=int, default=1000,
+                        help="recipients to time on the legacy insert path (0 = all)")
+    args = parser.parse_args()
+
+    tmpdir = None
+    url = args.url
+    if not url:
+        tmpdir = tempfile.mkdtemp(prefix="fanout-bench-")
+        url = f"sqlite:///{Path(tmpdir) / 'fanout.db'}"
+    try:
+        status = main(url, args.recipients, args.chunk_size, args.legacy_sample)
+    finally:
+        if tmpdir:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+    sys.exit(status)
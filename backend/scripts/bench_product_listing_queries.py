@@ -0,0 +1,63 @@
+"""Count SQL statements issued while formatting a product listing page.
+
+Compares the per-product formatter (one call per product, as listings used to
+do) with the bulk formatter used by the listing endpoints. The bulk column
+should stay flat as per_page grows.
+
+Usage:
+  python scripts/bench_product_listing_queries.py [per_page ...]
+"""
+from __future__ import annotations
+import sys
+import time
+from pathlib import Path
+from sqlalchemy import event
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+if str(BASE_DIR) not in sys.path:
+    sys.path.insert(0, str(BASE_DIR))
+
+from app.database import SessionLocal, engine
+from app import crud
+from app.routers.products import format_product_for_response, format_products_for_response
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+
+def _measure(db, products, fn):
+    counter = QueryCounter()
+    event.listen(engine, "before_cursor_execute", counter)
+    try:
+        started = time.perf_counter()
+        fn(products, db)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+    finally:
+        event.remove(engine, "before_cursor_execute", counter)
+    return counter.count, elapsed_ms
+
+
+def main(sizes: list[int]):
+    db = SessionLocal()
+    try:
+        print(f"{'per_page':>8} {'per-product q':>14} {'bulk q':>7} {'per-product ms':>15} {'bulk ms':>8}")
+        for per_page in sizes:
+            products = crud.get_products(db=db, skip=0, limit=per_page)
+            single_q, single_ms = _measure(
+                db, products, lambda ps, s: [format_product_for_response(p, s) for p in ps]
+            )
+            products = crud.get_products(db=db, skip=0, limit=per_page)
+            bulk_q, bulk_ms = _measure(db, products, format_products_for_response)
+            print(f"{len(products):>8} {single_q:>14} {bulk_q:>7} {single_ms:>15.1f} {bulk_ms:>8.1f}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:]] or [10, 25, 50, 100]
+    main(args)
@@ -0,0 +1,112 @@
+"""Measure websocket broadcast latency against connection count.
+
+For each connection count, registers that many in-process fake sockets and
+broadcasts one event through:
+  - legacy: the previous ConnectionManager, which awaited `send_text` on
+            every socket in turn (reproduced below)
+  - queued: `app.ws_manager.ConnectionManager`, with one writer task and
+            bounded queue per socket
+A fraction of the sockets are slow (each send takes --slow-delay seconds), to
+show how one slow client holds up the rest. Reports how long the broadcast
+call took and the p50/p99/max time until healthy sockets had the event.
+
+Usage:
+  python scripts/bench_ws_broadcast.py [--connections 100,1000,10000] [--slow-fraction F] [--slow-delay S]
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+if str(BASE_DIR) not in sys.path:
+    sys.path.insert(0, str(BASE_DIR))
+
+from app.ws_manager import ConnectionManager
+
+
+class FakeSocket:
+    """Stands in for a connected WebSocket; records when each send completes."""
+
+    def __init__(self, delay: float, received: list, done: asyncio.Event, expected: int):
+        self.delay = delay
+        self.received = received
+        self.done = done
+        self.expected = expected
+
+    async def accept(self):
+        pass
+
+    async def close(self, code: int = 1000):
+        pass
+
+    async def send_text(self, text: str):
+        # A real write yields to the loop; a slow client's write takes a while
+        await asyncio.sleep(self.delay)
+        if not self.delay:
+            self.received.append(time.perf_counter())
+            if len(self.received) == self.expected:
+                self.done.set()
+
+
+class LegacyConnectionManager:
+    def __init__(self):
+        self.active_connections = {}
+
+    async def connect(self, user_id, websocket):
+        await websocket.accept()
+        self.active_connections.setdefault(user_id, set()).add(websocket)
+
+    def disconnect(self, user_id, websocket):
+        self.active_connections.get(user_id, set()).discard(websocket)
+
+    async def broadcast(self, message: dict):
+        text = json.dumps(message, default=str)
+        for conns in list(self.active_connections.values()):
+            for ws in list(conns):
+                try:
+                    await ws.send_text(text)
+                except Exception:
+                    conns.discard(ws)
+
+
+async def _measure(manager, connections: int, slow_every: int, slow_delay: float):
+    received: list = []
+    done = asyncio.Event()
+    healthy = sum(1 for i in range(connections) if not (slow_every and i % slow_every == 0))
+    for i in range(connections):
+        slow = slow_every and i % slow_every == 0
+        await manager.connect(i, FakeSocket(slow_delay if slow else 0, received, done, healthy))
+
+    payload = {"type": "notification", "notification": {"title": "Bench", "message": "x" * 200}}
+    started = time.perf_counter()
+    await manager.broadcast(payload)
+    call_s = time.perf_counter() - started
+    await done.wait()
+    latencies = sorted(t - started for t in received)
+    pct = lambda p: latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))] * 1000
+    for user_id, conns in list(manager.active_connections.items()):
+        for ws in list(conns):
+            manager.disconnect(user_id, ws)  # stops the queued manager's writer tasks
+    return call_s * 1000, pct(50), pct(99), latencies[-1] * 1000
+
+
+async def main(counts, slow_fraction: float, slow_delay: float):
+    slow_every = round(1 / slow_fraction) if slow_fraction else 0
+    print(f"{'sockets':>8} {'manager':>7} {'call ms':>9} {'p50 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for count in counts:
+        for name, manager in (("legacy", LegacyConnectionManager()), ("queued", ConnectionManager())):
+            call_ms, p50, p99, worst = await _measure(manager, count, slow_every, slow_delay)
+            print(f"{count:>8} {name:>7} {call_ms:9.1f} {p50:9.1f} {p99:9.1f} {worst:9.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--connections", default="100,1000,10000", help="comma-separated socket counts")
+    parser.add_argument("--slow-fraction", type=float, default=0.01, help="share of sockets that are slow")
+    parser.add_argument("--slow-delay", type=float, default=0.05, help="seconds one send takes on a slow socket")
+    args = parser.parse_args()
+    asyncio.run(main([int(n) for n in args.connections.split(",")], args.slow_fraction, args.slow_delay))
@@ -0,0 +1,149 @@
+"""Prove parallel checkouts cannot oversell a product.
+
+Seeds one product with --stock units and --buyers users into a scratch
+database, then has every buyer check out one unit at the same moment through
+`crud.create_order`. Afterwards the number of successful orders must equal
+the units taken from stock, and never exceed the starting stock.
+
+Runs against a throwaway SQLite file by default. Pass --url to point it at a
+scratch Postgres database to exercise the FOR UPDATE path. Never point it at
+a database you care about: it creates tables and rows.
+
+Usage:
+  python scripts/check_checkout_concurrency.py [--url URL] [--stock N] [--buyers N] [--threads N]
+Exit status is 1 if an oversell (or lost update) is detected.
+"""
+from __future__ import annotations
+import argparse
+import shutil
+import sys
+import tempfile
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+if str(BASE_DIR) not in sys.path:
+    sys.path.insert(0, str(BASE_DIR))
+
+from sqlalchemy import func
+from sqlalchemy.orm import sessionmaker
+
+from app.database import create_db_engine
+from app import crud, models, schemas
+
+
+def _seed(Session, stock: int, buyers: int):
+    run = uuid.uuid4().hex[:8]
+    db = Session()
+    try:
+        seller_user = models.User(
+            email=f"seller-{run}@example.com", username=f"seller-{run}",
+            full_name="Seller", hashed_password="x", is_seller=True
+        )
+        db.add(seller_user)
+        db.flush()
+        seller = models.Seller(user_id=seller_user.id, store_name="Store", store_slug=f"store-{run}")
+        db.add(seller)
+        db.flush()
+        product = models.Product(
+            seller_id=seller.id, title="Contended item", slug=f"contended-{run}", sku=f"SKU-{run}",
+            price=10.0, inventory_count=stock, is_active=True, approval_status="approved"
+        )
+        db.add(product)
+        users = [
+            models.User(email=f"buyer-{run}-{i}@example.com", username=f"buyer-{run}-{i}",
+                        full_name=f"Buyer {i}", hashed_password="x")
+            for i in range(buyers)
+        ]
+        db.add_all(users)
+        db.commit()
+        return product.id, [u.id for u in users]
+    finally:
+        db.close()
+
+
+def main(url: str, stock: int, buyers: int, threads: int) -> int:
+    engine = create_db_engine(url)
+    models.Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    product_id, user_ids = _seed(Session, stock, buyers)
+
+    start = threading.Barrier(min(threads, buyers))
+    outcomes = {"ok": 0, "rejected": 0, "error": 0}
+    lock = threading.Lock()
+
+    def checkout(user_id: int):
+        order = schemas.OrderCreate(
+            items=[schemas.OrderItemCreate(product_id=product_id, quantity=1, unit_price=0)],
+            shipping_address={"line1": "1 Test St"},
+        )
+        try:
+            start.wait(timeout=10)
+        except threading.BrokenBarrierError:
+            pass
+        db = Session()
+        try:
+            crud.create_order(db=db, order=order, user_id=user_id)
+            result = "ok"
+        except crud.OrderError:
+            result = "rejected"
+        except Exception as e:
+            # e.g. SQLite "database is locked" under heavy write contention
+            print(f"  checkout error: {e.__class__.__name__}: {e}")
+            result = "error"
+        finally:
+            db.close()
+        with lock:
+            outcomes[result] += 1
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(checkout, user_ids))
+
+    db = Session()
+    try:
+        remaining = db.query(models.Product.inventory_count).filter(models.Product.id == product_id).scalar()
+        sold = db.query(func.coalesce(func.sum(models.OrderItem.quantity), 0)).filter(
+            models.OrderItem.product_id == product_id
+        ).scalar()
+    finally:
+        db.close()
+    engine.dispose()
+
+    print({"stock": stock, "buyers": buyers, **outcomes, "units_sold": sold, "remaining": remaining})
+    failures = []
+    if sold > stock:
+        failures.append(f"oversold: {sold} units sold from a stock of {stock}")
+    if remaining < 0:
+        failures.append(f"negative inventory: {remaining}")
+    if stock - remaining != sold:
+        failures.append(f"lost update: stock dropped by {stock - remaining} but {sold} units were ordered")
+    if outcomes["ok"] != sold:
+        failures.append(f"{outcomes['ok']} successful checkouts but {sold} units recorded")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if not failures:
+        print("OK: no overselling")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="scratch database URL (default: temporary SQLite file)")
+    parser.add_argument("--stock", type=int, default=20)
+    parser.add_argument("--buyers", type=int, default=60)
+    parser.add_argument("--threads", type=int, default=16)
+    args = parser.parse_args()
+
+    tmpdir = None
+    url = args.url
+    if not url:
+        tmpdir = tempfile.mkdtemp(prefix="checkout-race-")
+        url = f"sqlite:///{Path(tmpdir) / 'checkout.db'}"
+    try:
+        status = main(url, args.stock, args.buyers, args.threads)
+    finally:
+        if tmpdir:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+    sys.exit(status)
@@ -0,0 +1,113 @@
+"""Walk every cursor page of rows created in the same second.
+
+Seeds --rows users into a scratch database, sets all their `created_at` to
+one server-side CURRENT_TIMESTAMP (the same value `server_default=func.now()`
+writes), then follows `paginate_keyset` cursors to the end, newest-first and
+oldest-first. Each walk must return every row exactly once, in order; a cursor
+that compares wrongly against the stored timestamp either repeats a page
+forever or skips the rest of the second.
+
+Runs against a throwaway SQLite file by default. Pass --url to point it at a
+scratch database instead. Never point it at a database you care about: it
+creates tables and rows.
+
+Usage:
+  python scripts/check_keyset_pagination.py [--url URL] [--rows N] [--per-page N]
+Exit status is 1 if any walk repeats, skips or reorders rows.
+"""
+from __future__ import annotations
+import argparse
+import shutil
+import sys
+import tempfile
+import uuid
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+if str(BASE_DIR) not in sys.path:
+    sys.path.insert(0, str(BASE_DIR))
+
+from sqlalchemy import func, insert
+from sqlalchemy.orm import sessionmaker
+
+from app.database import create_db_engine
+from app import models
+from app.pagination import paginate_keyset
+
+
+def _walk(db, run: str, per_page: int, descending: bool, max_pages: int):
+    query = db.query(models.User).filter(models.User.username.like(f"keyset-{run}-%"))
+    seen, cursor = [], ""
+    for _ in range(max_pages):
+        users, cursor = paginate_keyset(
+            query, models.User.created_at, models.User.id, per_page, cursor=cursor, descending=descending
+        )
+        seen.extend(u.id for u in users)
+        if cursor is None:
+            return seen, True
+    return seen, False
+
+
+def main(url: str, rows: int, per_page: int) -> int:
+    engine = create_db_engine(url)
+    models.Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    run = uuid.uuid4().hex[:8]
+
+    db = Session()
+    try:
+        db.execute(insert(models.User), [
+            {"email": f"keyset-{run}-{i}@example.com", "username": f"keyset-{run}-{i}",
+             "full_name": f"Keyset {i}", "hashed_password": "x"}
+            for i in range(rows)
+        ])
+        db.query(models.User).filter(models.User.username.like(f"keyset-{run}-%")).update(
+            {models.User.created_at: func.current_timestamp()}, synchronize_session=False
+        )
+        db.commit()
+        ids = sorted(
+            u.id for u in db.query(models.User.id).filter(models.User.username.like(f"keyset-{run}-%"))
+        )
+
+        failures = []
+        max_pages = rows // per_page + 2
+        for descending in (True, False):
+            label = "newest-first" if descending else "oldest-first"
+            seen, finished = _walk(db, run, per_page, descending, max_pages)
+            expected = ids[::-1] if descending else ids
+            print(f"{label}: {len(seen)} rows over {-(-len(seen) // per_page)} pages")
+            if not finished:
+                failures.append(f"{label}: still returning cursors after {max_pages} pages")
+            if seen != expected:
+                repeated = len(seen) - len(set(seen))
+                missing = len(set(expected) - set(seen))
+                failures.append(f"{label}: {repeated} repeated and {missing} missing rows")
+    finally:
+        db.close()
+        engine.dispose()
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if not failures:
+        print("OK: every row returned once, in order")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="scratch database URL (default: temporary SQLite file)")
+    parser.add_argument("--rows", type=int, default=25)
+    parser.add_argument("--per-page", type=int, default=3)
+    args = parser.parse_args()
+
+    tmpdir = None
+    url = args.url
+    if not url:
+        tmpdir = tempfile.mkdtemp(prefix="keyset-")
+        url = f"sqlite:///{Path(tmpdir) / 'keyset.db'}"
+    try:
+        status = main(url, args.rows, args.per_page)
+    finally:
+        if tmpdir:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+    sys.exit(status)
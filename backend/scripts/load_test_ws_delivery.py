@@ -0,0 +1,178 @@
+"""Load-test end-to-end websocket delivery latency across several workers.
+
+Run the API with several workers sharing one Redis, e.g.
+
+  RATE_LIMIT_ENABLED=false uvicorn app.main:app --workers 4 --port 8000
+
+then point this script at it. It seeds one admin sender and --sockets
+receivers into the database the app is configured with (settings.database_url,
+so run it from the same environment), mints their tokens locally, and opens
+one websocket per receiver; the kernel spreads them across the workers. Each
+round then sends events over HTTP and every socket records how long each one
+took to arrive:
+
+  broadcast: one POST /admin/notifications/broadcast to all receivers per round
+  direct:    --messages POST /messages/ calls per round to random receivers
+
+Latency is receive time minus the send time embedded in the event, so run
+the script on the same host as the server. Without the Redis bridge only the
+sockets on the worker that handled the POST receive anything, which shows up
+as a low delivered ratio.
+
+It creates users, messages and notifications, so use a scratch database.
+
+Usage:
+  python scripts/load_test_ws_delivery.py [--base-url URL] [--sockets N] [--mode broadcast|direct]
+      [--rounds N] [--messages N] [--interval S] [--settle S]
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import sys
+import time
+import urllib.request
+import uuid
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+if str(BASE_DIR) not in sys.path:
+    sys.path.insert(0, str(BASE_DIR))
+
+import websockets
+from sqlalchemy import insert
+
+from app import models
+from app.auth import create_access_token
+from app.database import SessionLocal
+
+TAG = "wsload"
+
+
+def _seed_users(run: str, count: int):
+    db = SessionLocal()
+    try:
+        rows = [{"email": f"{TAG}-{run}-admin@example.com", "username": f"{TAG}-{run}-admin",
+                 "full_name": "Load test sender", "hashed_password": "x", "is_active": True, "is_admin": True}]
+        rows += [{"email": f"{TAG}-{run}-{i}@example.com", "username": f"{TAG}-{run}-{i}",
+                  "full_name": f"Load test {i}", "hashed_password": "x", "is_active": True}
+                 for i in range(count)]
+        db.execute(insert(models.User), rows)
+        db.commit()
+        users = db.query(models.User.id, models.User.username).filter(
+            models.User.username.like(f"{TAG}-{run}-%")
+        ).all()
+    finally:
+        db.close()
+    admin = next(u for u in users if u.username.endswith("-admin"))
+    receivers = [u for u in users if u.id != admin.id]
+    return admin, receivers
+
+
+def _post(url: str, token: str, body: dict) -> int:
+    request = urllib.request.Request(
+        url, data=json.dumps(body).encode(), method="POST",
+        headers={"Content-Type": "application/json", "Authorization": f"Bearer {token}"},
+    )
+    with urllib.request.urlopen(request, timeout=60) as response:
+        return response.status
+
+
+def _sent_at(event: dict, run: str):
+    """Send timestamp embedded in one of our events, or None for anything else."""
+    if event.get("type") == "notification":
+        text = (event.get("notification") or {}).get("message") or ""
+    elif event.get("type") == "new_message":
+        text = (event.get("message") or {}).get("content") or ""
+    else:
+        return None
+    prefix = f"{TAG}:{run}:"
+    return float(text[len(prefix):]) if text.startswith(prefix) else None
+
+
+async def _receiver(ws_url: str, token: str, run: str, latencies: list, ready: asyncio.Event,
+                    connected: list, stop: asyncio.Event):
+    async with websockets.connect(f"{ws_url}/ws/messages?token={token}", max_queue=None) as ws:
+        connected.append(1)
+        ready.set()
+        while not stop.is_set():
+            try:
+                raw = await asyncio.wait_for(ws.recv(), timeout=0.5)
+            except asyncio.TimeoutError:
+                continue
+            sent_at = _sent_at(json.loads(raw), run)
+            if sent_at is not None:
+                latencies.append(time.time() - sent_at)
+
+
+async def main(args) -> int:
+    run = uuid.uuid4().hex[:8]
+    admin, receivers = await asyncio.to_thread(_seed_users, run, args.sockets)
+    admin_token = create_access_token({"sub": admin.username})
+    tokens = {u.id: create_access_token({"sub": u.username}) for u in receivers}
+    ws_url = args.base_url.replace("http", "ws", 1)
+    api = f"{args.base_url}/api/v1"
+
+    latencies: list = []
+    connected: list = []
+    stop = asyncio.Event()
+    gate = asyncio.Semaphore(args.connect_concurrency)
+
+    async def open_socket(user_id: int):
+        async with gate:
+            ready = asyncio.Event()
+            task = asyncio.create_task(_receiver(ws_url, tokens[user_id], run, latencies, ready, connected, stop))
+            waiter = asyncio.create_task(ready.wait())
+            # Done when the socket is open, or when connecting failed
+            await asyncio.wait({task, waiter}, return_when=asyncio.FIRST_COMPLETED)
+            waiter.cancel()
+            return task
+
+    started = time.perf_counter()
+    tasks = await asyncio.gather(*(open_socket(u.id) for u in receivers))
+    print(f"{len(connected)}/{len(receivers)} sockets connected in {time.perf_counter() - started:.1f}s")
+
+    expected = 0
+    receiver_ids = [u.id for u in receivers]
+    for _ in range(args.rounds):
+        if args.mode == "broadcast":
+            body = {"title": "Load test", "message": f"{TAG}:{run}:{time.time()}", "user_ids": receiver_ids}
+            await asyncio.to_thread(_post, f"{api}/admin/notifications/broadcast", admin_token, body)
+            expected += len(receiver_ids)
+        else:
+            targets = random.sample(receiver_ids, min(args.messages, len(receiver_ids)))
+            await asyncio.gather(*(
+                asyncio.to_thread(_post, f"{api}/messages/", admin_token,
+                                  {"receiver_id": user_id, "content": f"{TAG}:{run}:{time.time()}"})
+                for user_id in targets
+            ))
+            expected += len(targets)
+        await asyncio.sleep(args.interval)
+
+    await asyncio.sleep(args.settle)
+    stop.set()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    print(f"mode={args.mode} rounds={args.rounds} delivered {len(latencies)}/{expected}"
+          f" ({100 * len(latencies) / max(expected, 1):.1f}%)")
+    if latencies:
+        ordered = sorted(latencies)
+        pct = lambda p: ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))] * 1000
+        print(f"latency ms: p50 {pct(50):.1f}  p95 {pct(95):.1f}  p99 {pct(99):.1f}"
+              f"  max {ordered[-1] * 1000:.1f}  mean {statistics.fmean(ordered) * 1000:.1f}")
+    return 0 if len(latencies) == expected else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--sockets", type=int, default=1000)
+    parser.add_argument("--mode", choices=["broadcast", "direct"], default="broadcast")
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--messages", type=int, default=50, help="direct messages per round")
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds between rounds")
+    parser.add_argument("--settle", type=float, default=3.0, help="seconds to wait for stragglers")
+    parser.add_argument("--connect-concurrency", type=int, default=100)
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,59 @@
+"""Drain the outbox (order notifications, loyalty points) as a standalone process.
+
+Run one or more of these next to the web servers and set
+OUTBOX_WORKER_ENABLED=false on the web servers, so side-effects are processed
+off the web processes. Stop with Ctrl+C.
+
+Usage:
+  python scripts/run_outbox_worker.py [--once] [--batch-size N] [--poll SECONDS]
+"""
+from __future__ import annotations
+import argparse
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+if str(BASE_DIR) not in sys.path:
+    sys.path.insert(0, str(BASE_DIR))
+
+from sqlalchemy import func
+
+from app import jobs, models
+from app.config import settings
+from app.database import SessionLocal
+
+
+def _status_counts() -> dict:
+    db = SessionLocal()
+    try:
+        return dict(db.query(models.OutboxJob.status, func.count(models.OutboxJob.id)).group_by(models.OutboxJob.status).all())
+    finally:
+        db.close()
+
+
+def main(once: bool, batch_size: int, poll: float) -> int:
+    print(f"Outbox status: {_status_counts()}")
+    processed = 0
+    try:
+        while True:
+            claimed = jobs.drain(batch_size)
+            processed += claimed
+            if claimed:
+                continue
+            if once:
+                break
+            time.sleep(poll)
+    except KeyboardInterrupt:
+        pass
+    print(f"Processed {processed} job(s). Outbox status: {_status_counts()}")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--once", action="store_true", help="exit once no jobs are due")
+    parser.add_argument("--batch-size", type=int, default=settings.outbox_batch_size)
+    parser.add_argument("--poll", type=float, default=settings.outbox_poll_interval, help="seconds to sleep when idle")
+    args = parser.parse_args()
+    sys.exit(main(args.once, args.batch_size, args.poll))
@@ -5,7 +5,7 @@ Seed script to populate the database with sample data
 
 from sqlalchemy.orm import Session
 from app.database import SessionLocal, engine
-from app import models, crud, schemas, auth
+from app import models, crud, schemas, auth, category_tree
 from app.config import settings
 
 def create_sample_data():
@@ -56,6 +56,8 @@ def create_sample_data():
             if not existing_cat:
                 category = models.Category(**cat_data)
                 db.add(category)
+                db.flush()
+                category_tree.add_category(db, category)
         
         db.commit()
         
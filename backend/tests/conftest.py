@@ -0,0 +1,78 @@
+"""
+Shared fixtures: the app running on a throwaway SQLite database, plus helpers
+to seed users and sign their tokens.
+
+The environment is set before anything under `app` is imported, because
+settings and engines are built at import time. Redis-backed features, the
+in-process outbox worker and rate limiting are off so tests only see the
+database.
+"""
+import os
+import shutil
+import sys
+import tempfile
+import uuid
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+if str(BASE_DIR) not in sys.path:
+    sys.path.insert(0, str(BASE_DIR))
+
+_tmpdir = tempfile.mkdtemp(prefix="marketplace-tests-")
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{Path(_tmpdir) / 'test.db'}",
+    "USE_SUPABASE": "false",
+    "OUTBOX_WORKER_ENABLED": "false",
+    "WS_REDIS_ENABLED": "false",
+    "RATE_LIMIT_ENABLED": "false",
+    "RESPONSE_CACHE_USE_REDIS": "false",
+})
+
+pytest_plugins = ["app.query_budget_plugin"]
+
+import pytest
+from fastapi.testclient import TestClient
+
+
+@pytest.fixture(scope="session")
+def client():
+    from app.main import app
+    try:
+        with TestClient(app) as test_client:  # runs startup migrations
+            yield test_client
+    finally:
+        shutil.rmtree(_tmpdir, ignore_errors=True)
+
+
+@pytest.fixture
+def db(client):
+    from app.database import SessionLocal
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def make_user(db):
+    from app import models
+
+    def make(**fields):
+        name = f"user-{uuid.uuid4().hex[:8]}"
+        user = models.User(
+            email=f"{name}@example.com", username=name, full_name=name.title(), hashed_password="x", **fields
+        )
+        db.add(user)
+        db.commit()
+        return user
+    return make
+
+
+@pytest.fixture
+def auth_headers():
+    from app.auth import create_access_token
+
+    def headers(user):
+        return {"Authorization": f"Bearer {create_access_token({'sub': user.username})}"}
+    return headers
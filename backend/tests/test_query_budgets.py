@@ -0,0 +1,64 @@
+"""
+SQL budgets for endpoints that used to run one query per row.
+
+Each test seeds enough rows that an N+1 would blow the budget, makes one
+warm-up request (which resolves and caches the caller's principal), then
+counts the statements of a second identical request.
+"""
+import uuid
+
+from app import models
+
+
+def _make_product(db, seller_user, price: float) -> models.Product:
+    seller = db.query(models.Seller).filter(models.Seller.user_id == seller_user.id).first()
+    if seller is None:
+        seller = models.Seller(user_id=seller_user.id, store_name="Store", store_slug=f"store-{seller_user.id}")
+        db.add(seller)
+        db.flush()
+    tag = uuid.uuid4().hex[:8]
+    product = models.Product(
+        seller_id=seller.id, title=f"Product {tag}", slug=f"product-{tag}", sku=f"SKU-{tag}",
+        price=price, inventory_count=10, is_active=True, approval_status="approved"
+    )
+    db.add(product)
+    db.commit()
+    return product
+
+
+def test_conversations_inbox(client, db, make_user, auth_headers, query_budget):
+    me = make_user()
+    partners = [make_user() for _ in range(10)]
+    for i, partner in enumerate(partners):
+        db.add(models.Message(sender_id=partner.id, receiver_id=me.id, content=f"Hello {i}"))
+        db.add(models.Message(sender_id=me.id, receiver_id=partner.id, content=f"Reply {i}"))
+        db.add(models.Message(sender_id=partner.id, receiver_id=me.id, content=f"Thanks {i}"))
+    db.commit()
+    headers = auth_headers(me)
+
+    client.get("/api/v1/messages/conversations", headers=headers)
+    with query_budget(2):
+        response = client.get("/api/v1/messages/conversations", headers=headers)
+
+    assert response.status_code == 200
+    conversations = response.json()["data"]
+    assert {c["other_user"]["id"] for c in conversations} == {p.id for p in partners}
+    assert all(c["unread_count"] == 2 for c in conversations)
+
+
+def test_cart_total(client, db, make_user, auth_headers, query_budget):
+    me = make_user()
+    seller_user = make_user(is_seller=True)
+    for price in (5.0, 10.0, 20.0, 40.0, 80.0):
+        product = _make_product(db, seller_user, price)
+        db.add(models.CartItem(user_id=me.id, product_id=product.id, quantity=2))
+    db.commit()
+    headers = auth_headers(me)
+
+    client.get("/api/v1/cart/total", headers=headers)
+    with query_budget(2):
+        response = client.get("/api/v1/cart/total", headers=headers)
+
+    assert response.status_code == 200
+    assert response.json()["total_amount"] == 310.0
+    assert response.json()["total_items"] == 10